@@ -12,5 +12,8 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
+# Serve the LLM-bound support endpoints with their async views, e.g.
+#   uvicorn core.asgi:application --workers 2
+os.environ.setdefault('SUPPORT_ASYNC_VIEWS', 'True')
 
 application = get_asgi_application()
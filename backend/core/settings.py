@@ -184,6 +184,7 @@ CORS_ALLOW_HEADERS = [
     "content-type",
     "dnt",
     "origin",
+    "upload-offset",
     "user-agent",
     "x-csrftoken",
     "x-requested-with",
@@ -209,6 +210,123 @@ SIMPLE_JWT = {
 
 # OpenAI settings
 OPENAI_API_KEY = os.getenv('OPENAI_API_KEY', '')
+OPENAI_BASE_URL = os.getenv('OPENAI_BASE_URL', '')  # Empty uses the public API
+OPENAI_TIMEOUT = float(os.getenv('OPENAI_TIMEOUT', '60'))
+OPENAI_MAX_CONNECTIONS = int(os.getenv('OPENAI_MAX_CONNECTIONS', '500'))
+# Share one upstream call between identical concurrent prompts
+LLM_COALESCE_REQUESTS = os.getenv('LLM_COALESCE_REQUESTS', 'True') == 'True'
+
+# Completions in flight at once when generating support actions for a department
+SUPPORT_ACTION_BATCH_CONCURRENCY = int(os.getenv('SUPPORT_ACTION_BATCH_CONCURRENCY', '8'))
+
+# LLM call metrics (support.instrumentation): rows are written in batches of
+# LLM_METRICS_BATCH_SIZE or every LLM_METRICS_FLUSH_SECONDS, whichever comes first
+LLM_METRICS_ENABLED = os.getenv('LLM_METRICS_ENABLED', 'True') == 'True'
+LLM_METRICS_BATCH_SIZE = int(os.getenv('LLM_METRICS_BATCH_SIZE', '100'))
+LLM_METRICS_FLUSH_SECONDS = float(os.getenv('LLM_METRICS_FLUSH_SECONDS', '5'))
+# Calls per endpoint the llm-metrics report reads for latency percentiles
+LLM_REPORT_SAMPLE_SIZE = int(os.getenv('LLM_REPORT_SAMPLE_SIZE', '10000'))
+# USD per 1K prompt and completion tokens, for cost estimates in the metrics view
+LLM_PRICES_PER_1K_TOKENS = {
+    'gpt-4': (0.03, 0.06),
+    'gpt-3.5-turbo': (0.0005, 0.0015),
+    'text-embedding-ada-002': (0.0001, 0.0),
+}
+
+# Resource page views are counted in memory and added to the database every
+# VIEW_COUNTER_FLUSH_SECONDS; daily buckets feed the trending listing
+VIEW_COUNTER_FLUSH_SECONDS = float(os.getenv('VIEW_COUNTER_FLUSH_SECONDS', '5'))
+VIEW_COUNTER_DAILY_BUCKETS = os.getenv('VIEW_COUNTER_DAILY_BUCKETS', 'True') == 'True'
+TRENDING_DAYS = int(os.getenv('TRENDING_DAYS', '7'))
+
+# Resource recommendations (support.recommendations, built by build_recommendations):
+# neighbours kept per resource, popular resources kept per workload level, shrinkage
+# of similarities between rarely co-rated resources, the user's ratings used as seeds,
+# and the weight of rating similarity against popularity
+RECOMMENDER_NEIGHBORS = int(os.getenv('RECOMMENDER_NEIGHBORS', '20'))
+RECOMMENDER_POPULAR_LIMIT = int(os.getenv('RECOMMENDER_POPULAR_LIMIT', '100'))
+RECOMMENDER_SHRINKAGE = float(os.getenv('RECOMMENDER_SHRINKAGE', '5'))
+RECOMMENDER_SEED_RATINGS = int(os.getenv('RECOMMENDER_SEED_RATINGS', '20'))
+RECOMMENDER_CF_WEIGHT = float(os.getenv('RECOMMENDER_CF_WEIGHT', '0.7'))
+
+# Serialized resource and category listings are cached per access profile and query
+# (support.cache): fresh for RESOURCE_CACHE_SECONDS (0 disables), then kept another
+# RESOURCE_CACHE_STALE_SECONDS to serve while one request rebuilds them. Set REDIS_URL
+# to share the cache between processes; the default cache is per process.
+RESOURCE_CACHE_SECONDS = int(os.getenv('RESOURCE_CACHE_SECONDS', '60'))
+RESOURCE_CACHE_STALE_SECONDS = int(os.getenv('RESOURCE_CACHE_STALE_SECONDS', '300'))
+RESOURCE_CACHE_LOCK_SECONDS = float(os.getenv('RESOURCE_CACHE_LOCK_SECONDS', '5'))
+if os.getenv('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.getenv('REDIS_URL'),
+        }
+    }
+
+# Largest file accepted as a chunked upload (support.blobs); run gc_blobs regularly to
+# delete unreferenced files and abandoned uploads
+UPLOAD_MAX_BYTES = int(os.getenv('UPLOAD_MAX_BYTES', str(512 * 1024 * 1024)))
+
+# Media downloads (support.media): 'django' streams files itself (sendfile under
+# gunicorn); behind nginx use 'nginx' with an internal location at MEDIA_SENDFILE_URL
+# aliased to MEDIA_ROOT, or 'xsendfile' for Apache/lighttpd. Signed file links last
+# MEDIA_URL_MAX_AGE seconds.
+MEDIA_SENDFILE_BACKEND = os.getenv('MEDIA_SENDFILE_BACKEND', 'django')
+MEDIA_SENDFILE_URL = os.getenv('MEDIA_SENDFILE_URL', '/protected-media/')
+MEDIA_URL_MAX_AGE = int(os.getenv('MEDIA_URL_MAX_AGE', str(6 * 3600)))
+
+# Team recommendations for projects (projects.team): weights of the current and previous
+# workload level, their trend, and the share of the window not yet allocated
+TEAM_SCORE_WEIGHTS = {
+    'current': float(os.getenv('TEAM_WEIGHT_CURRENT', '0.4')),
+    'previous': float(os.getenv('TEAM_WEIGHT_PREVIOUS', '0.1')),
+    'trend': float(os.getenv('TEAM_WEIGHT_TREND', '0.2')),
+    'availability': float(os.getenv('TEAM_WEIGHT_AVAILABILITY', '0.3')),
+}
+
+# Support chat memory: recent turns sent verbatim, older ones folded into a rolling summary
+CHAT_CONTEXT_TURNS = int(os.getenv('CHAT_CONTEXT_TURNS', '6'))
+CHAT_PROMPT_TOKEN_BUDGET = int(os.getenv('CHAT_PROMPT_TOKEN_BUDGET', '3000'))
+CHAT_SUMMARY_BATCH = int(os.getenv('CHAT_SUMMARY_BATCH', '10'))
+CHAT_SUMMARY_MAX_TOKENS = int(os.getenv('CHAT_SUMMARY_MAX_TOKENS', '300'))
+CHAT_SUMMARY_MODEL = os.getenv('CHAT_SUMMARY_MODEL', 'gpt-3.5-turbo')
+
+# Chat turns are saved write-behind (support.chatlog): in batches of CHAT_LOG_BATCH_SIZE
+# or every CHAT_LOG_FLUSH_SECONDS, spooled to CHAT_LOG_SPOOL_DIR until committed
+CHAT_LOG_WRITE_BEHIND = os.getenv('CHAT_LOG_WRITE_BEHIND', 'True') == 'True'
+CHAT_LOG_BATCH_SIZE = int(os.getenv('CHAT_LOG_BATCH_SIZE', '50'))
+CHAT_LOG_FLUSH_SECONDS = float(os.getenv('CHAT_LOG_FLUSH_SECONDS', '2'))
+CHAT_LOG_SPOOL_DIR = os.getenv('CHAT_LOG_SPOOL_DIR', os.path.join(BASE_DIR, 'var', 'chat_spool'))
+
+# Guideline retrieval for the support chat: 'keyword' (BM25, no network), 'vector' or 'hybrid'
+GUIDELINE_RETRIEVAL_MODE = os.getenv('GUIDELINE_RETRIEVAL_MODE', 'hybrid')
+GUIDELINE_SEARCH_K = int(os.getenv('GUIDELINE_SEARCH_K', '4'))
+GUIDELINE_FUSION_CANDIDATES = int(os.getenv('GUIDELINE_FUSION_CANDIDATES', '20'))
+
+# Embedding model for guideline chunks; benchmarks swap in a local stub
+GUIDELINE_EMBEDDINGS_CLASS = os.getenv(
+    'GUIDELINE_EMBEDDINGS_CLASS', 'langchain_community.embeddings.OpenAIEmbeddings'
+)
+
+# FAISS index built for new guideline stores: 'flat' (exact), 'hnsw' or 'ivfpq'
+GUIDELINE_INDEX_TYPE = os.getenv('GUIDELINE_INDEX_TYPE', 'flat')
+GUIDELINE_HNSW_M = int(os.getenv('GUIDELINE_HNSW_M', '32'))
+GUIDELINE_HNSW_EF_CONSTRUCTION = int(os.getenv('GUIDELINE_HNSW_EF_CONSTRUCTION', '80'))
+GUIDELINE_HNSW_EF_SEARCH = int(os.getenv('GUIDELINE_HNSW_EF_SEARCH', '64'))
+GUIDELINE_IVF_NPROBE = int(os.getenv('GUIDELINE_IVF_NPROBE', '16'))
+GUIDELINE_IVFPQ_MIN_VECTORS = int(os.getenv('GUIDELINE_IVFPQ_MIN_VECTORS', '10000'))
+
+# PDFs with at least this many pages are parsed on a process pool of
+# GUIDELINE_PARSE_WORKERS processes (0 = one per CPU), a range of pages per task
+GUIDELINE_PARALLEL_PARSE_MIN_PAGES = int(os.getenv('GUIDELINE_PARALLEL_PARSE_MIN_PAGES', '64'))
+GUIDELINE_PARSE_WORKERS = int(os.getenv('GUIDELINE_PARSE_WORKERS', '0'))
+GUIDELINE_PARSE_PAGES_PER_TASK = int(os.getenv('GUIDELINE_PARSE_PAGES_PER_TASK', '16'))
+# Chunks are embedded as they are parsed, this many per batch
+GUIDELINE_EMBED_BATCH_SIZE = int(os.getenv('GUIDELINE_EMBED_BATCH_SIZE', '256'))
+
+# Route the LLM-bound support endpoints to async views (enabled by core/asgi.py)
+SUPPORT_ASYNC_VIEWS = os.getenv('SUPPORT_ASYNC_VIEWS', 'False') == 'True'
 
 # Media files configuration
 MEDIA_URL = '/media/'
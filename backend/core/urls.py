@@ -16,7 +16,7 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import path, include
 from django.conf import settings
-from django.conf.urls.static import static
+from support.views import MediaFileView
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -24,4 +24,6 @@ urlpatterns = [
     path('api/employees/', include('employees.urls')),
     path('api/projects/', include('projects.urls')),
     path('api/support/', include('support.urls')),
-] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+    # Access-checked, with Range support; see support.media
+    path(f"{settings.MEDIA_URL.lstrip('/')}<path:path>", MediaFileView.as_view(), name='media'),
+]
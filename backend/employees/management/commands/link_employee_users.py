@@ -0,0 +1,64 @@
+from collections import defaultdict
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models.functions import Lower
+
+from employees.models import Employee
+
+
+class Command(BaseCommand):
+    help = (
+        'Links employees to the user account with the same email (ignoring case), in '
+        'primary-key ordered chunks; safe to re-run'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000, help='Employees matched per query')
+        parser.add_argument('--dry-run', action='store_true', help='Report without changing anything')
+
+    def handle(self, *args, **options):
+        User = get_user_model()
+        pending = Employee.objects.filter(user__isnull=True).exclude(email='')
+        last_id = 0
+        linked = ambiguous = unmatched = 0
+        while True:
+            employees = list(
+                pending.filter(id__gt=last_id).order_by('id').only('id', 'email')[:options['chunk_size']]
+            )
+            if not employees:
+                break
+            last_id = employees[-1].id
+
+            # One query per chunk for every candidate account not linked yet
+            accounts = defaultdict(list)
+            for user_id, email in (
+                User.objects.annotate(email_lower=Lower('email'))
+                .filter(email_lower__in={employee.email.lower() for employee in employees})
+                .filter(employee_profile__isnull=True)
+                .values_list('id', 'email_lower')
+            ):
+                accounts[email].append(user_id)
+
+            matched = []
+            for employee in employees:
+                user_ids = accounts.get(employee.email.lower(), [])
+                if len(user_ids) == 1:
+                    employee.user_id = user_ids[0]
+                    matched.append(employee)
+                elif user_ids:
+                    ambiguous += 1
+                    self.stderr.write(f'Skipping {employee.email}: {len(user_ids)} accounts have this email')
+                else:
+                    unmatched += 1
+            if matched and not options['dry_run']:
+                with transaction.atomic():
+                    Employee.objects.bulk_update(matched, ['user'])
+            linked += len(matched)
+            self.stdout.write(f'Linked {linked} employees (up to id {last_id})')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Linked {linked} employees; {unmatched} without an account, {ambiguous} ambiguous'
+            + (' [dry run]' if options['dry_run'] else '')
+        ))
@@ -0,0 +1,30 @@
+# Generated by Django 4.2.17 on 2026-10-19 19:31
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        (
+            "employees",
+            "0004_alter_employee_options_employee_last_workload_update_and_more",
+        ),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="employee",
+            name="user",
+            field=models.OneToOneField(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="employee_profile",
+                to=settings.AUTH_USER_MODEL,
+            ),
+        ),
+    ]
@@ -1,9 +1,15 @@
+from django.conf import settings
 from django.db import models
 from django.utils import timezone
 
 class Employee(models.Model):
     name = models.CharField(max_length=255)
     email = models.EmailField(unique=True)
+    # The login account with the same email; set when both exist (see signals.py)
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True,
+        related_name='employee_profile'
+    )
     department = models.CharField(max_length=255)
     current_project = models.CharField(max_length=255, null=True, blank=True)
     current_workload_level = models.IntegerField(default=3)
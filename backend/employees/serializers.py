@@ -8,6 +8,7 @@ class EmployeeSerializer(serializers.ModelSerializer):
             'id',
             'name',
             'email',
+            'user',
             'department',
             'current_project',
             'current_workload_level',
@@ -15,7 +16,7 @@ class EmployeeSerializer(serializers.ModelSerializer):
             'created_at',
             'updated_at'
         ]
-        read_only_fields = ['id', 'created_at', 'updated_at']
+        read_only_fields = ['id', 'user', 'created_at', 'updated_at']
 
     def validate(self, data):
         # Ensure workload levels are between 1 and 5
@@ -0,0 +1,49 @@
+"""
+Links employees to the login account with their email (ignoring case) as soon as both
+exist, by the same rule as link_employee_users: exactly one account with that email
+that is not linked yet.
+"""
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import IntegrityError, transaction
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from .models import Employee
+
+
+def _link(employee_id, user_id):
+    try:
+        # Savepoint: a concurrent link of either side must not break the caller's transaction
+        with transaction.atomic():
+            return Employee.objects.filter(pk=employee_id, user__isnull=True).update(user_id=user_id)
+    except IntegrityError:
+        return 0
+
+
+@receiver(post_save, sender=Employee)
+def link_employee_to_user(sender, instance, **kwargs):
+    if instance.user_id is not None or not instance.email:
+        return
+    user_ids = list(
+        get_user_model().objects.filter(email__iexact=instance.email, employee_profile__isnull=True)
+        .values_list('id', flat=True)[:2]
+    )
+    if len(user_ids) == 1 and _link(instance.pk, user_ids[0]):
+        instance.user_id = user_ids[0]
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def link_user_to_employee(sender, instance, created, **kwargs):
+    if not created or not instance.email:
+        return
+    unlinked = get_user_model().objects.filter(email__iexact=instance.email, employee_profile__isnull=True)
+    if unlinked.count() != 1:
+        # Several accounts share the email: leave it to an administrator
+        return
+    employee_ids = list(
+        Employee.objects.filter(email__iexact=instance.email, user__isnull=True)
+        .values_list('id', flat=True)[:2]
+    )
+    if len(employee_ids) == 1:
+        _link(employee_ids[0], instance.pk)
@@ -1,3 +1,42 @@
+from django.contrib.auth import get_user_model
 from django.test import TestCase
+from rest_framework.test import APIClient
 
-# Create your tests here.
+from .models import Employee
+
+
+class EmployeeUserLinkTests(TestCase):
+    def setUp(self):
+        self.User = get_user_model()
+
+    def test_employee_created_after_the_account_is_linked(self):
+        user = self.User.objects.create_user(username='ana', email='Ana@Example.com', password='pw12345678')
+        client = APIClient()
+        client.force_authenticate(user)
+        response = client.post(
+            '/api/employees/', {'name': 'Ana', 'email': 'ana@example.com', 'department': 'Ops'}, format='json'
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['user'], user.id)
+        self.assertEqual(Employee.objects.get().user, user)
+
+    def test_account_created_after_the_employee_is_linked(self):
+        employee = Employee.objects.create(name='Ben', email='ben@example.com', department='Ops')
+        user = self.User.objects.create_user(username='ben', email='BEN@example.com', password='pw12345678')
+        employee.refresh_from_db()
+        self.assertEqual(employee.user, user)
+
+    def test_ambiguous_emails_are_not_linked(self):
+        self.User.objects.create_user(username='cy1', email='cy@example.com', password='pw12345678')
+        self.User.objects.create_user(username='cy2', email='cy@example.com', password='pw12345678')
+        employee = Employee.objects.create(name='Cy', email='cy@example.com', department='Ops')
+        employee.refresh_from_db()
+        self.assertIsNone(employee.user)
+
+    def test_linked_accounts_are_not_taken_again(self):
+        user = self.User.objects.create_user(username='di', email='di@example.com', password='pw12345678')
+        first = Employee.objects.create(name='Di', email='di@example.com', department='Ops')
+        second = Employee.objects.create(name='Di', email='DI@example.com', department='Sales')
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual((first.user, second.user), (user, None))
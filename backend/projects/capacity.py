@@ -0,0 +1,119 @@
+"""
+How allocated people are to projects over time.
+
+Each ProjectAssignment adds its ``workload_percentage`` to the employee's allocation
+from ``start_date`` through ``end_date`` (open-ended when null). ``allocation_timelines``
+turns the assignments of any number of employees into piecewise-constant timelines in
+one sorted sweep: an assignment is a +p event on its first day and a -p event on the
+day after its last, events are sorted by (employee, day), and a running sum per
+employee gives the allocation between consecutive event days. That is O(n log n) in
+the number of assignments, however long the date range.
+"""
+from datetime import timedelta
+from itertools import groupby
+from operator import itemgetter
+
+ONE_DAY = timedelta(days=1)
+FULL_TIME = 100
+
+
+def allocation_timelines(assignments, start, end):
+    """Allocation of each employee between ``start`` and ``end`` (inclusive).
+
+    ``assignments`` are ``(employee_id, project_id, start_date, end_date, percentage)``
+    tuples. Returns ``{employee_id: [segment, ...]}`` in date order, each segment a dict
+    with ``start``, ``end`` (inclusive), ``allocation`` (percent) and the ``projects``
+    contributing to it; days with nothing allocated have no segment.
+    """
+    after_end = end + ONE_DAY
+    events = []
+    for employee_id, project_id, first, last, percentage in assignments:
+        first = max(first, start)
+        stop = after_end if last is None else min(last + ONE_DAY, after_end)
+        if first >= stop or not percentage:
+            continue
+        events.append((employee_id, first, percentage, project_id))
+        events.append((employee_id, stop, -percentage, project_id))
+    events.sort(key=itemgetter(0, 1))
+
+    timelines = {}
+    for employee_id, employee_events in groupby(events, key=itemgetter(0)):
+        segments = []
+        active = {}
+        since = None
+        for day, day_events in groupby(employee_events, key=itemgetter(1)):
+            if active:
+                segments.append({
+                    'start': since,
+                    'end': day - ONE_DAY,
+                    'allocation': sum(active.values()),
+                    'projects': sorted(active),
+                })
+            for _, _, delta, project_id in day_events:
+                remaining = active.get(project_id, 0) + delta
+                if remaining:
+                    active[project_id] = remaining
+                else:
+                    active.pop(project_id, None)
+            since = day
+        timelines[employee_id] = segments
+    return timelines
+
+
+def overallocated_periods(segments, limit=FULL_TIME):
+    """Maximal runs of consecutive days allocated above ``limit``, with their peak."""
+    periods = []
+    for segment in segments:
+        if segment['allocation'] <= limit:
+            continue
+        previous = periods[-1] if periods else None
+        if previous and previous['end'] + ONE_DAY == segment['start']:
+            previous['end'] = segment['end']
+            previous['peak'] = max(previous['peak'], segment['allocation'])
+        else:
+            periods.append({'start': segment['start'], 'end': segment['end'], 'peak': segment['allocation']})
+    return periods
+
+
+def capacity_report(assignments, start, end, limit=FULL_TIME, people=()):
+    """Timelines, over-allocation and peak allocation per employee from assignment rows.
+
+    ``assignments`` are dicts with ``employee_id``, ``project_id``, ``start_date``,
+    ``end_date`` and ``workload_percentage``, plus the ``employee__*`` and
+    ``project__name`` fields named below; see ``CapacityView``. ``people`` are user
+    dicts (``id``, ``username``, ``first_name``, ``last_name``) to report on even with
+    no assignment in the range, at zero allocation.
+    """
+    employees = {
+        person['id']: (person['username'], person['first_name'], person['last_name'])
+        for person in people
+    }
+    projects = {}
+    for row in assignments:
+        employees[row['employee_id']] = (
+            row['employee__username'], row['employee__first_name'], row['employee__last_name']
+        )
+        projects[row['project_id']] = row['project__name']
+    timelines = allocation_timelines(
+        (
+            (row['employee_id'], row['project_id'], row['start_date'], row['end_date'], row['workload_percentage'])
+            for row in assignments
+        ),
+        start,
+        end,
+    )
+
+    report = []
+    for employee_id, (username, first_name, last_name) in employees.items():
+        segments = timelines.get(employee_id, [])
+        name = f"{first_name} {last_name}".strip()
+        report.append({
+            'id': employee_id,
+            'username': username,
+            'name': name or username,
+            'peak_allocation': max((segment['allocation'] for segment in segments), default=0),
+            'timeline': segments,
+            'overallocated': overallocated_periods(segments, limit),
+        })
+    report.sort(key=lambda entry: (-entry['peak_allocation'], entry['username']))
+    return {'employees': report, 'projects': projects}
@@ -6,6 +6,16 @@ class ProjectSerializer(serializers.ModelSerializer):
         model = Project
         fields = '__all__'
 
+class ProjectMetricsSerializer(ProjectSerializer):
+    # Over current assignments; level 1-2 is high stress
+    team_size = serializers.IntegerField(read_only=True)
+    workload_reported = serializers.IntegerField(read_only=True)
+    mean_workload_level = serializers.SerializerMethodField()
+    high_stress_count = serializers.IntegerField(read_only=True)
+
+    def get_mean_workload_level(self, obj):
+        return None if obj.mean_workload_level is None else round(obj.mean_workload_level, 2)
+
 class ProjectAssignmentSerializer(serializers.ModelSerializer):
     project_name = serializers.CharField(source='project.name', read_only=True)
     employee_name = serializers.CharField(source='employee.get_full_name', read_only=True)
@@ -0,0 +1,147 @@
+"""
+Team recommendations for a project.
+
+Candidates are employees linked to a user account (see link_employee_users) who are
+not on the project yet. Each is scored on their current and previous workload level,
+its trend and how much of the window their existing assignments already take, all as
+NumPy arrays over every candidate at once: a few thousand candidates cost a few
+queries and milliseconds. Workload levels run from 1 (high stress) to 5, so higher
+levels and an improving trend mean more room for new work.
+
+A candidate is feasible when their current level is at least ``min_level`` (3, the
+rule the project modal enforces) and their peak allocation in the window leaves room
+for the new assignment. Scores are independent, so the best feasible team of ``k`` is
+simply the ``k`` best feasible candidates.
+"""
+import numpy as np
+from django.conf import settings
+
+from employees.models import Employee
+
+from .capacity import FULL_TIME
+from .models import ProjectAssignment
+
+MIN_LEVEL = 3
+WORKLOAD_LEVELS = (1, 5)
+
+
+def window_allocation(owners, starts, stops, percentages, count, start, end):
+    """Mean and peak allocation of ``count`` people between ``start`` and ``end`` (inclusive).
+
+    ``owners`` is each assignment's person (0 to count - 1); ``starts`` and ``stops``
+    are datetime64[D] arrays, ``stops`` being the day after each assignment ends. The
+    peak comes from the same event sweep as capacity.py, vectorized: sort +p/-p events
+    by (person, day) and take a cumulative sum.
+    """
+    start = np.datetime64(start, 'D')
+    after_end = np.datetime64(end, 'D') + 1
+    first = np.maximum(starts, start)
+    stop = np.minimum(stops, after_end)
+    keep = first < stop
+    owners, first, stop, percentages = owners[keep], first[keep], stop[keep], percentages[keep]
+
+    days = (after_end - start).astype(np.int64)
+    covered = (stop - first).astype(np.int64)
+    mean = np.bincount(owners, weights=percentages * covered, minlength=count) / days
+
+    who = np.concatenate([owners, owners])
+    when = np.concatenate([first, stop])
+    delta = np.concatenate([percentages, -percentages])
+    order = np.lexsort((when, who))
+    who, when = who[order], when[order]
+    # Everyone's events sum to zero, so one running sum across all of them restarts
+    # at zero for each person
+    running = np.cumsum(delta[order])
+    # A day's allocation is the total after its last event
+    last = np.ones(len(who), dtype=bool)
+    last[:-1] = (who[1:] != who[:-1]) | (when[1:] != when[:-1])
+    peak = np.zeros(count)
+    np.maximum.at(peak, who[last], running[last])
+    return mean, peak
+
+
+def score_candidates(current, previous, mean_allocation, weights):
+    """Scores in [0, 1] from workload levels (arrays) and mean allocation in percent."""
+    low, high = WORKLOAD_LEVELS
+    span = high - low
+    return (
+        weights['current'] * (current - low) / span
+        + weights['previous'] * (previous - low) / span
+        + weights['trend'] * (np.clip((current - previous) / span, -1, 1) + 1) / 2
+        + weights['availability'] * np.clip(1 - mean_allocation / FULL_TIME, 0, 1)
+    )
+
+
+def _assignment_arrays(users, start, end):
+    rows = list(
+        ProjectAssignment.objects.filter(employee_id__in=users, start_date__lte=end)
+        .exclude(end_date__lt=start)
+        .values_list('employee_id', 'start_date', 'end_date', 'workload_percentage')
+    )
+    if not rows:
+        empty = np.array([], dtype='datetime64[D]')
+        return np.array([], dtype=np.int64), empty, empty, np.array([], dtype=float)
+    user_ids, starts, ends, percentages = zip(*rows)
+    ends = np.array(ends, dtype='datetime64[D]')
+    # Open-ended assignments run past any window
+    stops = np.where(np.isnat(ends), np.datetime64(end, 'D') + 1, ends + 1)
+    return (
+        np.array(user_ids, dtype=np.int64),
+        np.array(starts, dtype='datetime64[D]'),
+        stops,
+        np.array(percentages, dtype=float),
+    )
+
+
+def recommend_team(project, size, start, end, workload=FULL_TIME, department=None, min_level=MIN_LEVEL):
+    """The best ``size`` feasible candidates for ``project`` between ``start`` and ``end``."""
+    candidates = Employee.objects.filter(user__isnull=False).exclude(
+        user__projectassignment__project=project
+    )
+    if department:
+        candidates = candidates.filter(department=department)
+    rows = np.array(
+        list(candidates.order_by('user_id').values_list(
+            'id', 'user_id', 'current_workload_level', 'previous_workload_level'
+        )),
+        dtype=np.int64,
+    ).reshape(-1, 4)
+    employee_ids, user_ids = rows[:, 0], rows[:, 1]
+    current, previous = rows[:, 2].astype(float), rows[:, 3].astype(float)
+
+    assigned_users, starts, stops, percentages = _assignment_arrays(
+        candidates.values('user_id'), start, end
+    )
+    # user_ids is sorted, so each assignment finds its candidate by binary search
+    owners = np.searchsorted(user_ids, assigned_users)
+    mean, peak = window_allocation(owners, starts, stops, percentages, len(user_ids), start, end)
+
+    scores = score_candidates(current, previous, mean, settings.TEAM_SCORE_WEIGHTS)
+    feasible = (current >= min_level) & (peak + workload <= FULL_TIME)
+    scores = np.where(feasible, scores, -np.inf)
+    feasible_count = int(feasible.sum())
+    k = min(size, feasible_count)
+    best = np.argpartition(-scores, k - 1)[:k] if k else np.array([], dtype=np.int64)
+    best = best[np.argsort(-scores[best], kind='stable')]
+
+    details = Employee.objects.in_bulk(employee_ids[best].tolist())
+    team = []
+    for index in best.tolist():
+        employee = details[int(employee_ids[index])]
+        team.append({
+            'employee': employee.id,
+            'user': employee.user_id,
+            'name': employee.name,
+            'department': employee.department,
+            'current_workload_level': int(current[index]),
+            'previous_workload_level': int(previous[index]),
+            'mean_allocation': round(float(mean[index]), 1),
+            'peak_allocation': round(float(peak[index]), 1),
+            'score': round(float(scores[index]), 4),
+        })
+    return {
+        'candidates': len(user_ids),
+        'feasible': feasible_count,
+        'shortfall': size - len(team),
+        'team': team,
+    }
@@ -1,3 +1,192 @@
-from django.test import TestCase
+from datetime import date, timedelta
 
-# Create your tests here.
+import numpy as np
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, TestCase
+from rest_framework.test import APIClient
+
+from employees.models import Employee
+
+from .capacity import allocation_timelines, capacity_report
+from .models import Project, ProjectAssignment
+from .team import recommend_team, window_allocation
+
+START = date(2024, 1, 1)
+END = date(2024, 1, 31)
+
+
+def segment(start, end, allocation, projects):
+    return {'start': start, 'end': end, 'allocation': allocation, 'projects': projects}
+
+
+class AllocationTimelineTests(SimpleTestCase):
+    def test_back_to_back_assignments_do_not_overlap(self):
+        timelines = allocation_timelines([
+            (1, 10, date(2024, 1, 1), date(2024, 1, 10), 100),
+            (1, 20, date(2024, 1, 11), date(2024, 1, 20), 100),
+        ], START, END)
+        self.assertEqual(timelines[1], [
+            segment(date(2024, 1, 1), date(2024, 1, 10), 100, [10]),
+            segment(date(2024, 1, 11), date(2024, 1, 20), 100, [20]),
+        ])
+
+    def test_open_ended_assignments_run_to_the_end_of_the_range(self):
+        timelines = allocation_timelines([
+            (1, 10, date(2023, 12, 1), None, 50),
+            (2, 20, date(2024, 2, 1), None, 50),
+        ], START, END)
+        self.assertEqual(timelines, {1: [segment(START, END, 50, [10])]})
+
+    def test_overlapping_assignments_add_up(self):
+        timelines = allocation_timelines([
+            (1, 10, date(2024, 1, 1), date(2024, 1, 20), 60),
+            (1, 20, date(2024, 1, 10), None, 60),
+        ], START, END)
+        self.assertEqual(timelines[1], [
+            segment(date(2024, 1, 1), date(2024, 1, 9), 60, [10]),
+            segment(date(2024, 1, 10), date(2024, 1, 20), 120, [10, 20]),
+            segment(date(2024, 1, 21), END, 60, [20]),
+        ])
+
+
+class CapacityReportTests(SimpleTestCase):
+    def row(self, employee_id, project_id, start, end, percentage):
+        return {
+            'employee_id': employee_id, 'project_id': project_id, 'start_date': start,
+            'end_date': end, 'workload_percentage': percentage,
+            'employee__username': f'user{employee_id}', 'employee__first_name': '',
+            'employee__last_name': '', 'project__name': f'Project {project_id}',
+        }
+
+    def test_over_limit_periods_merge_and_idle_people_are_listed(self):
+        report = capacity_report(
+            [
+                self.row(1, 10, date(2024, 1, 1), date(2024, 1, 15), 80),
+                self.row(1, 20, date(2024, 1, 5), date(2024, 1, 9), 40),
+                self.row(1, 30, date(2024, 1, 10), date(2024, 1, 12), 50),
+            ],
+            START, END,
+            people=[
+                {'id': 1, 'username': 'user1', 'first_name': '', 'last_name': ''},
+                {'id': 2, 'username': 'idle', 'first_name': 'Ida', 'last_name': 'Le'},
+            ],
+        )
+        busy, idle = report['employees']
+        self.assertEqual(busy['peak_allocation'], 130)
+        self.assertEqual(busy['overallocated'], [{'start': date(2024, 1, 5), 'end': date(2024, 1, 12), 'peak': 130}])
+        self.assertEqual(
+            idle,
+            {'id': 2, 'username': 'idle', 'name': 'Ida Le', 'peak_allocation': 0, 'timeline': [], 'overallocated': []},
+        )
+
+    def test_exactly_full_time_is_not_over_the_limit(self):
+        report = capacity_report([self.row(1, 10, START, None, 100)], START, END)
+        self.assertEqual(report['employees'][0]['overallocated'], [])
+
+
+class CapacityViewTests(TestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.busy = User.objects.create_user(username='busy', password='pw12345678', department='Ops')
+        self.idle = User.objects.create_user(username='idle', password='pw12345678', department='Ops')
+        User.objects.create_user(username='other', password='pw12345678', department='Sales')
+        project = Project.objects.create(
+            name='Migration', description='', start_date=START, end_date=END, status='active'
+        )
+        ProjectAssignment.objects.create(
+            project=project, employee=self.busy, role='Dev', start_date=START, workload_percentage=70
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.busy)
+
+    def test_department_members_without_assignments_are_reported(self):
+        response = self.client.get(
+            '/api/projects/capacity/', {'department': 'Ops', 'start': '2024-01-01', 'end': '2024-01-31'}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [(entry['username'], entry['peak_allocation']) for entry in response.data['employees']],
+            [('busy', 70), ('idle', 0)],
+        )
+
+
+class WindowAllocationTests(SimpleTestCase):
+    def test_matches_the_allocation_timelines(self):
+        rng = np.random.default_rng(7)
+        people = 20
+        assignments = [(1, 10, date(2024, 1, 1), date(2024, 1, 10), 100), (1, 20, date(2024, 1, 11), None, 40)]
+        for index in range(200):
+            start = START + timedelta(days=int(rng.integers(-20, 40)))
+            end = None if rng.random() < 0.2 else start + timedelta(days=int(rng.integers(0, 30)))
+            assignments.append((
+                int(rng.integers(2, people)), index, start, end, int(rng.choice([10, 25, 50, 100]))
+            ))
+
+        ends = np.array([end for _, _, _, end, _ in assignments], dtype='datetime64[D]')
+        mean, peak = window_allocation(
+            np.array([owner for owner, *_ in assignments], dtype=np.int64),
+            np.array([start for _, _, start, _, _ in assignments], dtype='datetime64[D]'),
+            np.where(np.isnat(ends), np.datetime64(END, 'D') + 1, ends + 1),
+            np.array([percentage for *_, percentage in assignments], dtype=float),
+            people, START, END,
+        )
+
+        timelines = allocation_timelines(assignments, START, END)
+        days = (END - START).days + 1
+        for person in range(people):
+            timeline = timelines.get(person, [])
+            self.assertEqual(peak[person], max((part['allocation'] for part in timeline), default=0), person)
+            self.assertAlmostEqual(
+                mean[person],
+                sum(part['allocation'] * ((part['end'] - part['start']).days + 1) for part in timeline) / days,
+                msg=person,
+            )
+
+
+class RecommendTeamTests(TestCase):
+    def setUp(self):
+        self.project = Project.objects.create(
+            name='Launch', description='', start_date=START, end_date=END, status='active'
+        )
+        self.busy_project = Project.objects.create(
+            name='Support', description='', start_date=START, end_date=END, status='active'
+        )
+
+    def candidate(self, name, level, allocation=0):
+        user = get_user_model().objects.create_user(
+            username=name, email=f'{name}@example.com', password='pw12345678'
+        )
+        employee = Employee.objects.create(name=name, email=f'{name}@example.com', department='Ops')
+        # New employees start at level 3 whatever is passed in
+        Employee.objects.filter(pk=employee.pk).update(current_workload_level=level, previous_workload_level=level)
+        if allocation:
+            ProjectAssignment.objects.create(
+                project=self.busy_project, employee=user, role='Dev',
+                start_date=date(2024, 1, 10), end_date=date(2024, 1, 12), workload_percentage=allocation,
+            )
+        return user
+
+    def test_feasibility_and_shortfall(self):
+        self.candidate('rested', 5)
+        self.candidate('minimum', 3)
+        self.candidate('strained', 2)
+        self.candidate('booked', 5, allocation=60)
+        self.candidate('room', 4, allocation=50)
+
+        result = recommend_team(self.project, 4, START, END, workload=50)
+
+        self.assertEqual((result['candidates'], result['feasible'], result['shortfall']), (5, 3, 1))
+        self.assertEqual([member['name'] for member in result['team']], ['rested', 'room', 'minimum'])
+        self.assertEqual(result['team'][1]['peak_allocation'], 50)
+
+    def test_no_feasible_candidates(self):
+        self.candidate('strained', 1)
+        result = recommend_team(self.project, 2, START, END)
+        self.assertEqual((result['feasible'], result['shortfall'], result['team']), (0, 2, []))
+
+    def test_people_already_on_the_project_are_not_candidates(self):
+        member = self.candidate('member', 5)
+        ProjectAssignment.objects.create(
+            project=self.project, employee=member, role='Dev', start_date=START, workload_percentage=10
+        )
+        self.assertEqual(recommend_team(self.project, 1, START, END)['candidates'], 0)
@@ -4,6 +4,8 @@ from . import views
 urlpatterns = [
     path('', views.ProjectListView.as_view(), name='project-list'),
     path('<int:pk>/', views.ProjectDetailView.as_view(), name='project-detail'),
+    path('<int:pk>/team-recommendation/', views.TeamRecommendationView.as_view(), name='project-team-recommendation'),
     path('assignments/', views.ProjectAssignmentView.as_view(), name='project-assignments'),
     path('metrics/', views.ProjectMetricsView.as_view(), name='project-metrics'),
+    path('capacity/', views.CapacityView.as_view(), name='project-capacity'),
 ] 
\ No newline at end of file
@@ -1,7 +1,17 @@
-from django.shortcuts import render
-from rest_framework import generics, permissions
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.db.models import Avg, Count, Q
+from django.shortcuts import get_object_or_404, render
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from rest_framework import generics, permissions, status
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from .capacity import FULL_TIME, capacity_report
 from .models import Project, ProjectAssignment
-from .serializers import ProjectSerializer, ProjectAssignmentSerializer
+from .serializers import ProjectSerializer, ProjectAssignmentSerializer, ProjectMetricsSerializer
+from .team import MIN_LEVEL, recommend_team
 
 class ProjectListView(generics.ListCreateAPIView):
     queryset = Project.objects.all()
@@ -21,10 +31,133 @@ class ProjectAssignmentView(generics.ListCreateAPIView):
         return ProjectAssignment.objects.filter(employee=self.request.user)
 
 class ProjectMetricsView(generics.ListAPIView):
-    serializer_class = ProjectSerializer
+    """The user's projects with the workload of their current team.
+
+    Workload comes from the Employee record linked to each assigned user (see
+    link_employee_users); everything is aggregated in one joined query.
+    """
+    serializer_class = ProjectMetricsSerializer
     permission_classes = (permissions.IsAuthenticated,)
 
     def get_queryset(self):
+        today = timezone.localdate()
+        current = Q(projectassignment__end_date__isnull=True) | Q(projectassignment__end_date__gte=today)
+        level = 'projectassignment__employee__employee_profile__current_workload_level'
+        # Restrict by subquery: filtering on the user's own assignment in the same
+        # join would limit the aggregates to that one row
         return Project.objects.filter(
-            projectassignment__employee=self.request.user
-        ).distinct()
+            id__in=ProjectAssignment.objects.filter(employee=self.request.user).values('project_id')
+        ).annotate(
+            team_size=Count('projectassignment', filter=current),
+            workload_reported=Count(level, filter=current),
+            mean_workload_level=Avg(level, filter=current),
+            high_stress_count=Count(level, filter=current & Q(**{f'{level}__lte': 2})),
+        ).order_by('name', 'id')
+
+def _date_param(request, name):
+    value = request.query_params.get(name)
+    if not value:
+        return None
+    parsed = parse_date(value)
+    if parsed is None:
+        raise ValueError(f'{name} must be a date (YYYY-MM-DD)')
+    return parsed
+
+class CapacityView(APIView):
+    """Allocation timelines and over-allocated periods for a department or some employees.
+
+    ?department= and/or repeated ?employee=<user id>, with ?start= and ?end= (ISO dates,
+    default the next 90 days) and ?limit= (percent, default 100). Selected people with
+    no assignment in the range are listed at zero allocation. The people and their
+    assignments take one query each; the timelines are computed in memory (see
+    capacity.py).
+    """
+    permission_classes = (permissions.IsAuthenticated,)
+
+    def get(self, request):
+        department = request.query_params.get('department')
+        employee_ids = request.query_params.getlist('employee')
+        if not department and not employee_ids:
+            return Response(
+                {'error': 'department or employee is required'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            start = _date_param(request, 'start') or timezone.localdate()
+            end = _date_param(request, 'end') or start + timedelta(days=90)
+            limit = int(request.query_params.get('limit', FULL_TIME))
+            employee_ids = [int(employee_id) for employee_id in employee_ids]
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        if end < start:
+            return Response(
+                {'error': 'end must not be before start'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        # Everyone selected is reported, including those with nothing assigned: they
+        # are the ones with spare capacity
+        people = get_user_model().objects.all()
+        if department:
+            people = people.filter(department=department)
+        if employee_ids:
+            people = people.filter(id__in=employee_ids)
+
+        assignments = ProjectAssignment.objects.filter(
+            employee_id__in=people.values('id'), start_date__lte=end
+        ).filter(Q(end_date__isnull=True) | Q(end_date__gte=start))
+        rows = list(assignments.order_by().values(
+            'employee_id', 'project_id', 'start_date', 'end_date', 'workload_percentage',
+            'employee__username', 'employee__first_name', 'employee__last_name', 'project__name',
+        ))
+        people = people.order_by().values('id', 'username', 'first_name', 'last_name')
+
+        report = capacity_report(rows, start, end, limit, people)
+        return Response({
+            'department': department,
+            'start': start,
+            'end': end,
+            'limit': limit,
+            **report,
+        })
+
+class TeamRecommendationView(APIView):
+    """The best feasible team of ?size= people for a project; see team.py.
+
+    ?start= and ?end= default to the project's dates, ?workload= (percent, default
+    100) is the allocation the new assignment needs, and ?department= and
+    ?min_level= (default 3) narrow the candidates.
+    """
+    permission_classes = (permissions.IsAuthenticated,)
+
+    def get(self, request, pk):
+        project = get_object_or_404(Project, pk=pk)
+        try:
+            if not request.query_params.get('size'):
+                raise ValueError('size is required')
+            size = int(request.query_params['size'])
+            workload = int(request.query_params.get('workload', FULL_TIME))
+            min_level = int(request.query_params.get('min_level', MIN_LEVEL))
+            start = _date_param(request, 'start') or project.start_date
+            end = _date_param(request, 'end') or project.end_date
+            if size < 1:
+                raise ValueError('size must be a positive integer')
+            if not 0 < workload <= FULL_TIME:
+                raise ValueError(f'workload must be between 1 and {FULL_TIME}')
+            if end < start:
+                raise ValueError('end must not be before start')
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        recommendation = recommend_team(
+            project, size, start, end, workload=workload,
+            department=request.query_params.get('department'), min_level=min_level,
+        )
+        return Response({
+            'project': project.id,
+            'start': start,
+            'end': end,
+            'size': size,
+            'workload': workload,
+            **recommendation,
+        })
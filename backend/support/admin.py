@@ -1,3 +1,13 @@
 from django.contrib import admin
 
-# Register your models here.
+from .models import LLMCallRecord
+
+
+@admin.register(LLMCallRecord)
+class LLMCallRecordAdmin(admin.ModelAdmin):
+    list_display = (
+        'started_at', 'endpoint', 'kind', 'model', 'outcome', 'duration_ms',
+        'prompt_tokens', 'completion_tokens',
+    )
+    list_filter = ('endpoint', 'kind', 'model', 'outcome')
+    date_hierarchy = 'started_at'
@@ -0,0 +1,272 @@
+"""
+Async-native versions of the LLM-bound support endpoints.
+
+These views spend nearly all their time waiting on OpenAI, so under ASGI they yield the
+event loop instead of pinning a worker per in-flight request. ``core/asgi.py`` enables
+``SUPPORT_ASYNC_VIEWS`` so that ``support/urls.py`` routes the chat and support action
+URLs here; under WSGI the DRF views in ``views.py`` keep serving them.
+"""
+import functools
+import json
+import logging
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import JsonResponse
+from rest_framework import exceptions, status
+from rest_framework_simplejwt.authentication import JWTAuthentication
+
+from .chatlog import alog_turn
+from .guidelines import (
+    NO_GUIDELINES_RESPONSE, PROCESSING_RESPONSE, RETRIEVAL_MODES,
+    arelevant_guidelines, is_indexed, aanswer_question
+)
+from .instrumentation import instrument_endpoint
+from .llm import support_action_messages, acreate_chat_completion, parse_support_action
+from .memory import abuild_chat_messages, schedule_summary_update
+from .models import SupportActionHistory
+from .pagination import page_size
+from .support_actions import (
+    agenerate_support_actions, batch_selection, employee_levels, support_action_history
+)
+
+logger = logging.getLogger(__name__)
+
+_authenticator = JWTAuthentication()
+
+
+async def _authenticate(request):
+    try:
+        result = await sync_to_async(_authenticator.authenticate)(request)
+    except exceptions.AuthenticationFailed:
+        return None
+    if result is None:
+        return None
+    return result[0]
+
+
+def async_api_view(methods):
+    """Minimal async stand-in for DRF's ``@api_view`` with JWT authentication.
+
+    Sets ``request.user`` and, for requests with a JSON object body, ``request.data``.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            if request.method not in methods:
+                return JsonResponse(
+                    {'detail': f'Method "{request.method}" not allowed.'},
+                    status=status.HTTP_405_METHOD_NOT_ALLOWED
+                )
+
+            user = await _authenticate(request)
+            if user is None or not user.is_active:
+                return JsonResponse(
+                    {'detail': 'Authentication credentials were not provided.'},
+                    status=status.HTTP_401_UNAUTHORIZED
+                )
+            request.user = user
+
+            request.data = {}
+            if request.body:
+                try:
+                    request.data = json.loads(request.body)
+                except json.JSONDecodeError:
+                    return JsonResponse(
+                        {'error': 'Request body must be valid JSON'},
+                        status=status.HTTP_400_BAD_REQUEST
+                    )
+                if not isinstance(request.data, dict):
+                    return JsonResponse(
+                        {'error': 'Request body must be a JSON object'},
+                        status=status.HTTP_400_BAD_REQUEST
+                    )
+            return await view(request, *args, **kwargs)
+
+        # Token authenticated, like the DRF views. Set directly because csrf_exempt()
+        # only learns to wrap coroutine functions in Django 5.0.
+        wrapper.csrf_exempt = True
+        return wrapper
+    return decorator
+
+
+@async_api_view(['POST'])
+@instrument_endpoint('chat')
+async def chat(request):
+    try:
+        user_message = request.data.get('message', '')
+        if not user_message:
+            return JsonResponse(
+                {'error': 'Message is required'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        if not settings.OPENAI_API_KEY:
+            return JsonResponse(
+                {'error': 'OpenAI API key is not configured'},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+        try:
+            messages = await abuild_chat_messages(request.user, user_message)
+            ai_response = await acreate_chat_completion(messages)
+        except Exception as openai_error:
+            logger.exception("OpenAI API error in chat for user %s", request.user.id)
+            return JsonResponse(
+                {'error': f'Error communicating with OpenAI: {str(openai_error)}'},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+        try:
+            await alog_turn(request.user, user_message, ai_response)
+        except Exception:
+            logger.exception("Failed to save chat history for user %s", request.user.id)
+            # Even if saving fails, still return the AI response
+            return JsonResponse({
+                'response': ai_response,
+                'warning': 'Failed to save chat history'
+            })
+
+        schedule_summary_update(request.user)
+
+        return JsonResponse({'response': ai_response})
+
+    except Exception as e:
+        logger.exception("Unexpected error in chat")
+        return JsonResponse(
+            {'error': str(e)},
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
+
+@async_api_view(['POST'])
+@instrument_endpoint('guideline-chat')
+async def guideline_chat(request):
+    try:
+        message = request.data.get('message')
+        workload_level = request.data.get('workload_level')
+        retrieval_mode = request.data.get('retrieval_mode') or settings.GUIDELINE_RETRIEVAL_MODE
+
+        if retrieval_mode not in RETRIEVAL_MODES:
+            return JsonResponse(
+                {'error': f"retrieval_mode must be one of {', '.join(RETRIEVAL_MODES)}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        relevant_docs = await arelevant_guidelines(workload_level)
+
+        if not relevant_docs:
+            response = NO_GUIDELINES_RESPONSE
+        elif not is_indexed(relevant_docs):
+            response = PROCESSING_RESPONSE
+        else:
+            response = await aanswer_question(relevant_docs, message, retrieval_mode)
+
+        await alog_turn(request.user, message, response, workload_level)
+        return JsonResponse({'response': response}, status=status.HTTP_200_OK)
+
+    except Exception as e:
+        return JsonResponse(
+            {'error': str(e)},
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
+
+@async_api_view(['GET', 'POST'])
+@instrument_endpoint('support-action')
+async def generate_support_action(request):
+    if request.method == 'GET':
+        return await _support_action_history(request)
+
+    try:
+        employee_id = request.data.get('employeeId')
+        current_level = request.data.get('currentWorkloadLevel')
+        previous_level = request.data.get('previousWorkloadLevel')
+        is_current_positive = request.data.get('isCurrentPositive')
+        is_previous_positive = request.data.get('isPreviousPositive')
+
+        if not all([employee_id, current_level, previous_level]):
+            return JsonResponse(
+                {'error': 'Missing required fields'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        response_text = await acreate_chat_completion(
+            support_action_messages(current_level, previous_level, is_current_positive, is_previous_positive),
+            max_tokens=300
+        )
+
+        response_data, is_structured = parse_support_action(response_text)
+        if is_structured:
+            await SupportActionHistory.objects.acreate(
+                employee_id=employee_id,
+                current_workload_level=current_level,
+                previous_workload_level=previous_level,
+                immediate_action=response_data['immediate_action'],
+                long_term_strategy=response_data['long_term_strategy'],
+                resources=response_data['resources'],
+                priority_level=response_data['priority_level'],
+                created_by=request.user
+            )
+
+        return JsonResponse(response_data)
+
+    except Exception as e:
+        return JsonResponse(
+            {'error': str(e)},
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
+
+@async_api_view(['POST'])
+@instrument_endpoint('support-action-batch')
+async def batch_generate_support_actions(request):
+    try:
+        department, employee_ids = batch_selection(request.data)
+    except (TypeError, ValueError) as e:
+        return JsonResponse({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        employees = [employee async for employee in employee_levels(department, employee_ids)]
+        if not employees:
+            return JsonResponse(
+                {'error': 'No matching employees'},
+                status=status.HTTP_404_NOT_FOUND
+            )
+
+        results, distinct_prompts = await agenerate_support_actions(employees, request.user)
+        return JsonResponse({
+            'count': len(results),
+            'distinctPrompts': distinct_prompts,
+            'results': results,
+        })
+    except Exception as e:
+        return JsonResponse(
+            {'error': str(e)},
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
+
+async def _support_action_history(request):
+    try:
+        employee_id = request.GET.get('employeeId')
+        if not employee_id:
+            return JsonResponse(
+                {'error': 'Employee ID is required'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        try:
+            limit = page_size(request.GET.get('limit'))
+            history = await sync_to_async(support_action_history)(
+                employee_id, request.GET.get('cursor'), limit
+            )
+        except ValueError as e:
+            return JsonResponse({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        return JsonResponse(history)
+    except Exception as e:
+        return JsonResponse(
+            {'error': str(e)},
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
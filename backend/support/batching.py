@@ -0,0 +1,231 @@
+"""
+Write-behind batching of model rows that do not need to be saved synchronously.
+"""
+import atexit
+import fcntl
+import logging
+import os
+import threading
+import uuid
+
+from django.core import serializers
+from django.db import OperationalError, close_old_connections
+
+logger = logging.getLogger(__name__)
+
+# Spool segments that could not be replayed are renamed with this suffix
+FAILED_SUFFIX = '.failed'
+# New spool segments carry this suffix until their writer holds the lock
+PENDING_SUFFIX = '.tmp'
+
+
+class BatchWriter:
+    """Buffers unsaved ``model`` instances and bulk-creates them from a background thread.
+
+    ``add`` never touches the database, so it is safe to call from async code. A flush
+    happens once ``batch_size`` rows are waiting, every ``flush_interval`` seconds, and
+    at interpreter exit.
+    """
+
+    def __init__(self, model, batch_size=100, flush_interval=5.0):
+        self.model = model
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._buffer = []
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+
+    def add(self, instance):
+        with self._lock:
+            self._buffer.append(instance)
+            pending = len(self._buffer)
+            self._start()
+        if pending >= self.batch_size:
+            self._wake.set()
+
+    def _start(self):
+        # Called with the lock held
+        if self._thread is None:
+            self._thread = threading.Thread(
+                target=self._run, name=f'{self.model.__name__}-writer', daemon=True
+            )
+            self._thread.start()
+            atexit.register(self.flush)
+
+    def pending(self):
+        with self._lock:
+            return list(self._buffer)
+
+    def flush(self):
+        """Save everything buffered so far; returns the number of rows written."""
+        with self._lock:
+            batch, self._buffer = self._buffer, []
+        if batch:
+            self.model.objects.bulk_create(batch, batch_size=self.batch_size)
+        return len(batch)
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Failed to write buffered %s rows", self.model.__name__)
+            finally:
+                close_old_connections()
+
+
+class SpooledBatchWriter(BatchWriter):
+    """BatchWriter that also appends each row to a local spool file until it is saved.
+
+    Each process writes to its own spool segment and holds an exclusive ``flock`` on it.
+    A flush starts a new segment and deletes the old one once its rows are committed. A
+    segment nobody holds a lock on belongs to a process that died (or a flush that
+    failed) and is replayed by the next writer to look. ``unique_field`` must be a unique
+    column set when the row is created, so a replay of rows that did reach the database
+    is ignored rather than duplicated.
+
+    Rows are visible through ``pending`` from the moment they are added until their
+    batch is committed.
+    """
+
+    def __init__(self, model, spool_dir, batch_size=100, flush_interval=5.0, unique_field='log_id'):
+        super().__init__(model, batch_size, flush_interval)
+        self.spool_dir = str(spool_dir)
+        self.unique_field = unique_field
+        self._prefix = f'{model._meta.label_lower}-'
+        self._spool = None
+        self._spool_path = None
+        self._in_flight = []
+
+    def add(self, instance):
+        line = serializers.serialize('json', [instance])
+        with self._lock:
+            # Spool and buffer change together, so a row is never in the buffer of one
+            # flush and the spool segment of another.
+            spool = self._segment()
+            spool.write(line + '\n')
+            spool.flush()
+            self._buffer.append(instance)
+            pending = len(self._buffer)
+            self._start()
+        if pending >= self.batch_size:
+            self._wake.set()
+
+    def pending(self):
+        with self._lock:
+            return [instance for batch in self._in_flight for instance in batch] + self._buffer
+
+    def _segment(self):
+        if self._spool is None:
+            os.makedirs(self.spool_dir, exist_ok=True)
+            path = os.path.join(
+                self.spool_dir, f'{self._prefix}{os.getpid()}-{uuid.uuid4().hex[:12]}.jsonl'
+            )
+            # Locked under a name recover() skips, so no other process can replay and
+            # delete the segment between creating and locking it
+            spool = open(path + PENDING_SUFFIX, 'a', encoding='utf-8')
+            fcntl.flock(spool, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            os.rename(path + PENDING_SUFFIX, path)
+            self._spool, self._spool_path = spool, path
+        return self._spool
+
+    def flush(self):
+        with self._lock:
+            batch, self._buffer = self._buffer, []
+            spool, self._spool = self._spool, None
+            path, self._spool_path = self._spool_path, None
+            self._in_flight.append(batch)
+        try:
+            if batch:
+                self.model.objects.bulk_create(batch, batch_size=self.batch_size)
+        except Exception:
+            if spool is not None:
+                spool.close()  # Releases the lock: the next recovery replays it
+            raise
+        finally:
+            with self._lock:
+                self._in_flight.remove(batch)
+        if spool is not None:
+            os.remove(path)
+            spool.close()
+        return len(batch)
+
+    def recover(self):
+        """Replay spool segments no live writer holds; returns the number of rows replayed.
+
+        A segment that fails for any reason but a database outage (say a row whose
+        foreign key target was deleted since it was spooled) is renamed to
+        ``<segment>.failed`` and left for an operator, so it cannot hold up the others.
+        """
+        try:
+            names = sorted(os.listdir(self.spool_dir))
+        except FileNotFoundError:
+            return 0
+        replayed = 0
+        for name in names:
+            if not (name.startswith(self._prefix) and name.endswith('.jsonl')):
+                continue
+            path = os.path.join(self.spool_dir, name)
+            try:
+                spool = open(path, 'r', encoding='utf-8')
+            except FileNotFoundError:
+                continue
+            with spool:
+                try:
+                    fcntl.flock(spool, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    continue
+                try:
+                    rows = self._replay(spool, path)
+                except OperationalError:
+                    # The database is unreachable or locked: retry on the next pass
+                    logger.exception("Failed to replay %s; will retry", path)
+                    continue
+                except Exception:
+                    logger.exception("Failed to replay %s; moving it to %s%s", path, path, FAILED_SUFFIX)
+                    os.replace(path, path + FAILED_SUFFIX)
+                    continue
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+            replayed += rows
+        if replayed:
+            logger.info("Replayed %d spooled %s rows", replayed, self.model.__name__)
+        return replayed
+
+    def _replay(self, spool, path):
+        rows = []
+        for line in spool:
+            try:
+                rows.extend(obj.object for obj in serializers.deserialize('json', line))
+            except serializers.base.DeserializationError:
+                # A torn final line from a crash mid-write
+                logger.warning("Skipping unreadable line in %s", path)
+        if rows:
+            self.model.objects.bulk_create(rows, batch_size=self.batch_size, ignore_conflicts=True)
+        return len(rows)
+
+    def _start(self):
+        if self._thread is None:
+            super()._start()
+            self._wake.set()  # Recover leftover segments straight away
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Failed to write buffered %s rows", self.model.__name__)
+            try:
+                # Also picks up the segment of a flush that just failed
+                self.recover()
+            except Exception:
+                logger.exception("Failed to replay spooled %s rows", self.model.__name__)
+            finally:
+                close_old_connections()
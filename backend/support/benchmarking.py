@@ -0,0 +1,245 @@
+"""
+Helpers shared by the support app's benchmark management commands.
+"""
+import asyncio
+import hashlib
+import json
+import math
+import random
+import threading
+import time
+from collections import Counter
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from .bm25 import tokenize
+from .tokens import count_tokens
+
+
+class SlowFakeLLM:
+    """Local OpenAI-compatible chat completions server that answers after ``delay`` seconds.
+
+    Runs an asyncio server on a background thread so it can hold thousands of requests
+    open at once, and counts how many were in flight concurrently.
+    """
+
+    def __init__(self, delay=1.0, host='127.0.0.1', port=0, reply='This is a benchmark reply.'):
+        self.delay = delay
+        self.host = host
+        self.port = port
+        self.reply = reply
+        self.requests_served = 0
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self._loop = None
+        self._server = None
+        self._thread = None
+        self._ready = threading.Event()
+
+    @property
+    def base_url(self):
+        return f'http://{self.host}:{self.port}/v1'
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        self._ready.wait()
+
+    def stop(self):
+        if self._loop is not None:
+            asyncio.run_coroutine_threadsafe(self._shutdown(), self._loop).result()
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+            self._loop = None
+
+    def reset_counters(self):
+        self.requests_served = 0
+        self.peak_in_flight = 0
+
+    def _run(self):
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        self._server = self._loop.run_until_complete(
+            asyncio.start_server(self._handle, self.host, self.port, backlog=4096)
+        )
+        self.port = self._server.sockets[0].getsockname()[1]
+        self._ready.set()
+        try:
+            self._loop.run_forever()
+        finally:
+            self._loop.close()
+
+    async def _shutdown(self):
+        self._server.close()
+        # Drop idle keep-alive connections still parked in _handle.
+        current = asyncio.current_task()
+        handlers = [task for task in asyncio.all_tasks() if task is not current]
+        for task in handlers:
+            task.cancel()
+        await asyncio.gather(*handlers, return_exceptions=True)
+
+    async def _handle(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                content_length = 0
+                while True:
+                    header = await reader.readline()
+                    if header in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = header.decode('latin-1').partition(':')
+                    if name.strip().lower() == 'content-length':
+                        content_length = int(value.strip())
+                body = await reader.readexactly(content_length) if content_length else b''
+
+                self.in_flight += 1
+                self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+                try:
+                    await asyncio.sleep(self.delay)
+                    payload = json.dumps(self._completion(body)).encode()
+                finally:
+                    self.in_flight -= 1
+                self.requests_served += 1
+
+                writer.write(
+                    b'HTTP/1.1 200 OK\r\n'
+                    b'Content-Type: application/json\r\n'
+                    b'Content-Length: ' + str(len(payload)).encode() + b'\r\n'
+                    b'\r\n' + payload
+                )
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.CancelledError):
+            pass
+        finally:
+            writer.close()
+
+    def _completion(self, body):
+        try:
+            request = json.loads(body)
+        except ValueError:
+            request = {}
+        model = request.get('model', 'fake')
+        prompt_tokens = sum(count_tokens(message.get('content')) for message in request.get('messages', []))
+        completion_tokens = count_tokens(self.reply)
+        return {
+            'id': 'chatcmpl-benchmark',
+            'object': 'chat.completion',
+            'created': int(time.time()),
+            'model': model,
+            'choices': [{
+                'index': 0,
+                'message': {'role': 'assistant', 'content': self.reply},
+                'finish_reason': 'stop',
+            }],
+            'usage': {
+                'prompt_tokens': prompt_tokens,
+                'completion_tokens': completion_tokens,
+                'total_tokens': prompt_tokens + completion_tokens,
+            },
+        }
+
+
+class HashingEmbeddings(Embeddings):
+    """Deterministic local stand-in for OpenAI embeddings.
+
+    Hashes each token into one of ``size`` signed buckets (log-scaled term frequency)
+    and L2-normalizes, so texts sharing words are close in L2 distance. Stable across
+    processes and machines, with no network calls.
+    """
+
+    def __init__(self, size=384):
+        self.size = size
+
+    def _embed(self, text):
+        vector = np.zeros(self.size, dtype='float32')
+        for token, count in Counter(tokenize(text)).items():
+            digest = hashlib.blake2b(token.encode('utf-8'), digest_size=8).digest()
+            bucket = int.from_bytes(digest[:4], 'little') % self.size
+            sign = 1.0 if digest[4] & 1 else -1.0
+            vector[bucket] += sign * (1 + math.log(count))
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+    def embed_documents(self, texts):
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text):
+        return self._embed(text)
+
+
+GUIDELINE_TOPICS = {
+    'sleep': 'sleep rest fatigue night routine tired recovery insomnia schedule energy',
+    'breaks': 'break pause walk stretch screen microbreak lunch away desk recharge',
+    'workload': 'workload tasks priorities capacity overload backlog delegate scope estimate planning',
+    'conflict': 'conflict disagreement colleague mediation tension respectful escalate feedback resolve listen',
+    'burnout': 'burnout exhaustion cynicism detachment warning signs chronic stress depletion overwhelm',
+    'communication': 'communication meeting update expectations transparent check-in manager channel clarity',
+    'ergonomics': 'ergonomics posture chair monitor keyboard lighting workstation strain wrist neck',
+    'leave': 'leave vacation sick absence time-off holiday return phased reintegration approval',
+    'deadlines': 'deadline timeline milestone extension urgency renegotiate buffer realistic commitment',
+    'remote': 'remote home office boundaries isolation video commute hybrid availability notifications',
+}
+FILLER = (
+    'employees managers should team support help when where possible always consider '
+    'ensure provide regular appropriate plan review discuss agree document follow'
+).split()
+SYLLABLES = ('ka', 'lo', 'mi', 'ne', 'ru', 'ta', 'vo', 'zi', 'pe', 'sa', 'do', 'fu', 'gri', 'bel', 'mor')
+
+
+def synthetic_guidelines(documents=20, sections=40, queries=200, seed=0):
+    """Generate a labelled guideline corpus.
+
+    Returns ``(texts, labelled_queries)``: one plain-text guideline per document and
+    ``(question, anchors)`` pairs. Every section mixes topic vocabulary with three
+    invented anchor terms unique to it; a question names two of its section's anchors
+    plus topic words, and a retrieved chunk is relevant if it contains any of
+    ``anchors``.
+    """
+    rng = random.Random(seed)
+    topics = list(GUIDELINE_TOPICS)
+    used = set()
+
+    def anchor():
+        while True:
+            term = ''.join(rng.choice(SYLLABLES) for _ in range(4))
+            if term not in used:
+                used.add(term)
+                return term
+
+    texts = []
+    sections_index = []
+    for number in range(documents):
+        parts = [f'Workplace wellbeing guideline {number + 1}']
+        for section in range(sections):
+            topic = rng.choice(topics)
+            vocabulary = GUIDELINE_TOPICS[topic].split()
+            anchors = [anchor() for _ in range(3)]
+            sentences = []
+            for _ in range(8):
+                words = rng.sample(vocabulary, 4) + rng.sample(FILLER, 5)
+                if rng.random() < 0.5:
+                    words.append(rng.choice(anchors))
+                rng.shuffle(words)
+                sentences.append(' '.join(words).capitalize() + '.')
+            sentences.insert(rng.randrange(len(sentences)), f"The {' '.join(anchors)} procedure applies here.")
+            parts.append(f"Section {section + 1}: {topic}\n" + ' '.join(sentences))
+            sections_index.append((topic, anchors))
+        texts.append('\n\n'.join(parts))
+
+    labelled = []
+    for _ in range(queries):
+        topic, anchors = rng.choice(sections_index)
+        words = rng.sample(GUIDELINE_TOPICS[topic].split(), 2)
+        asked = rng.sample(anchors, 2)
+        labelled.append((f"What does the {asked[0]} {asked[1]} guidance say about {' and '.join(words)}?", anchors))
+    return texts, labelled
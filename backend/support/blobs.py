@@ -0,0 +1,267 @@
+"""
+Content-addressed blob store and resumable chunked uploads.
+
+Every file saved through ``blob_storage`` (Resource and GuidelineDocument uploads) is
+streamed to a temporary file while it is hashed, then moved to
+``blobs/<aa>/<bb>/<sha256><ext>``; if that content is already stored the copy is simply
+dropped. A Blob row per file counts the rows referencing it, kept up to date by the
+post_save/post_delete receivers in signals.py (and by ``replace_document``, which swaps
+files with a queryset update). Unreferenced blobs are deleted by ``gc_blobs`` once they
+have been unused for a while, so a file saved just before its row never loses it.
+
+Large files can instead arrive as an UploadSession, in chunks written at an explicit
+offset: a dropped connection resumes from the last byte received. Chunks are hashed as
+they are written while they keep arriving at the same process, and the file is hashed
+once more at the end otherwise.
+"""
+import fcntl
+import hashlib
+import os
+import re
+import tempfile
+import threading
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from .models import Blob, UploadSession
+from .storage import blob_storage
+
+BLOB_DIR = 'blobs'
+TEMP_DIR = f'{BLOB_DIR}/tmp'
+UPLOAD_DIR = f'{BLOB_DIR}/uploads'
+COPY_BUFFER = 64 * 1024
+
+
+class UploadOffsetMismatch(Exception):
+    """A chunk did not start where the upload stands; ``offset`` is where it does."""
+
+    def __init__(self, offset):
+        super().__init__(f'Upload is at byte {offset}')
+        self.offset = offset
+
+
+def is_blob(name):
+    return bool(name) and name.startswith(f'{BLOB_DIR}/')
+
+
+def blob_name(sha256, extension=''):
+    return f'{BLOB_DIR}/{sha256[:2]}/{sha256[2:4]}/{sha256}{extension}'
+
+
+def _extension(name):
+    # Loaders pick a parser by extension, so blobs keep the one they arrived with
+    extension = os.path.splitext(name or '')[1].lower()
+    return extension if re.fullmatch(r'\.[a-z0-9]{1,10}', extension) else ''
+
+
+def _directory(name):
+    path = blob_storage.path(name)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+@contextmanager
+def _store_lock():
+    # Serializes adding and collecting blobs across processes
+    with open(os.path.join(_directory(BLOB_DIR), '.lock'), 'a') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        yield
+
+
+def commit_file(path, sha256, size, name):
+    """Move the complete file at ``path`` into the store and return its blob name.
+
+    If the content is stored already, ``path`` is deleted instead. ``name`` only
+    supplies the extension of a new blob.
+    """
+    with _store_lock():
+        blob = Blob.objects.filter(sha256=sha256).first()
+        stored_name = blob.file if blob is not None else blob_name(sha256, _extension(name))
+        target = blob_storage.path(stored_name)
+        if os.path.exists(target):
+            os.remove(path)
+        else:
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            os.replace(path, target)
+        # ref_count is only ever changed in SQL (acquire, release): writing back the
+        # row read above would undo a concurrent acquire
+        if blob is None:
+            Blob.objects.create(sha256=sha256, file=stored_name, size=size)
+        else:
+            # Restarts the grace period gc_blobs gives unreferenced blobs
+            Blob.objects.filter(pk=blob.pk).update(updated_at=timezone.now())
+    return stored_name
+
+
+def store_chunks(chunks, name):
+    """Write ``chunks`` (bytes) to the store, hashing as they are written; returns the blob name."""
+    fd, path = tempfile.mkstemp(dir=_directory(TEMP_DIR))
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        with os.fdopen(fd, 'wb') as temp:
+            for chunk in chunks:
+                digest.update(chunk)
+                temp.write(chunk)
+                size += len(chunk)
+        return commit_file(path, digest.hexdigest(), size, name)
+    finally:
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def acquire(name):
+    if is_blob(name):
+        Blob.objects.filter(file=name).update(ref_count=F('ref_count') + 1, updated_at=timezone.now())
+
+
+def release(name):
+    if is_blob(name):
+        Blob.objects.filter(file=name).update(
+            ref_count=Greatest(F('ref_count') - 1, 0), updated_at=timezone.now()
+        )
+
+
+def collect_garbage(min_age_hours, dry_run=False):
+    """Delete blobs unreferenced for ``min_age_hours`` and uploads idle that long.
+
+    Returns ``(blobs removed, bytes freed, uploads removed)``.
+    """
+    cutoff = timezone.now() - timedelta(hours=min_age_hours)
+    removed = freed = 0
+    for blob in Blob.objects.filter(ref_count=0, updated_at__lt=cutoff):
+        if dry_run:
+            removed += 1
+            freed += blob.size
+            continue
+        with _store_lock():
+            # Re-checked under the lock: the same content may just have been stored again
+            deleted, _ = Blob.objects.filter(pk=blob.pk, ref_count=0, updated_at__lt=cutoff).delete()
+            if deleted:
+                blob_storage.delete(blob.file)
+                removed += 1
+                freed += blob.size
+
+    stale = UploadSession.objects.filter(updated_at__lt=cutoff)
+    uploads = stale.count()
+    if not dry_run:
+        for session in stale:
+            discard_upload(session)
+    return removed, freed, uploads
+
+
+def start_upload(user, filename, size):
+    if size <= 0 or size > settings.UPLOAD_MAX_BYTES:
+        raise ValueError(f'size must be between 1 and {settings.UPLOAD_MAX_BYTES} bytes')
+    return UploadSession.objects.create(user=user, filename=os.path.basename(filename)[:255], size=size)
+
+
+def _part_path(session):
+    return os.path.join(_directory(UPLOAD_DIR), f'{session.pk}.part')
+
+
+# This process's running hash of each upload: {session id: (bytes hashed, hasher)}
+_hashers = {}
+_hashers_lock = threading.Lock()
+
+
+def _take_hasher(session_id, offset):
+    with _hashers_lock:
+        entry = _hashers.pop(session_id, None)
+    if offset == 0:
+        return hashlib.sha256()
+    if entry is not None and entry[0] == offset:
+        return entry[1]
+    # Earlier chunks went to another process; hash the whole file at the end
+    return None
+
+
+def _file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as part:
+        for chunk in iter(lambda: part.read(COPY_BUFFER), b''):
+            digest.update(chunk)
+    return digest
+
+
+def append_chunk(session, offset, stream, length):
+    """Write ``length`` bytes read from ``stream`` at byte ``offset`` of the upload.
+
+    Raises UploadOffsetMismatch unless ``offset`` is where the upload stands (or while
+    another request is writing to it). Bytes received before the client went away are
+    kept. The upload completes when its last byte arrives; returns the session.
+    """
+    if session.complete:
+        raise ValueError('Upload is already complete')
+    if length <= 0 or offset + length > session.size:
+        raise ValueError(f'Chunk must be non-empty and end within {session.size} bytes')
+
+    path = _part_path(session)
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+    with os.fdopen(fd, 'r+b') as part:
+        try:
+            fcntl.flock(part, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            raise UploadOffsetMismatch(session.received)
+        session.refresh_from_db(fields=['received'])
+        if offset != session.received:
+            raise UploadOffsetMismatch(session.received)
+
+        # Bytes past ``received`` are from a write that never got recorded
+        part.truncate(offset)
+        part.seek(offset)
+        hasher = _take_hasher(session.pk, offset)
+        written = 0
+        try:
+            while written < length:
+                data = stream.read(min(COPY_BUFFER, length - written))
+                if not data:
+                    break
+                part.write(data)
+                if hasher is not None:
+                    hasher.update(data)
+                written += len(data)
+        finally:
+            part.flush()
+            session.received = offset + written
+            UploadSession.objects.filter(pk=session.pk).update(
+                received=session.received, updated_at=timezone.now()
+            )
+
+        if session.received < session.size:
+            if hasher is not None:
+                with _hashers_lock:
+                    _hashers[session.pk] = (session.received, hasher)
+            return session
+
+        digest = hasher or _file_hash(path)
+        session.file = commit_file(path, digest.hexdigest(), session.size, session.filename)
+        UploadSession.objects.filter(pk=session.pk).update(file=session.file)
+    return session
+
+
+def completed_upload(upload_id, user):
+    """``user``'s finished upload ``upload_id``; delete it once its file is attached."""
+    try:
+        session = UploadSession.objects.get(pk=upload_id, user=user)
+    except (UploadSession.DoesNotExist, ValidationError):
+        raise ValueError(f'Unknown upload {upload_id}')
+    if not session.complete:
+        raise ValueError(f'Upload {upload_id} is missing bytes {session.received}-{session.size}')
+    return session
+
+
+def discard_upload(session):
+    with _hashers_lock:
+        _hashers.pop(session.pk, None)
+    if not session.complete:
+        path = _part_path(session)
+        if os.path.exists(path):
+            os.remove(path)
+    session.delete()
@@ -0,0 +1,123 @@
+"""
+In-process BM25 keyword index over guideline chunks.
+
+The index is small enough to keep in memory per document and needs no network access,
+so keyword retrieval keeps working (in well under a millisecond) when the embedding API
+is slow or down. It is persisted next to the FAISS files as gzip-compressed JSON with
+postings stored as parallel, delta-encoded integer lists.
+"""
+import gzip
+import heapq
+import json
+import math
+import os
+import re
+from collections import Counter, defaultdict
+
+from langchain.docstore.document import Document
+
+FILENAME = 'bm25.json.gz'
+
+TOKEN_RE = re.compile(r'[a-z0-9]+')
+STOPWORDS = frozenset("""
+a an and are as at be but by for from has have i if in into is it its my of on or our
+so that the their them then there these they this to was we were what when which who
+will with you your how can do does should about
+""".split())
+
+
+def tokenize(text):
+    return [token for token in TOKEN_RE.findall(text.lower()) if token not in STOPWORDS]
+
+
+class BM25Index:
+    def __init__(self, chunks, doc_lengths, postings, k1=1.5, b=0.75):
+        self.chunks = chunks  # [(page_content, metadata)], position is the doc number
+        self.doc_lengths = doc_lengths
+        self.postings = postings  # term -> ([doc numbers], [term frequencies])
+        self.k1 = k1
+        self.b = b
+        avg_length = sum(doc_lengths) / len(doc_lengths) if doc_lengths else 0.0
+        # Per-chunk length normalization and per-term IDF are query independent.
+        self._norms = [k1 * (1 - b + b * length / avg_length) for length in doc_lengths] if avg_length else []
+        self._idfs = {}
+
+    @classmethod
+    def build(cls, documents, **params):
+        """Index LangChain ``Document`` chunks."""
+        chunks = []
+        doc_lengths = []
+        postings = defaultdict(lambda: ([], []))
+        for number, document in enumerate(documents):
+            tokens = tokenize(document.page_content)
+            chunks.append((document.page_content, document.metadata))
+            doc_lengths.append(len(tokens))
+            for term, frequency in Counter(tokens).items():
+                numbers, frequencies = postings[term]
+                numbers.append(number)
+                frequencies.append(frequency)
+        return cls(chunks, doc_lengths, dict(postings), **params)
+
+    def __len__(self):
+        return len(self.chunks)
+
+    def _idf(self, term):
+        idf = self._idfs.get(term)
+        if idf is None:
+            document_frequency = len(self.postings[term][0])
+            idf = math.log(1 + (len(self.chunks) - document_frequency + 0.5) / (document_frequency + 0.5))
+            self._idfs[term] = idf
+        return idf
+
+    def search(self, query, k=4):
+        """Return up to ``k`` ``(Document, score)`` pairs, best first."""
+        scores = defaultdict(float)
+        for term in set(tokenize(query)):
+            if term not in self.postings:
+                continue
+            weight = self._idf(term) * (self.k1 + 1)
+            numbers, frequencies = self.postings[term]
+            norms = self._norms
+            for number, frequency in zip(numbers, frequencies):
+                scores[number] += weight * frequency / (frequency + norms[number])
+
+        best = heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+        return [
+            (Document(page_content=self.chunks[number][0], metadata=dict(self.chunks[number][1])), score)
+            for number, score in best
+        ]
+
+    def save(self, directory):
+        postings = {}
+        for term, (numbers, frequencies) in self.postings.items():
+            deltas = [numbers[0]] + [current - previous for previous, current in zip(numbers, numbers[1:])]
+            postings[term] = [deltas, frequencies]
+        data = {
+            'k1': self.k1,
+            'b': self.b,
+            'chunks': self.chunks,
+            'doc_lengths': self.doc_lengths,
+            'postings': postings,
+        }
+        os.makedirs(directory, exist_ok=True)
+        with gzip.open(os.path.join(directory, FILENAME), 'wt', encoding='utf-8') as f:
+            json.dump(data, f, separators=(',', ':'))
+
+    @classmethod
+    def load(cls, directory):
+        with gzip.open(os.path.join(directory, FILENAME), 'rt', encoding='utf-8') as f:
+            data = json.load(f)
+        postings = {}
+        for term, (deltas, frequencies) in data['postings'].items():
+            numbers = []
+            total = 0
+            for delta in deltas:
+                total += delta
+                numbers.append(total)
+            postings[term] = (numbers, frequencies)
+        chunks = [tuple(chunk) for chunk in data['chunks']]
+        return cls(chunks, data['doc_lengths'], postings, k1=data['k1'], b=data['b'])
+
+    @staticmethod
+    def exists(directory):
+        return os.path.exists(os.path.join(directory, FILENAME))
@@ -0,0 +1,118 @@
+"""
+Read-through cache of serialized resource listings.
+
+Resource and category list pages depend only on who is asking (their access profile:
+see ``resource_access_levels``), the query string and the library itself, and there
+are only a handful of access profiles. ``cached_listing`` keeps each serialized page in
+Django's cache under (listing, profile, query string).
+
+Invalidation is by version: every save or delete of a Resource, ResourceCategory or
+ResourceRating (and every tag change) replaces one shared version token (see
+signals.py), and entries stored under another version are stale. Entries carry the
+version instead of having it in their key, so a stale page is still there to serve:
+
+* A fresh entry (current version, younger than ``RESOURCE_CACHE_SECONDS``) is returned
+  as is.
+* Otherwise one caller per process (single flight) tries to take a short lock in the
+  cache; the one that gets it rebuilds the page and stores it.
+* Everyone else gets the stale page if there is one, or waits for the rebuilt page up
+  to ``RESOURCE_CACHE_LOCK_SECONDS`` before building it themselves.
+
+So a write or a cache flush costs one rebuild per page rather than one per request.
+View counts are added with queryset updates that send no signals, so listed view
+counts may lag by up to ``RESOURCE_CACHE_SECONDS``.
+"""
+import hashlib
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import resource_access_levels
+from .singleflight import SingleFlight
+
+VERSION_KEY = 'support:resources:version'
+POLL_SECONDS = 0.05
+
+_flight = SingleFlight()
+
+
+def bump_version():
+    """Make every cached listing stale."""
+    cache.set(VERSION_KEY, uuid.uuid4().hex, timeout=None)
+
+
+def access_profile(user):
+    levels = resource_access_levels(user)
+    return 'all' if levels is None else '+'.join(levels)
+
+
+def _current_version(version):
+    # A token rather than a counter: if the key is evicted a new random token can
+    # never match what older entries were stored under
+    if version is None:
+        cache.add(VERSION_KEY, uuid.uuid4().hex, timeout=None)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+def listing_key(name, request, per_profile=True):
+    query = sorted(
+        (key, value) for key in request.query_params for value in request.query_params.getlist(key)
+    )
+    digest = hashlib.sha1(repr(query).encode()).hexdigest()
+    profile = access_profile(request.user) if per_profile else 'any'
+    return f'support:listing:{name}:{profile}:{digest}'
+
+
+def _wait_for(key, version):
+    deadline = time.monotonic() + settings.RESOURCE_CACHE_LOCK_SECONDS
+    while time.monotonic() < deadline:
+        time.sleep(POLL_SECONDS)
+        entry = cache.get(key)
+        if entry is not None and entry[0] == version:
+            return entry
+    return None
+
+
+def _refresh(key, version, stale, build):
+    lock_key = f'{key}:lock'
+    locked = cache.add(lock_key, 1, timeout=settings.RESOURCE_CACHE_LOCK_SECONDS)
+    if not locked:
+        # Another process is rebuilding this page
+        if stale is not None:
+            return stale[2]
+        entry = _wait_for(key, version)
+        if entry is not None:
+            return entry[2]
+    try:
+        data = build()
+        cache.set(
+            key,
+            (version, time.time() + settings.RESOURCE_CACHE_SECONDS, data),
+            timeout=settings.RESOURCE_CACHE_SECONDS + settings.RESOURCE_CACHE_STALE_SECONDS,
+        )
+    finally:
+        if locked:
+            cache.delete(lock_key)
+    return data
+
+
+def cached_listing(name, request, build, per_profile=True):
+    """Serialized data for this listing request, from the cache or from ``build()``.
+
+    ``build`` must return picklable data that depends only on the user's access
+    profile (or on nothing user-specific when ``per_profile`` is False) and the query
+    string.
+    """
+    if settings.RESOURCE_CACHE_SECONDS <= 0:
+        return build()
+    key = listing_key(name, request, per_profile)
+    values = cache.get_many([VERSION_KEY, key])
+    version = _current_version(values.get(VERSION_KEY))
+    entry = values.get(key)
+    if entry is not None and entry[0] == version and entry[1] > time.time():
+        return entry[2]
+    data, _ = _flight.do(key, lambda: _refresh(key, version, entry, build))
+    return data
@@ -0,0 +1,64 @@
+"""
+Write-behind logging of support chat turns.
+
+Saving a turn used to cost a synchronous INSERT after the LLM had answered, and on
+SQLite those writes serialize every worker. ``log_turn`` instead queues the row and
+returns; a background thread bulk-creates queued turns every ``CHAT_LOG_FLUSH_SECONDS``
+or ``CHAT_LOG_BATCH_SIZE`` turns, and at shutdown. Until then each turn sits in a
+spool file under ``CHAT_LOG_SPOOL_DIR`` so a crashed process loses nothing, and in
+``pending_turns`` so the chat memory of this process already sees it.
+"""
+import threading
+
+from django.conf import settings
+
+from .batching import SpooledBatchWriter
+from .models import ChatMessage
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def _get_writer():
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            _writer = SpooledBatchWriter(
+                ChatMessage,
+                settings.CHAT_LOG_SPOOL_DIR,
+                batch_size=settings.CHAT_LOG_BATCH_SIZE,
+                flush_interval=settings.CHAT_LOG_FLUSH_SECONDS,
+            )
+        return _writer
+
+
+def log_turn(user, message, response, workload_level=None):
+    """Record a chat turn; never touches the database when write-behind is on."""
+    turn = ChatMessage(user=user, message=message, response=response, workload_level=workload_level)
+    if settings.CHAT_LOG_WRITE_BEHIND:
+        _get_writer().add(turn)
+    else:
+        turn.save()
+    return turn
+
+
+async def alog_turn(user, message, response, workload_level=None):
+    turn = ChatMessage(user=user, message=message, response=response, workload_level=workload_level)
+    if settings.CHAT_LOG_WRITE_BEHIND:
+        _get_writer().add(turn)
+    else:
+        await turn.asave()
+    return turn
+
+
+def pending_turns(user):
+    """This process's turns for ``user`` that are queued but not yet committed."""
+    if _writer is None:
+        return []
+    return [turn for turn in _writer.pending() if turn.user_id == user.pk]
+
+
+def flush():
+    """Write queued turns now (tests, management commands, shutdown)."""
+    if _writer is not None:
+        _writer.flush()
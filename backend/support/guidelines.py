@@ -0,0 +1,225 @@
+import logging
+import os
+import threading
+from collections import defaultdict
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from langchain_community.vectorstores import FAISS
+from langchain_community.chat_models import ChatOpenAI
+from langchain.chains.question_answering import load_qa_chain
+from langchain.prompts import PromptTemplate
+
+from . import bm25
+from .bm25 import BM25Index
+from .instrumentation import LLMMetricsCallback
+from .models import GuidelineDocument
+from .vector_index import get_embeddings, stored_documents
+
+GUIDELINE_PROMPT_TEMPLATE = """You are an AI assistant helping with employee mental workload management.
+            Use the following pieces of context to answer the question at the end.
+            If you don't know the answer, just say that you don't know, don't try to make up an answer.
+
+            Context: {context}
+
+            Question: {question}
+
+            Answer:"""
+
+GUIDELINE_PROMPT = PromptTemplate(
+    template=GUIDELINE_PROMPT_TEMPLATE,
+    input_variables=["context", "question"]
+)
+
+NO_GUIDELINES_RESPONSE = "I don't have any guidelines for this workload level yet."
+PROCESSING_RESPONSE = "I'm still processing the guidelines. Please try again later."
+
+# keyword: BM25 only, no network. vector: FAISS similarity search over OpenAI
+# embeddings. hybrid: both, combined with reciprocal rank fusion.
+RETRIEVAL_MODES = ('keyword', 'vector', 'hybrid')
+# Damping constant from the original reciprocal rank fusion paper.
+RRF_K = 60
+
+logger = logging.getLogger(__name__)
+
+_keyword_indexes = {}
+_keyword_lock = threading.Lock()
+
+
+def relevant_guidelines(workload_level):
+    """Return the ready guideline documents that cover ``workload_level``."""
+    documents = GuidelineDocument.objects.filter(status='ready')
+    return [doc for doc in documents if workload_level in doc.get_workload_levels()]
+
+
+async def arelevant_guidelines(workload_level):
+    return [
+        doc async for doc in GuidelineDocument.objects.filter(status='ready')
+        if workload_level in doc.get_workload_levels()
+    ]
+
+
+def is_indexed(documents):
+    return any(doc.vector_store_path for doc in documents)
+
+
+def load_vectorstores(documents):
+    """Load the vector store of each indexed document in ``documents``."""
+    embeddings = get_embeddings()
+    return [
+        FAISS.load_local(doc.vector_store_path, embeddings)
+        for doc in documents
+        if doc.vector_store_path
+    ]
+
+
+# Loading is disk and CPU bound, so it runs off the event loop without pinning the
+# thread reserved for sync Django code.
+aload_vectorstores = sync_to_async(load_vectorstores, thread_sensitive=False)
+
+
+def _search_vectorstores(vectorstores, embedding, k):
+    # Every store uses L2 distance over the same embedding model, so per-store results
+    # merge directly; this also works for index types that cannot merge_from (HNSW).
+    results = []
+    for vectorstore in vectorstores:
+        results.extend(vectorstore.similarity_search_with_score_by_vector(embedding, k=k))
+    results.sort(key=lambda result: result[1])
+    return [document for document, _ in results[:k]]
+
+
+def vector_search(documents, question, k):
+    vectorstores = load_vectorstores(documents)
+    if not vectorstores:
+        return []
+    embedding = vectorstores[0].embeddings.embed_query(question)
+    return _search_vectorstores(vectorstores, embedding, k)
+
+
+async def avector_search(documents, question, k):
+    vectorstores = await aload_vectorstores(documents)
+    if not vectorstores:
+        return []
+    embedding = await vectorstores[0].embeddings.aembed_query(question)
+    return await sync_to_async(_search_vectorstores, thread_sensitive=False)(vectorstores, embedding, k)
+
+
+def build_keyword_index(path, chunks=None):
+    """Build and save the BM25 index for the vector store at ``path``.
+
+    ``chunks`` are the LangChain documents that were embedded; when omitted they are read
+    back from the FAISS docstore (no embedding calls needed).
+    """
+    if chunks is None:
+        chunks = stored_documents(path)
+    index = BM25Index.build(chunks)
+    index.save(path)
+    return index
+
+
+def load_keyword_index(path):
+    """Return the BM25 index stored at ``path``, cached in-process until the file changes.
+
+    Returns None for stores built before keyword indexing existed; the
+    build_keyword_indexes command adds their indexes.
+    """
+    if not BM25Index.exists(path):
+        return None
+    mtime = os.path.getmtime(os.path.join(path, bm25.FILENAME))
+    with _keyword_lock:
+        cached = _keyword_indexes.get(path)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+    index = BM25Index.load(path)
+    with _keyword_lock:
+        _keyword_indexes[path] = (mtime, index)
+    return index
+
+
+def evict_keyword_index(path):
+    with _keyword_lock:
+        _keyword_indexes.pop(path, None)
+
+
+def keyword_search(documents, question, k):
+    # BM25 scores depend on each index's own IDF and average chunk length, so they
+    # are not comparable across documents: fuse the per-document rankings instead
+    rankings = []
+    for doc in documents:
+        if not doc.vector_store_path:
+            continue
+        index = load_keyword_index(doc.vector_store_path)
+        if index is None:
+            logger.warning("No keyword index for %s; run build_keyword_indexes", doc.vector_store_path)
+            continue
+        rankings.append([document for document, _ in index.search(question, k)])
+    return reciprocal_rank_fusion(rankings, k)
+
+
+def reciprocal_rank_fusion(rankings, k):
+    """Fuse ranked lists of chunks, scoring each by the sum of ``1 / (RRF_K + rank)``."""
+    scores = defaultdict(float)
+    chunks = {}
+    for ranking in rankings:
+        for rank, document in enumerate(ranking, start=1):
+            key = (document.page_content, document.metadata.get('source'), document.metadata.get('page'))
+            scores[key] += 1 / (RRF_K + rank)
+            chunks.setdefault(key, document)
+    best = sorted(scores, key=scores.get, reverse=True)[:k]
+    return [chunks[key] for key in best]
+
+
+def _resolve_mode(mode):
+    mode = mode or settings.GUIDELINE_RETRIEVAL_MODE
+    if mode not in RETRIEVAL_MODES:
+        raise ValueError(f"Unknown retrieval mode '{mode}', expected one of {', '.join(RETRIEVAL_MODES)}")
+    return mode
+
+
+def retrieve(documents, question, mode=None, k=None):
+    """Return the ``k`` guideline chunks of ``documents`` most relevant to ``question``."""
+    mode = _resolve_mode(mode)
+    k = k or settings.GUIDELINE_SEARCH_K
+    if mode == 'keyword':
+        return keyword_search(documents, question, k)
+
+    candidates = settings.GUIDELINE_FUSION_CANDIDATES if mode == 'hybrid' else k
+    vector_results = vector_search(documents, question, candidates)
+    if mode == 'vector':
+        return vector_results
+    return reciprocal_rank_fusion([keyword_search(documents, question, candidates), vector_results], k)
+
+
+async def aretrieve(documents, question, mode=None, k=None):
+    mode = _resolve_mode(mode)
+    k = k or settings.GUIDELINE_SEARCH_K
+    search_keywords = sync_to_async(keyword_search, thread_sensitive=False)
+    if mode == 'keyword':
+        return await search_keywords(documents, question, k)
+
+    candidates = settings.GUIDELINE_FUSION_CANDIDATES if mode == 'hybrid' else k
+    vector_results = await avector_search(documents, question, candidates)
+    if mode == 'vector':
+        return vector_results
+    keyword_results = await search_keywords(documents, question, candidates)
+    return reciprocal_rank_fusion([keyword_results, vector_results], k)
+
+
+def _qa_chain():
+    return load_qa_chain(
+        llm=ChatOpenAI(temperature=0, callbacks=[LLMMetricsCallback()]),
+        chain_type="stuff",
+        prompt=GUIDELINE_PROMPT
+    )
+
+
+def answer_question(documents, question, mode=None):
+    docs = retrieve(documents, question, mode)
+    result = _qa_chain()({"input_documents": docs, "question": question})
+    return result["output_text"]
+
+
+async def aanswer_question(documents, question, mode=None):
+    docs = await aretrieve(documents, question, mode)
+    result = await _qa_chain().acall({"input_documents": docs, "question": question})
+    return result["output_text"]
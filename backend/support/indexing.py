@@ -0,0 +1,313 @@
+"""
+Building and incrementally refreshing guideline vector stores.
+
+Besides the FAISS and BM25 files, every store directory holds ``chunks.npz``: the
+content hash and embedding of each chunk, in index order. When a document is replaced,
+chunks whose hash is already in the current store reuse its embedding, so only new or
+edited chunks go to the embedding API; vanished chunks are simply left out. Re-indexing
+a lightly edited handbook costs a few embedding calls plus an index rebuild from cached
+vectors.
+
+A store is never modified in place. The new one is written to a fresh directory and
+published by swapping ``vector_store_path`` in a single conditional UPDATE, so chat sees
+either the old store or the complete new one; the old directory is removed afterwards.
+"""
+import hashlib
+import logging
+import os
+import shutil
+import time
+import uuid
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+from langchain_community.document_loaders import TextLoader, PyPDFLoader, Docx2txtLoader
+
+from .blobs import acquire, is_blob, release
+from .guidelines import build_keyword_index, evict_keyword_index
+from .models import GuidelineDocument, UploadSession
+from .parsing import iter_pdf_pages, pdf_page_count
+from .vector_index import get_embeddings, stored_documents, stored_vectors, vectorstore_from_vectors
+
+logger = logging.getLogger(__name__)
+
+CHUNKS_FILENAME = 'chunks.npz'
+CHUNK_SIZE = 1000
+CHUNK_OVERLAP = 200
+
+
+class StoreConflict(Exception):
+    """Another request published a new store for the document first."""
+
+
+def store_root():
+    return os.path.join(settings.MEDIA_ROOT, 'vectorstores')
+
+
+def iter_page_chunks(file_path):
+    """Yield the LangChain document chunks of ``file_path``, one list per page.
+
+    Large PDFs are extracted in parallel and chunked page by page as pages arrive, so
+    only a few pages are held at a time; other files are loaded whole and yield one
+    list per loaded document.
+    """
+    text_splitter = RecursiveCharacterTextSplitter(
+        chunk_size=CHUNK_SIZE,
+        chunk_overlap=CHUNK_OVERLAP,
+        length_function=len,
+    )
+
+    if file_path.endswith('.pdf'):
+        page_count = pdf_page_count(file_path)
+        if page_count >= settings.GUIDELINE_PARALLEL_PARSE_MIN_PAGES:
+            for page in iter_pdf_pages(
+                file_path,
+                workers=settings.GUIDELINE_PARSE_WORKERS,
+                pages_per_task=settings.GUIDELINE_PARSE_PAGES_PER_TASK,
+                page_count=page_count,
+            ):
+                yield text_splitter.split_documents([page])
+            return
+
+    # Load document based on file type
+    if file_path.endswith('.pdf'):
+        loader = PyPDFLoader(file_path)
+    elif file_path.endswith('.docx'):
+        loader = Docx2txtLoader(file_path)
+    else:
+        loader = TextLoader(file_path)
+    for document in loader.load():
+        yield text_splitter.split_documents([document])
+
+
+def chunk_hash(chunk):
+    # Only the text determines the embedding; metadata such as the page number is
+    # taken from the new chunk either way.
+    return hashlib.sha256(chunk.page_content.encode('utf-8')).hexdigest()
+
+
+def cached_embeddings(path):
+    """Map content hash -> embedding for the chunks of the store at ``path``."""
+    if not path or not os.path.isdir(path):
+        return {}
+    chunks_file = os.path.join(path, CHUNKS_FILENAME)
+    if os.path.exists(chunks_file):
+        with np.load(chunks_file) as data:
+            return dict(zip(data['hashes'].tolist(), data['vectors']))
+
+    # Stores built before chunk lists were kept: recover the vectors from the index
+    vectors = stored_vectors(path)
+    if vectors is None:
+        return {}
+    return {chunk_hash(chunk): vector for chunk, vector in zip(stored_documents(path), vectors)}
+
+
+def _write_store(document, chunks, vectors, hashes, embeddings):
+    """Save a new store directory for ``document`` holding ``chunks`` and return it."""
+    path = os.path.join(store_root(), f'doc_{document.id}_{uuid.uuid4().hex[:12]}')
+    try:
+        vectorstore = vectorstore_from_vectors(chunks, vectors, embeddings, settings.GUIDELINE_INDEX_TYPE)
+        vectorstore.save_local(path)
+        # Keyword index over the same chunks, for network-free retrieval
+        build_keyword_index(path, chunks)
+        np.savez(os.path.join(path, CHUNKS_FILENAME), hashes=np.array(hashes), vectors=vectors)
+    except Exception:
+        shutil.rmtree(path, ignore_errors=True)
+        raise
+    return path
+
+
+def build_store(document, file_path):
+    """Index ``file_path`` into a new store directory for ``document``.
+
+    Chunks are embedded ``GUIDELINE_EMBED_BATCH_SIZE`` at a time while the file is still
+    being parsed, and each batch's vectors are kept as float32 straight away, so beyond
+    the new store itself memory holds a few pages and one batch. Embeddings of chunks
+    already in the document's current store are reused. Returns the new directory and
+    ingest stats (pages parsed and pages/s, time spent parsing, embedding and building
+    the store, counts of added, reused and removed chunks); the document itself is not
+    changed.
+    """
+    known = cached_embeddings(document.vector_store_path)
+    embeddings = get_embeddings()
+    batch_size = settings.GUIDELINE_EMBED_BATCH_SIZE
+    chunks = []
+    hashes = []
+    added = []
+    embed_seconds = 0.0
+
+    def embed(batch):
+        nonlocal embed_seconds
+        started = time.perf_counter()
+        texts = {}
+        for chunk in batch:
+            content_hash = chunk_hash(chunk)
+            hashes.append(content_hash)
+            if content_hash not in known:
+                texts.setdefault(content_hash, chunk.page_content)
+        if texts:
+            vectors = embeddings.embed_documents(list(texts.values()))
+            known.update(zip(texts, np.asarray(vectors, dtype='float32')))
+            added.extend(texts)
+        embed_seconds += time.perf_counter() - started
+
+    started = time.perf_counter()
+    pages = 0
+    batch = []
+    for page_chunks in iter_page_chunks(file_path):
+        pages += 1
+        chunks.extend(page_chunks)
+        batch.extend(page_chunks)
+        if len(batch) >= batch_size:
+            embed(batch)
+            batch = []
+    if batch:
+        embed(batch)
+    parse_seconds = time.perf_counter() - started - embed_seconds
+    logger.info(
+        "Parsed %s pages of %s in %.2fs (%.1f pages/s)",
+        pages, file_path, parse_seconds, pages / max(parse_seconds, 1e-9),
+    )
+
+    vectors = np.array([known[content_hash] for content_hash in hashes], dtype='float32')
+    distinct = set(hashes)
+
+    started = time.perf_counter()
+    path = _write_store(document, chunks, vectors, hashes, embeddings)
+    build_seconds = time.perf_counter() - started
+
+    stats = {
+        'pages': pages,
+        'pages_per_second': round(pages / max(parse_seconds, 1e-9), 1),
+        'parse_seconds': round(parse_seconds, 3),
+        'embed_seconds': round(embed_seconds, 3),
+        'build_seconds': round(build_seconds, 3),
+        'chunks': len(chunks),
+        'added': len(added),
+        'reused': len(distinct) - len(added),
+        'removed': len(known.keys() - distinct),
+    }
+    return path, stats
+
+
+def publish_store(document, path, **fields):
+    """Atomically point ``document`` at the store in ``path`` and mark it ready.
+
+    Fails with StoreConflict (and removes ``path``) if the document's store changed
+    since ``document`` was read.
+    """
+    updated = GuidelineDocument.objects.filter(
+        pk=document.pk, vector_store_path=document.vector_store_path
+    ).update(vector_store_path=path, status='ready', **fields)
+    if not updated:
+        remove_store(path)
+        raise StoreConflict(f"Guideline document {document.pk} was re-indexed concurrently")
+
+
+def share_store(document, path, **fields):
+    """Publish ``path``, another document's store, for ``document`` as well.
+
+    Returns False, publishing nothing, if no other document uses ``path`` any more:
+    remove_store may already be deleting it.
+    """
+    with transaction.atomic():
+        # Locks the documents using the store, so none can move off it (and remove it)
+        # before this one is published
+        users = GuidelineDocument.objects.select_for_update().filter(
+            vector_store_path=path
+        ).exclude(pk=document.pk)
+        if not list(users.values_list('pk', flat=True)):
+            return False
+        publish_store(document, path, **fields)
+    return True
+
+
+def remove_store(path):
+    """Delete the store directory ``path`` unless a document still uses it.
+
+    Only directories under the vector store root are ever removed. A store nobody uses
+    never gets used again, since share_store only adds users to a store that has some.
+    """
+    if not path or GuidelineDocument.objects.filter(vector_store_path=path).exists():
+        return
+    root = os.path.realpath(store_root())
+    if os.path.commonpath([root, os.path.realpath(path)]) != root:
+        logger.warning("Not removing vector store outside %s: %s", root, path)
+        return
+    shutil.rmtree(path, ignore_errors=True)
+    evict_keyword_index(path)
+
+
+def delete_document_files(document):
+    """Remove ``document``'s uploaded file and vector store once it has been deleted.
+
+    Blob files are shared and reference counted (see support.blobs); only files
+    stored before the blob store are deleted here.
+    """
+    if document.file and not is_blob(document.file.name):
+        document.file.storage.delete(document.file.name)
+    remove_store(document.vector_store_path)
+
+
+def indexed_copy(file_name, exclude=None):
+    """A ready document with the same content as ``file_name`` whose store can be shared."""
+    if not is_blob(file_name):
+        return None
+    return GuidelineDocument.objects.filter(
+        file=file_name, status='ready', vector_store_path__isnull=False
+    ).exclude(pk=exclude).exclude(vector_store_path='').first()
+
+
+def index_document(document):
+    """Index a newly uploaded document and mark it ready.
+
+    A document with identical content that is already indexed lends its store
+    instead (see share_store); remove_store never deletes a store another document
+    still uses.
+    """
+    copy = indexed_copy(document.file.name, exclude=document.pk)
+    if copy is not None and share_store(document, copy.vector_store_path):
+        return {'reused_store_of': copy.pk}
+    path, stats = build_store(document, document.file.path)
+    publish_store(document, path)
+    return stats
+
+
+def replace_document(document, upload, workload_levels=None):
+    """Replace ``document``'s file with ``upload``, re-embedding only changed chunks.
+
+    ``upload`` is an uploaded file or a completed UploadSession. Content that is
+    already indexed (by this or another document) is not indexed again. The document
+    keeps serving its current store until the new one is published; on failure
+    nothing about it changes.
+    """
+    storage = document.file.storage
+    if isinstance(upload, UploadSession):
+        name, file_name = upload.filename, upload.file
+    else:
+        name = upload.name
+        file_name = storage.save(document.file.field.generate_filename(document, upload.name), upload)
+    old_file = document.file.name
+    old_path = document.vector_store_path
+
+    fields = {'name': name, 'file': file_name}
+    if workload_levels is not None:
+        document.set_workload_levels(workload_levels)
+        fields['workload_levels'] = document.workload_levels
+    # An unused new blob is left to gc_blobs if this fails
+    copy = indexed_copy(file_name)
+    if copy is not None and share_store(document, copy.vector_store_path, **fields):
+        stats = {'reused_store_of': copy.pk}
+    else:
+        path, stats = build_store(document, storage.path(file_name))
+        publish_store(document, path, **fields)
+
+    # publish_store swapped the file with an update(), which sends no signals
+    acquire(file_name)
+    release(old_file)
+    if old_file and old_file != file_name and not is_blob(old_file):
+        storage.delete(old_file)
+    remove_store(old_path)
+    return stats
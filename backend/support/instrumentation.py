@@ -0,0 +1,434 @@
+"""
+Latency, token and outcome metrics for every LLM and embedding call.
+
+Calls are tagged with the API endpoint that caused them (``instrument_endpoint`` on the
+view sets a context variable, which follows the call into threads and tasks) and
+recorded twice: in a process-local histogram exporter for a live view, and as
+LLMCallRecord rows written in batches off the request path.
+
+``first_token_ms`` is when the first completion token reached us. Completions are
+requested without streaming, so for now it equals the call duration; it only drops
+below it for streamed calls.
+"""
+import contextvars
+import functools
+import inspect
+import logging
+import math
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+
+import openai
+from django.conf import settings
+from django.db.models import Count, Sum
+from django.db.models.functions import Mod, TruncDay, TruncHour
+from django.utils import timezone
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.embeddings import Embeddings
+
+from .batching import BatchWriter
+from .models import LLMCallRecord
+from .stats import percentile
+from .tokens import count_tokens
+
+logger = logging.getLogger(__name__)
+
+_endpoint = contextvars.ContextVar('llm_endpoint', default='other')
+
+# Upper bounds (ms) of the latency histogram buckets; the last bucket is unbounded.
+LATENCY_BUCKETS_MS = (
+    10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 20000, 30000, 60000, 120000,
+)
+
+
+@contextmanager
+def llm_endpoint(name):
+    """Attribute the LLM calls made inside the block to endpoint ``name``."""
+    token = _endpoint.set(name)
+    try:
+        yield
+    finally:
+        _endpoint.reset(token)
+
+
+def instrument_endpoint(name):
+    """Decorator attributing the LLM calls of a (sync or async) view to ``name``."""
+    def decorator(view):
+        if inspect.iscoroutinefunction(view):
+            @functools.wraps(view)
+            async def async_wrapper(*args, **kwargs):
+                with llm_endpoint(name):
+                    return await view(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            with llm_endpoint(name):
+                return view(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class LatencyHistogram:
+    """Fixed-bucket histogram; percentiles are interpolated within a bucket."""
+
+    def __init__(self, bounds=LATENCY_BUCKETS_MS):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.maximum = 0.0
+
+    def observe(self, value):
+        low, high = 0, len(self.bounds)
+        while low < high:
+            middle = (low + high) // 2
+            if value <= self.bounds[middle]:
+                high = middle
+            else:
+                low = middle + 1
+        self.counts[low] += 1
+        self.count += 1
+        self.total += value
+        self.maximum = max(self.maximum, value)
+
+    def percentile(self, pct):
+        if not self.count:
+            return None
+        rank = pct / 100 * self.count
+        seen = 0
+        for bucket, count in enumerate(self.counts):
+            if count and seen + count >= rank:
+                lower = self.bounds[bucket - 1] if bucket else 0.0
+                upper = self.bounds[bucket] if bucket < len(self.bounds) else self.maximum
+                return lower + (upper - lower) * (rank - seen) / count
+            seen += count
+        return self.maximum
+
+
+class MetricsExporter:
+    """Process-local aggregate of recorded calls per (endpoint, kind, model)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.started_at = timezone.now()
+            self._series = defaultdict(lambda: {
+                'duration': LatencyHistogram(),
+                'first_token': LatencyHistogram(),
+                'prompt_tokens': 0,
+                'completion_tokens': 0,
+                'outcomes': Counter(),
+            })
+
+    def observe(self, endpoint, kind, model, outcome, duration_ms, first_token_ms,
+                prompt_tokens, completion_tokens):
+        with self._lock:
+            series = self._series[(endpoint, kind, model)]
+            series['outcomes'][outcome] += 1
+            # Coalesced followers made no upstream call of their own
+            if outcome == 'coalesced':
+                return
+            series['duration'].observe(duration_ms)
+            if first_token_ms is not None:
+                series['first_token'].observe(first_token_ms)
+            series['prompt_tokens'] += prompt_tokens
+            series['completion_tokens'] += completion_tokens
+
+    def snapshot(self):
+        with self._lock:
+            rows = []
+            for (endpoint, kind, model), series in sorted(self._series.items()):
+                duration = series['duration']
+                first_token = series['first_token']
+                rows.append({
+                    'endpoint': endpoint,
+                    'kind': kind,
+                    'model': model,
+                    'calls': duration.count,
+                    'outcomes': dict(series['outcomes']),
+                    'p50_ms': duration.percentile(50),
+                    'p95_ms': duration.percentile(95),
+                    'p99_ms': duration.percentile(99),
+                    'first_token_p50_ms': first_token.percentile(50),
+                    'first_token_p95_ms': first_token.percentile(95),
+                    'prompt_tokens': series['prompt_tokens'],
+                    'completion_tokens': series['completion_tokens'],
+                })
+            return {'since': self.started_at, 'series': rows}
+
+
+exporter = MetricsExporter()
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def _get_writer():
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            _writer = BatchWriter(
+                LLMCallRecord,
+                batch_size=settings.LLM_METRICS_BATCH_SIZE,
+                flush_interval=settings.LLM_METRICS_FLUSH_SECONDS,
+            )
+        return _writer
+
+
+def flush():
+    """Write buffered call records now (tests, management commands, shutdown)."""
+    if _writer is not None:
+        _writer.flush()
+
+
+def record_call(kind, model, started_at, duration_ms, first_token_ms=None,
+                prompt_tokens=0, completion_tokens=0, outcome='ok'):
+    if not settings.LLM_METRICS_ENABLED:
+        return
+    endpoint = _endpoint.get()
+    exporter.observe(
+        endpoint, kind, model, outcome, duration_ms, first_token_ms, prompt_tokens, completion_tokens
+    )
+    _get_writer().add(LLMCallRecord(
+        endpoint=endpoint,
+        kind=kind,
+        model=model,
+        outcome=outcome,
+        started_at=started_at,
+        duration_ms=duration_ms,
+        first_token_ms=first_token_ms,
+        prompt_tokens=prompt_tokens,
+        completion_tokens=completion_tokens,
+    ))
+
+
+def _outcome(error):
+    if isinstance(error, (openai.APITimeoutError, TimeoutError)):
+        return 'timeout'
+    return 'error'
+
+
+@contextmanager
+def track(kind, model):
+    """Time the call made inside the block and record it.
+
+    Yields a dict the caller fills in with ``prompt_tokens``, ``completion_tokens`` and,
+    for streamed calls, ``first_token_at`` (a ``time.perf_counter()`` value).
+    """
+    call = {'prompt_tokens': 0, 'completion_tokens': 0, 'first_token_at': None}
+    started_at = timezone.now()
+    start = time.perf_counter()
+    outcome = 'ok'
+    try:
+        yield call
+    except Exception as e:
+        outcome = _outcome(e)
+        raise
+    finally:
+        end = time.perf_counter()
+        first_token_at = call['first_token_at'] or (end if outcome == 'ok' else None)
+        try:
+            record_call(
+                kind, model, started_at,
+                duration_ms=(end - start) * 1000,
+                first_token_ms=(first_token_at - start) * 1000 if first_token_at else None,
+                prompt_tokens=call['prompt_tokens'],
+                completion_tokens=call['completion_tokens'],
+                outcome=outcome,
+            )
+        except Exception:
+            logger.exception("Failed to record LLM call metrics")
+
+
+def record_usage(call, usage):
+    """Copy token counts from an OpenAI ``usage`` object into a ``track`` dict."""
+    if usage is not None:
+        call['prompt_tokens'] = usage.prompt_tokens or 0
+        call['completion_tokens'] = usage.completion_tokens or 0
+
+
+def record_coalesced(model, started_at, duration_ms):
+    """Record a request answered by another request's identical in-flight call."""
+    try:
+        record_call('chat', model, started_at, duration_ms, outcome='coalesced')
+    except Exception:
+        logger.exception("Failed to record LLM call metrics")
+
+
+class LLMMetricsCallback(BaseCallbackHandler):
+    """LangChain callback recording the chat model calls of a chain."""
+
+    # Run in the caller's thread or task so the endpoint context variable is visible
+    run_inline = True
+
+    def __init__(self):
+        self._runs = {}
+
+    def _start(self, run_id, invocation_params):
+        model = (invocation_params or {}).get('model_name') or 'unknown'
+        self._runs[run_id] = (model, timezone.now(), time.perf_counter())
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        self._start(run_id, kwargs.get('invocation_params'))
+
+    def on_llm_start(self, serialized, prompts, *, run_id, **kwargs):
+        self._start(run_id, kwargs.get('invocation_params'))
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        run = self._runs.pop(run_id, None)
+        if run is None:
+            return
+        model, started_at, start = run
+        llm_output = response.llm_output or {}
+        usage = llm_output.get('token_usage') or {}
+        duration_ms = (time.perf_counter() - start) * 1000
+        try:
+            record_call(
+                'chat', llm_output.get('model_name') or model, started_at,
+                duration_ms=duration_ms,
+                first_token_ms=duration_ms,
+                prompt_tokens=usage.get('prompt_tokens', 0),
+                completion_tokens=usage.get('completion_tokens', 0),
+            )
+        except Exception:
+            logger.exception("Failed to record LLM call metrics")
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        run = self._runs.pop(run_id, None)
+        if run is None:
+            return
+        model, started_at, start = run
+        try:
+            record_call(
+                'chat', model, started_at,
+                duration_ms=(time.perf_counter() - start) * 1000,
+                outcome=_outcome(error),
+            )
+        except Exception:
+            logger.exception("Failed to record LLM call metrics")
+
+
+class InstrumentedEmbeddings(Embeddings):
+    """Wraps an embedding model and records each call.
+
+    The embedding API does not report usage through LangChain, so token counts are
+    estimated locally.
+    """
+
+    def __init__(self, embeddings):
+        self.embeddings = embeddings
+        self.model = getattr(embeddings, 'model', None) or type(embeddings).__name__
+
+    def embed_documents(self, texts):
+        with track('embedding', self.model) as call:
+            call['prompt_tokens'] = sum(count_tokens(text) for text in texts)
+            return self.embeddings.embed_documents(texts)
+
+    def embed_query(self, text):
+        with track('embedding', self.model) as call:
+            call['prompt_tokens'] = count_tokens(text)
+            return self.embeddings.embed_query(text)
+
+    async def aembed_documents(self, texts):
+        with track('embedding', self.model) as call:
+            call['prompt_tokens'] = sum(count_tokens(text) for text in texts)
+            return await self.embeddings.aembed_documents(texts)
+
+    async def aembed_query(self, text):
+        with track('embedding', self.model) as call:
+            call['prompt_tokens'] = count_tokens(text)
+            return await self.embeddings.aembed_query(text)
+
+
+def call_cost(model, prompt_tokens, completion_tokens):
+    """Estimated USD cost from ``LLM_PRICES_PER_1K_TOKENS``; None for unpriced models.
+
+    Dated model versions (``gpt-4-0613``) use the price of their base name.
+    """
+    prices = settings.LLM_PRICES_PER_1K_TOKENS
+    matches = [name for name in prices if model == name or model.startswith(f'{name}-')]
+    if not matches:
+        return None
+    prompt_price, completion_price = prices[max(matches, key=len)]
+    return (prompt_tokens * prompt_price + completion_tokens * completion_price) / 1000
+
+
+def _summarize(groups, sample):
+    """Figures for aggregated ``groups`` of calls, with latency percentiles from ``sample``."""
+    outcomes = Counter()
+    for group in groups:
+        outcomes[group['outcome']] += group['count']
+    durations = [call['duration_ms'] for call in sample]
+    first_tokens = [call['first_token_ms'] for call in sample if call['first_token_ms'] is not None]
+    costs = [call_cost(group['model'], group['prompt_tokens'], group['completion_tokens']) for group in groups]
+    return {
+        'calls': sum(count for outcome, count in outcomes.items() if outcome != 'coalesced'),
+        'outcomes': dict(outcomes),
+        'latency_sample': len(durations),
+        'p50_ms': percentile(durations, 50),
+        'p95_ms': percentile(durations, 95),
+        'p99_ms': percentile(durations, 99),
+        'first_token_p50_ms': percentile(first_tokens, 50),
+        'first_token_p95_ms': percentile(first_tokens, 95),
+        'prompt_tokens': sum(group['prompt_tokens'] for group in groups),
+        'completion_tokens': sum(group['completion_tokens'] for group in groups),
+        'cost_usd': round(sum(cost for cost in costs if cost), 6),
+    }
+
+
+def _latency_sample(calls, count, size):
+    """Duration rows of at most about ``size`` of the ``count`` upstream ``calls``.
+
+    Keeps every ``n``-th id, which spreads the sample evenly over the window.
+    """
+    calls = calls.exclude(outcome='coalesced')
+    if count > size:
+        calls = calls.annotate(slot=Mod('id', math.ceil(count / size))).filter(slot=0)
+    return list(calls.values('bucket', 'duration_ms', 'first_token_ms'))
+
+
+def call_report(since, interval='hour', sample_size=None):
+    """Per-endpoint latency percentiles, tokens and cost of calls since ``since``.
+
+    Each endpoint also gets a ``series`` of the same figures per hour or day. Counts,
+    tokens and cost come from one aggregate query; latency percentiles from one query
+    per endpoint reading at most ``sample_size`` (``LLM_REPORT_SAMPLE_SIZE``) calls.
+    """
+    sample_size = sample_size or settings.LLM_REPORT_SAMPLE_SIZE
+    truncate = TruncDay if interval == 'day' else TruncHour
+    calls = (
+        LLMCallRecord.objects.filter(started_at__gte=since)
+        .annotate(bucket=truncate('started_at'))
+        .order_by()
+    )
+    groups = calls.values('endpoint', 'bucket', 'model', 'outcome').annotate(
+        count=Count('id'),
+        prompt_tokens=Sum('prompt_tokens'),
+        completion_tokens=Sum('completion_tokens'),
+    )
+    by_endpoint = defaultdict(lambda: defaultdict(list))
+    for group in groups:
+        by_endpoint[group['endpoint']][group['bucket']].append(group)
+
+    report = []
+    for endpoint, by_bucket in sorted(by_endpoint.items()):
+        endpoint_groups = [group for bucket_groups in by_bucket.values() for group in bucket_groups]
+        upstream = sum(group['count'] for group in endpoint_groups if group['outcome'] != 'coalesced')
+        sample = _latency_sample(calls.filter(endpoint=endpoint), upstream, sample_size)
+        sample_by_bucket = defaultdict(list)
+        for call in sample:
+            sample_by_bucket[call['bucket']].append(call)
+        report.append({
+            'endpoint': endpoint,
+            **_summarize(endpoint_groups, sample),
+            'series': [
+                {'bucket': bucket, **_summarize(bucket_groups, sample_by_bucket[bucket])}
+                for bucket, bucket_groups in sorted(by_bucket.items())
+            ],
+        })
+    return report
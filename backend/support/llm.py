@@ -0,0 +1,225 @@
+import asyncio
+import hashlib
+import json
+import time
+import weakref
+
+import httpx
+from django.conf import settings
+from django.utils import timezone
+from openai import AsyncOpenAI, OpenAI
+
+from . import instrumentation
+from .singleflight import AsyncSingleFlight, SingleFlight
+
+CHAT_MODEL = 'gpt-4'
+
+CHAT_SYSTEM_PROMPT = """You are a specialized mental health support assistant focused on helping employees manage their mental workload and stress levels. Your expertise includes:
+
+1. Analyzing and providing solutions for:
+   - High workload situations
+   - Work-related stress
+   - Time management
+   - Work-life balance
+   - Mental fatigue
+
+2. Offering practical strategies for:
+   - Reducing mental workload
+   - Setting boundaries
+   - Prioritizing tasks
+   - Taking effective breaks
+   - Improving focus and productivity
+
+3. Suggesting immediate actions for:
+   - Stress reduction
+   - Workload management
+   - Mental health maintenance
+   - Energy level optimization
+
+Keep responses practical, actionable, and focused on workplace mental health. If asked about specific medical conditions, remind users to consult healthcare professionals."""
+
+SUPPORT_ACTION_SYSTEM_PROMPT = "You are a mental health support specialist focused on workplace mental health and employee wellbeing."
+
+SUPPORT_ACTION_PROMPT = """As an AI mental health support assistant, generate a specific support action recommendation for an employee based on their mental workload level (1-5):
+
+Current Workload Level: {current_level} ({current_label})
+Previous Workload Level: {previous_level} ({previous_label})
+
+Workload Level Guide:
+- Level 1-2: High stress, immediate intervention needed
+- Level 3: Moderate stress, preventive measures recommended
+- Level 4-5: Low stress, maintenance and optimization focus
+
+Consider the following when making recommendations:
+1. For Levels 1-2:
+   - Immediate workload reduction strategies
+   - Mental health support resources
+   - Consider temporary work adjustments
+2. For Level 3:
+   - Stress management techniques
+   - Work-life balance improvements
+   - Preventive mental health practices
+3. For Levels 4-5:
+   - Performance optimization
+   - Career development opportunities
+   - Maintaining positive mental health
+
+Provide a specific, actionable recommendation that includes:
+1. Immediate action steps
+2. Long-term support strategy
+3. Resources or tools needed
+
+Format the response as a JSON object with:
+- 'immediate_action': Short-term step (1-2 sentences)
+- 'long_term_strategy': Ongoing support plan (1-2 sentences)
+- 'resources': List of specific resources or tools
+- 'priority_level': 'high' | 'medium' | 'low'"""
+
+_client = None
+# One async client per event loop, since httpx connection pools are bound to the loop
+# that opened them.
+_async_clients = weakref.WeakKeyDictionary()
+
+# In-flight completions, so identical concurrent prompts share one upstream call.
+_inflight = SingleFlight()
+_async_inflight = weakref.WeakKeyDictionary()
+
+
+def reset_clients():
+    """Drop cached clients so the next call picks up changed OpenAI settings."""
+    global _client
+    _client = None
+    _async_clients.clear()
+
+
+def get_client():
+    """Return the shared synchronous OpenAI client."""
+    global _client
+    if _client is None:
+        _client = OpenAI(
+            api_key=settings.OPENAI_API_KEY,
+            base_url=settings.OPENAI_BASE_URL or None,
+            timeout=settings.OPENAI_TIMEOUT,
+        )
+    return _client
+
+
+def get_async_client():
+    """Return the AsyncOpenAI client for the running event loop.
+
+    The connection pool is sized by ``OPENAI_MAX_CONNECTIONS`` so a single process can
+    keep hundreds of completions in flight.
+    """
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        client = AsyncOpenAI(
+            api_key=settings.OPENAI_API_KEY,
+            base_url=settings.OPENAI_BASE_URL or None,
+            timeout=settings.OPENAI_TIMEOUT,
+            http_client=httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=settings.OPENAI_MAX_CONNECTIONS,
+                    max_keepalive_connections=settings.OPENAI_MAX_CONNECTIONS,
+                ),
+                timeout=settings.OPENAI_TIMEOUT,
+            ),
+        )
+        _async_clients[loop] = client
+    return client
+
+
+def support_action_messages(current_level, previous_level, is_current_positive, is_previous_positive):
+    prompt = SUPPORT_ACTION_PROMPT.format(
+        current_level=current_level,
+        current_label='Positive' if is_current_positive else 'Negative',
+        previous_level=previous_level,
+        previous_label='Positive' if is_previous_positive else 'Negative',
+    )
+    return [
+        {"role": "system", "content": SUPPORT_ACTION_SYSTEM_PROMPT},
+        {"role": "user", "content": prompt},
+    ]
+
+
+def coalescing_key(messages, model, temperature, max_tokens):
+    """Key identifying a completion request by its prompt, up to whitespace.
+
+    Only runs of whitespace are collapsed; case is kept, since names and acronyms change
+    what the model sees. Only support action prompts, built from workload levels alone,
+    routinely match across users. Chat prompts and summaries carry the user's own
+    history, so they rarely coalesce beyond a user's first turn; guideline answers go
+    through LangChain and are not coalesced at all.
+    """
+    normalized = [
+        [message['role'], ' '.join(message['content'].split())]
+        for message in messages
+    ]
+    payload = json.dumps([model, temperature, max_tokens, normalized])
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def create_chat_completion(messages, model=CHAT_MODEL, temperature=0.7, max_tokens=500):
+    """Run a chat completion and return the text of the first choice.
+
+    Concurrent calls with the same prompt (see ``coalescing_key``) are coalesced into
+    one upstream request unless ``LLM_COALESCE_REQUESTS`` is off.
+    """
+    def call():
+        with instrumentation.track('chat', model) as metrics:
+            completion = get_client().chat.completions.create(
+                model=model,
+                messages=messages,
+                temperature=temperature,
+                max_tokens=max_tokens,
+            )
+            instrumentation.record_usage(metrics, completion.usage)
+        return completion.choices[0].message.content
+
+    if not settings.LLM_COALESCE_REQUESTS:
+        return call()
+    started_at, start = timezone.now(), time.perf_counter()
+    content, shared = _inflight.do(coalescing_key(messages, model, temperature, max_tokens), call)
+    if shared:
+        instrumentation.record_coalesced(model, started_at, (time.perf_counter() - start) * 1000)
+    return content
+
+
+async def acreate_chat_completion(messages, model=CHAT_MODEL, temperature=0.7, max_tokens=500):
+    """Async counterpart of :func:`create_chat_completion`."""
+    async def call():
+        with instrumentation.track('chat', model) as metrics:
+            completion = await get_async_client().chat.completions.create(
+                model=model,
+                messages=messages,
+                temperature=temperature,
+                max_tokens=max_tokens,
+            )
+            instrumentation.record_usage(metrics, completion.usage)
+        return completion.choices[0].message.content
+
+    if not settings.LLM_COALESCE_REQUESTS:
+        return await call()
+    loop = asyncio.get_running_loop()
+    inflight = _async_inflight.get(loop)
+    if inflight is None:
+        inflight = _async_inflight[loop] = AsyncSingleFlight()
+    started_at, start = timezone.now(), time.perf_counter()
+    content, shared = await inflight.do(coalescing_key(messages, model, temperature, max_tokens), call)
+    if shared:
+        instrumentation.record_coalesced(model, started_at, (time.perf_counter() - start) * 1000)
+    return content
+
+
+def parse_support_action(response_text):
+    """Parse a support action completion.
+
+    Returns ``(data, is_structured)``. When the model did not answer with the requested
+    JSON object the raw text is wrapped in the legacy ``action``/``confidence`` shape.
+    """
+    response_text = response_text.strip()
+    try:
+        data = json.loads(response_text)
+    except json.JSONDecodeError:
+        return {"action": response_text, "confidence": 0.8}, False
+    return data, True
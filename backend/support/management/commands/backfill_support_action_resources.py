@@ -0,0 +1,79 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from support.models import SupportActionHistory, load_legacy_resources
+
+
+class Command(BaseCommand):
+    help = (
+        'Converts support action history rows saved before resources became a JSON field, '
+        'in small primary-key ordered chunks so the table is never locked for long. Rows '
+        'whose legacy value is not a JSON list are left untouched and reported'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=500, help='Rows converted per transaction')
+        parser.add_argument(
+            '--pause', type=float, default=0.05,
+            help='Seconds to sleep between chunks, leaving room for live writes'
+        )
+        parser.add_argument('--dry-run', action='store_true', help='Report without changing anything')
+        parser.add_argument(
+            '--strict', action='store_true',
+            help='Exit with an error if any row could not be converted'
+        )
+
+    def handle(self, *args, **options):
+        dry_run = options['dry_run']
+        pending = SupportActionHistory.objects.filter(resources__isnull=True)
+        last_id = 0
+        converted = 0
+        malformed = []
+        while True:
+            # Walk the primary key rather than re-querying "first N still null", so
+            # each chunk is an index range scan and rows that fail to convert are not
+            # revisited.
+            ids = list(
+                pending.filter(id__gt=last_id).order_by('id')
+                .values_list('id', flat=True)[:options['chunk_size']]
+            )
+            if not ids:
+                break
+            last_id = ids[-1]
+            with transaction.atomic():
+                rows = []
+                for row in (
+                    SupportActionHistory.objects.filter(id__in=ids, resources__isnull=True)
+                    .only('id', 'resources', 'resources_legacy')
+                ):
+                    try:
+                        row.resources = load_legacy_resources(row.resources_legacy)
+                    except ValueError:
+                        # Kept as it is: the original value is the only record of it
+                        malformed.append(row.id)
+                        continue
+                    row.resources_legacy = ''
+                    rows.append(row)
+                if not dry_run:
+                    SupportActionHistory.objects.bulk_update(rows, ['resources', 'resources_legacy'])
+            converted += len(rows)
+            self.stdout.write(
+                f"{'Would convert' if dry_run else 'Converted'} {converted} rows (up to id {last_id})"
+            )
+            if options['pause'] and not dry_run:
+                time.sleep(options['pause'])
+
+        if malformed:
+            self.stderr.write(
+                f"{len(malformed)} rows have malformed resources_legacy and were left untouched: "
+                + ', '.join(str(row_id) for row_id in malformed)
+            )
+        summary = (
+            f"Backfill {'dry run' if dry_run else 'complete'}: {converted} rows "
+            f"{'would be ' if dry_run else ''}converted, {len(malformed)} malformed"
+        )
+        if malformed and options['strict']:
+            raise CommandError(summary)
+        self.stdout.write(self.style.SUCCESS(summary))
@@ -0,0 +1,159 @@
+import asyncio
+import tempfile
+import time
+import types
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import AsyncClient, Client, override_settings
+from django.test.utils import setup_databases, teardown_databases
+from django.urls import include, path
+from rest_framework_simplejwt.tokens import AccessToken
+
+from support import chatlog, llm
+from support.benchmarking import SlowFakeLLM
+from support.stats import percentile
+from support.urls import async_llm_urlpatterns, sync_llm_urlpatterns
+
+CHAT_URL = '/api/support/chat/'
+
+
+def _urlconf(name, patterns):
+    # The chat endpoint alone, mounted where core/urls.py puts it
+    urlconf = types.ModuleType(f'benchmark_{name}_urls')
+    urlconf.urlpatterns = [path('api/support/', include(patterns))]
+    return urlconf
+
+
+class Command(BaseCommand):
+    help = (
+        'Compares concurrent chat capacity per process of the sync chat endpoint (WSGI, '
+        'worker threads) and the async one (ASGI, event loop) against a local slow fake '
+        'LLM, on a throwaway test database'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chats', type=int, default=200, help='Concurrent chats to issue')
+        parser.add_argument('--delay', type=float, default=1.0, help='Fake LLM latency in seconds')
+        parser.add_argument(
+            '--sync-threads', type=int, default=4,
+            help='Request threads per sync worker process (e.g. gunicorn --threads)'
+        )
+        parser.add_argument(
+            '--distinct', type=int, default=None,
+            help='Distinct messages among the chats (default: all distinct). Lower values '
+                 'show identical concurrent prompts being coalesced upstream'
+        )
+
+    def handle(self, *args, **options):
+        chats = options['chats']
+        distinct = options['distinct'] or chats
+        messages = [f'How can I take more effective breaks? (#{i % distinct})' for i in range(chats)]
+
+        # A file rather than SQLite's shared in-memory test database, which fails
+        # concurrent writes from the sync path's threads instead of waiting on them
+        with tempfile.TemporaryDirectory() as scratch:
+            connection.settings_dict['TEST']['NAME'] = f'{scratch}/benchmark.sqlite3'
+            old_config = setup_databases(verbosity=0, interactive=False)
+            try:
+                sync_result, async_result = self._run(messages, options, scratch)
+            finally:
+                teardown_databases(old_config, verbosity=0)
+
+        self.stdout.write(
+            f"{chats} chats ({distinct} distinct messages) to {CHAT_URL}, "
+            f"fake LLM latency {options['delay']:.2f}s\n"
+        )
+        self.stdout.write(
+            f"{'view':<8}{'wall s':>10}{'chats/s':>10}{'p50 s':>10}{'p99 s':>10}"
+            f"{'in flight':>11}{'upstream':>10}{'errors':>8}"
+        )
+        for name, result in (('sync', sync_result), ('async', async_result)):
+            self.stdout.write(
+                f"{name:<8}{result['wall']:>10.2f}{chats / result['wall']:>10.1f}"
+                f"{percentile(result['latencies'], 50):>10.2f}"
+                f"{percentile(result['latencies'], 99):>10.2f}"
+                f"{result['peak_in_flight']:>11}{result['upstream']:>10}{result['errors']:>8}"
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f"Async view held {async_result['peak_in_flight']} chats in flight in one process "
+            f"vs {sync_result['peak_in_flight']} for the sync view "
+            f"({sync_result['wall'] / async_result['wall']:.1f}x faster to drain)"
+        ))
+
+    def _run(self, messages, options, scratch):
+        # One user per chat, so every prompt is a first turn and no summary is folded
+        User = get_user_model()
+        User.objects.bulk_create(User(username=f'benchmark-{i}') for i in range(len(messages)))
+        tokens = [
+            f'Bearer {AccessToken.for_user(user)}'
+            for user in User.objects.filter(username__startswith='benchmark-').order_by('id')
+        ]
+        requests = list(zip(tokens, messages))
+
+        with SlowFakeLLM(delay=options['delay']) as fake_llm:
+            with override_settings(
+                ALLOWED_HOSTS=['testserver'],
+                OPENAI_API_KEY='benchmark',
+                OPENAI_BASE_URL=fake_llm.base_url,
+                OPENAI_MAX_CONNECTIONS=max(len(messages), 100),
+                LLM_METRICS_ENABLED=False,
+                CHAT_LOG_SPOOL_DIR=f'{scratch}/spool',
+            ):
+                llm.reset_clients()
+                try:
+                    with override_settings(ROOT_URLCONF=_urlconf('sync', sync_llm_urlpatterns)):
+                        sync_result = self._run_sync(requests, options['sync_threads'])
+                    sync_result['peak_in_flight'] = fake_llm.peak_in_flight
+                    sync_result['upstream'] = fake_llm.requests_served
+                    fake_llm.reset_counters()
+
+                    with override_settings(ROOT_URLCONF=_urlconf('async', async_llm_urlpatterns)):
+                        async_result = asyncio.run(self._run_async(requests))
+                    async_result['peak_in_flight'] = fake_llm.peak_in_flight
+                    async_result['upstream'] = fake_llm.requests_served
+                finally:
+                    llm.reset_clients()
+                    chatlog.flush()
+        return sync_result, async_result
+
+    def _run_sync(self, requests, threads):
+        def one_chat(token, message, submitted_at):
+            response = Client().post(
+                CHAT_URL, {'message': message}, content_type='application/json',
+                headers={'Authorization': token},
+            )
+            return time.perf_counter() - submitted_at, response.status_code
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            futures = [
+                pool.submit(one_chat, token, message, time.perf_counter())
+                for token, message in requests
+            ]
+            results = [future.result() for future in futures]
+        return self._result(start, results)
+
+    async def _run_async(self, requests):
+        client = AsyncClient()
+
+        async def one_chat(token, message):
+            submitted_at = time.perf_counter()
+            response = await client.post(
+                CHAT_URL, {'message': message}, content_type='application/json',
+                headers={'Authorization': token},
+            )
+            return time.perf_counter() - submitted_at, response.status_code
+
+        start = time.perf_counter()
+        results = await asyncio.gather(*(one_chat(token, message) for token, message in requests))
+        return self._result(start, results)
+
+    def _result(self, start, results):
+        return {
+            'wall': time.perf_counter() - start,
+            'latencies': [latency for latency, _ in results],
+            'errors': sum(1 for _, status_code in results if status_code != 200),
+        }
@@ -0,0 +1,172 @@
+import json
+import os
+import subprocess
+import tempfile
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+
+from support.benchmarking import synthetic_guidelines
+from support.guidelines import RETRIEVAL_MODES, evict_keyword_index, retrieve
+from support.indexing import build_store
+from support.models import GuidelineDocument
+from support.stats import percentile
+from support.vector_index import INDEX_TYPES
+
+
+def current_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            capture_output=True, text=True, check=True, cwd=settings.BASE_DIR,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = (
+        'Offline benchmark of the guideline retrieval path (ingest, FAISS/BM25 build, '
+        'retrieval) on a synthetic labelled corpus with deterministic local embeddings'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--documents', type=int, default=20, help='Guideline documents to ingest')
+        parser.add_argument('--sections', type=int, default=40, help='Sections per document')
+        parser.add_argument('--queries', type=int, default=200, help='Labelled queries to run')
+        parser.add_argument('--k', type=int, default=4, help='Chunks retrieved per query')
+        parser.add_argument(
+            '--index-type', choices=INDEX_TYPES, default=None,
+            help='Vector index to build (default: GUIDELINE_INDEX_TYPE)'
+        )
+        parser.add_argument(
+            '--modes', nargs='+', choices=RETRIEVAL_MODES, default=list(RETRIEVAL_MODES),
+            help='Retrieval modes to measure'
+        )
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--json', dest='json_path', help='Also write the results as JSON to this file')
+        parser.add_argument('--compare', help='JSON results of an earlier run to print deltas against')
+
+    def handle(self, *args, **options):
+        texts, queries = synthetic_guidelines(
+            options['documents'], options['sections'], options['queries'], options['seed']
+        )
+        index_type = options['index_type'] or settings.GUIDELINE_INDEX_TYPE
+
+        with tempfile.TemporaryDirectory() as media_root, override_settings(
+            MEDIA_ROOT=media_root,
+            GUIDELINE_EMBEDDINGS_CLASS='support.benchmarking.HashingEmbeddings',
+            GUIDELINE_INDEX_TYPE=index_type,
+            LLM_METRICS_ENABLED=False,
+        ):
+            documents, ingest = self._ingest(texts, media_root)
+            try:
+                retrieval = {
+                    mode: self._retrieve(documents, queries, mode, options['k'])
+                    for mode in options['modes']
+                }
+            finally:
+                for document in documents:
+                    evict_keyword_index(document.vector_store_path)
+
+        results = {
+            'commit': current_commit(),
+            'params': {
+                'documents': options['documents'],
+                'sections': options['sections'],
+                'queries': options['queries'],
+                'k': options['k'],
+                'index_type': index_type,
+                'seed': options['seed'],
+            },
+            'ingest': ingest,
+            'retrieval': retrieval,
+        }
+        baseline = None
+        if options['compare']:
+            with open(options['compare']) as f:
+                baseline = json.load(f)
+        self._report(results, baseline)
+        if options['json_path']:
+            with open(options['json_path'], 'w') as f:
+                json.dump(results, f, indent=2)
+
+    def _ingest(self, texts, media_root):
+        directory = os.path.join(media_root, 'guidelines')
+        os.makedirs(directory)
+        documents = []
+        build_seconds = 0.0
+        chunks = 0
+        start = time.perf_counter()
+        for number, text in enumerate(texts, start=1):
+            file_path = os.path.join(directory, f'guideline_{number}.txt')
+            with open(file_path, 'w', encoding='utf-8') as f:
+                f.write(text)
+            # Unsaved documents: the benchmark never touches the database
+            document = GuidelineDocument(id=number, name=os.path.basename(file_path), status='ready')
+            path, stats = build_store(document, file_path)
+            document.vector_store_path = path
+            documents.append(document)
+            build_seconds += stats['build_seconds']
+            chunks += stats['chunks']
+        wall = time.perf_counter() - start
+        return documents, {
+            'seconds': round(wall, 3),
+            'docs_per_second': round(len(texts) / wall, 2),
+            'chunks': chunks,
+            'build_seconds': round(build_seconds, 3),
+        }
+
+    def _retrieve(self, documents, queries, mode, k):
+        latencies = []
+        hits = 0
+        for question, anchors in queries:
+            start = time.perf_counter()
+            results = retrieve(documents, question, mode, k)
+            latencies.append((time.perf_counter() - start) * 1000)
+            if any(anchor in chunk.page_content for chunk in results for anchor in anchors):
+                hits += 1
+        return {
+            'p50_ms': round(percentile(latencies, 50), 3),
+            'p99_ms': round(percentile(latencies, 99), 3),
+            'recall': round(hits / len(queries), 4),
+        }
+
+    def _report(self, results, baseline):
+        params = results['params']
+        ingest = results['ingest']
+        self.stdout.write(
+            f"commit {results['commit'] or 'unknown'}: {params['documents']} documents x "
+            f"{params['sections']} sections, {ingest['chunks']} chunks, "
+            f"{params['queries']} queries, k={params['k']}, {params['index_type']} index\n"
+        )
+
+        def delta(value, previous):
+            if not previous:
+                return ''
+            return f"{(value - previous) / previous * 100:+.1f}%"
+
+        previous = baseline['ingest'] if baseline else {}
+        self.stdout.write(
+            f"ingest: {ingest['docs_per_second']:.2f} docs/s, index build {ingest['build_seconds']:.3f}s"
+        )
+        if previous:
+            self.stdout.write(
+                f"  vs base: {delta(ingest['docs_per_second'], previous.get('docs_per_second'))} docs/s, "
+                f"{delta(ingest['build_seconds'], previous.get('build_seconds'))} build time"
+            )
+
+        self.stdout.write(f"\n{'mode':<10}{'p50 ms':>10}{'p99 ms':>10}{'recall@' + str(params['k']):>11}")
+        for mode, result in results['retrieval'].items():
+            previous = (baseline or {}).get('retrieval', {}).get(mode, {})
+            self.stdout.write(
+                f"{mode:<10}{result['p50_ms']:>10.3f}{result['p99_ms']:>10.3f}{result['recall']:>11.3f}"
+            )
+            if previous:
+                self.stdout.write(
+                    f"{'  vs base':<10}{delta(result['p50_ms'], previous.get('p50_ms')):>10}"
+                    f"{delta(result['p99_ms'], previous.get('p99_ms')):>10}"
+                    f"{result['recall'] - previous.get('recall', 0):>+11.3f}"
+                )
@@ -0,0 +1,82 @@
+import time
+
+import faiss
+import numpy as np
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+
+from support.stats import percentile
+from support.vector_index import INDEX_TYPES, create_index, index_memory_bytes
+
+
+class Command(BaseCommand):
+    help = (
+        'Compares the guideline index types (flat, hnsw, ivfpq) on a synthetic clustered '
+        'corpus: build time, recall@k against exact search, query latency and memory'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--vectors', type=int, default=100000, help='Corpus size')
+        parser.add_argument('--dim', type=int, default=1536, help='Embedding dimension')
+        parser.add_argument('--queries', type=int, default=200, help='Queries to time')
+        parser.add_argument('--k', type=int, default=4, help='Neighbours per query')
+        parser.add_argument('--clusters', type=int, default=256, help='Topic clusters in the corpus')
+        parser.add_argument(
+            '--types', nargs='+', choices=INDEX_TYPES, default=list(INDEX_TYPES),
+            help='Index types to benchmark'
+        )
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        k = options['k']
+        corpus, queries = self._synthetic_corpus(options)
+        self.stdout.write(
+            f"{len(corpus)} vectors x {corpus.shape[1]} dims, {len(queries)} queries, k={k}\n"
+        )
+
+        # Exact neighbours from a flat index are the ground truth for recall
+        exact = faiss.IndexFlatL2(corpus.shape[1])
+        exact.add(corpus)
+        _, truth = exact.search(queries, k)
+
+        self.stdout.write(
+            f"{'index':<8}{'build s':>10}{f'recall@{k}':>11}{'p50 ms':>10}{'p99 ms':>10}{'MiB':>10}"
+        )
+        # Single-threaded queries match one request being served
+        threads = faiss.omp_get_max_threads()
+        faiss.omp_set_num_threads(1)
+        try:
+            for index_type in options['types']:
+                # Build IVF-PQ even for small corpora instead of falling back to flat
+                with override_settings(GUIDELINE_IVFPQ_MIN_VECTORS=0):
+                    start = time.perf_counter()
+                    index = create_index(corpus, index_type)
+                    build_time = time.perf_counter() - start
+
+                latencies = []
+                hits = 0
+                for query, expected in zip(queries, truth):
+                    start = time.perf_counter()
+                    _, found = index.search(query.reshape(1, -1), k)
+                    latencies.append((time.perf_counter() - start) * 1000)
+                    hits += len(set(found[0]) & set(expected))
+
+                self.stdout.write(
+                    f"{index_type:<8}{build_time:>10.2f}{hits / truth.size:>11.3f}"
+                    f"{percentile(latencies, 50):>10.3f}{percentile(latencies, 99):>10.3f}"
+                    f"{index_memory_bytes(index) / 2 ** 20:>10.1f}"
+                )
+        finally:
+            faiss.omp_set_num_threads(threads)
+
+    def _synthetic_corpus(self, options):
+        # Gaussian clusters stand in for topical structure in real embeddings; queries
+        # are perturbed corpus vectors so each has close true neighbours.
+        rng = np.random.default_rng(options['seed'])
+        dim = options['dim']
+        centers = rng.standard_normal((options['clusters'], dim), dtype='float32')
+        assignments = rng.integers(0, options['clusters'], options['vectors'])
+        corpus = centers[assignments] + 0.5 * rng.standard_normal((options['vectors'], dim), dtype='float32')
+        picks = rng.integers(0, options['vectors'], options['queries'])
+        queries = corpus[picks] + 0.1 * rng.standard_normal((options['queries'], dim), dtype='float32')
+        return np.ascontiguousarray(corpus), np.ascontiguousarray(queries)
@@ -0,0 +1,36 @@
+import os
+
+from django.core.management.base import BaseCommand
+
+from support.bm25 import BM25Index
+from support.guidelines import build_keyword_index
+from support.models import GuidelineDocument
+
+
+class Command(BaseCommand):
+    help = (
+        'Builds the BM25 keyword index of vector stores created before keyword indexing '
+        'existed, from the chunks in their FAISS docstore (no embedding calls)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Report without changing anything')
+
+    def handle(self, *args, **options):
+        dry_run = options['dry_run']
+        paths = sorted(set(
+            GuidelineDocument.objects.exclude(vector_store_path__isnull=True)
+            .exclude(vector_store_path='').values_list('vector_store_path', flat=True)
+        ))
+        built = 0
+        for path in paths:
+            if not os.path.isdir(path) or BM25Index.exists(path):
+                continue
+            self.stdout.write(f"{'Would build' if dry_run else 'Building'} keyword index for {path}")
+            if not dry_run:
+                build_keyword_index(path)
+            built += 1
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Built {built} keyword indexes" + (' [dry run]' if dry_run else '')
+        ))
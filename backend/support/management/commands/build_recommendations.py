@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from support.recommendations import build
+
+
+class Command(BaseCommand):
+    help = (
+        'Precomputes resource neighbour lists from ratings and per-workload-level '
+        'popularity for the recommendation endpoint; run periodically (e.g. nightly)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--neighbors', type=int, default=None, help='Neighbours kept per resource (default: RECOMMENDER_NEIGHBORS)')
+        parser.add_argument('--popular', type=int, default=None, help='Resources kept per workload level (default: RECOMMENDER_POPULAR_LIMIT)')
+        parser.add_argument('--shrinkage', type=float, default=None, help='Similarity shrinkage (default: RECOMMENDER_SHRINKAGE)')
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        stats = build(options['neighbors'], options['popular'], options['shrinkage'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Built recommendations in {time.perf_counter() - start:.2f}s: {stats['ratings']} ratings "
+            f"over {stats['resources']} resources, {stats['with_neighbors']} with neighbours, "
+            f"popularity for levels {stats['levels']}"
+        ))
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from support.blobs import collect_garbage
+
+
+class Command(BaseCommand):
+    help = (
+        'Deletes uploaded files no resource or guideline document references any more, '
+        'and chunked uploads that were abandoned'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--min-age', type=float, default=24.0,
+            help='Only remove files unreferenced, and uploads idle, for this many hours, so '
+                 'files stored just before the row that uses them are left alone'
+        )
+        parser.add_argument('--dry-run', action='store_true', help='Report without changing anything')
+
+    def handle(self, *args, **options):
+        removed, freed, uploads = collect_garbage(options['min_age'], dry_run=options['dry_run'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Removed {removed} unreferenced files ({freed / 2 ** 20:.1f} MiB) "
+            f"and {uploads} abandoned uploads"
+            + (' [dry run]' if options['dry_run'] else '')
+        ))
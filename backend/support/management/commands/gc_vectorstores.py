@@ -0,0 +1,65 @@
+import os
+import shutil
+import time
+
+from django.core.management.base import BaseCommand
+
+from support.guidelines import evict_keyword_index
+from support.indexing import store_root
+from support.models import GuidelineDocument
+
+
+def directory_size(path):
+    total = 0
+    for directory, _, files in os.walk(path):
+        for name in files:
+            total += os.path.getsize(os.path.join(directory, name))
+    return total
+
+
+class Command(BaseCommand):
+    help = 'Removes vector store directories no guideline document uses'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--min-age', type=float, default=1.0,
+            help='Only remove orphaned directories older than this many hours, so stores '
+                 'still being built are left alone'
+        )
+        parser.add_argument('--dry-run', action='store_true', help='Report without changing anything')
+
+    def handle(self, *args, **options):
+        dry_run = options['dry_run']
+
+        root = store_root()
+        referenced = {
+            os.path.realpath(path)
+            for path in GuidelineDocument.objects.exclude(vector_store_path__isnull=True)
+            .values_list('vector_store_path', flat=True)
+            if path
+        }
+
+        # Orphans: stores of deleted documents, partial stores of failed ones and stores
+        # replaced by a re-index that could not clean up after itself
+        removed = 0
+        freed = 0
+        cutoff = time.time() - options['min_age'] * 3600
+        entries = sorted(os.listdir(root)) if os.path.isdir(root) else []
+        for name in entries:
+            path = os.path.join(root, name)
+            if not os.path.isdir(path) or os.path.realpath(path) in referenced:
+                continue
+            if os.path.getmtime(path) > cutoff:
+                continue
+            size = directory_size(path)
+            self.stdout.write(f"{'Would remove' if dry_run else 'Removing'} orphan {name} ({size / 2 ** 20:.1f} MiB)")
+            if not dry_run:
+                shutil.rmtree(path, ignore_errors=True)
+                evict_keyword_index(path)
+            removed += 1
+            freed += size
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Removed {removed} orphaned stores ({freed / 2 ** 20:.1f} MiB)"
+            + (' [dry run]' if dry_run else '')
+        ))
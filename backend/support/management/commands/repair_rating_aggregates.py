@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from support.models import Resource
+from support.ratings import recompute_aggregates
+
+
+class Command(BaseCommand):
+    help = (
+        'Recomputes the rating sum, count, histogram and average stored on each resource '
+        'from its ratings, fixing any that have drifted (e.g. after bulk edits)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000, help='Resources checked per transaction')
+
+    def handle(self, *args, **options):
+        last_id = 0
+        checked = 0
+        repaired = 0
+        while True:
+            ids = list(
+                Resource.objects.filter(id__gt=last_id).order_by('id')
+                .values_list('id', flat=True)[:options['chunk_size']]
+            )
+            if not ids:
+                break
+            last_id = ids[-1]
+            with transaction.atomic():
+                stale = recompute_aggregates(ids)
+            checked += len(ids)
+            repaired += len(stale)
+            for resource in stale:
+                self.stdout.write(f'Repaired resource {resource.id}')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Checked {checked} resources, repaired {repaired}'
+        ))
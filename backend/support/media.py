@@ -0,0 +1,182 @@
+"""
+Access-checked media downloads with Range and conditional request support.
+
+Uploaded files are only served to users allowed to see a Resource (by access level) or
+guideline document that uses them; nothing else under MEDIA_ROOT (vector stores,
+partial uploads) is reachable. Browsers open file links without the API's bearer token,
+so serializers hand out URLs signed for the user's access profile (``signed_url``),
+valid for ``MEDIA_URL_MAX_AGE`` seconds; API clients can send their token instead.
+
+How the bytes go out depends on ``MEDIA_SENDFILE_BACKEND``:
+
+* ``django``: a FileResponse the WSGI server can pass to ``sendfile()`` (gunicorn does,
+  for byte ranges too), with single byte ranges (206/416), ETags and
+  If-None-Match/If-Modified-Since/If-Range handled here.
+* ``nginx``: an empty response with ``X-Accel-Redirect`` to ``MEDIA_SENDFILE_URL`` +
+  the file name, an ``internal`` location aliased to MEDIA_ROOT.
+* ``xsendfile``: an empty response with ``X-Sendfile`` (Apache mod_xsendfile, lighttpd).
+
+Behind a proxy the proxy serves ranges and conditional requests itself.
+"""
+import mimetypes
+import os
+import re
+from urllib.parse import quote, urlencode
+
+from django.conf import settings
+from django.core import signing
+from django.http import FileResponse, HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe
+
+from .blobs import is_blob
+from .cache import access_profile
+from .models import GuidelineDocument, Resource
+
+_RANGE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+
+def _signer(name):
+    return signing.TimestampSigner(salt=f'support.media:{name}')
+
+
+def signed_url(url, name, user):
+    """``url`` (of the file ``name``) with a token letting ``user``'s access profile read it."""
+    token = _signer(name).sign(access_profile(user))
+    return f'{url}?{urlencode({"access": token})}'
+
+
+def token_levels(name, token):
+    """Access levels a token for ``name`` was issued for (None: all); raises signing.BadSignature."""
+    profile = _signer(name).unsign(token, max_age=settings.MEDIA_URL_MAX_AGE)
+    return None if profile == 'all' else tuple(profile.split('+'))
+
+
+def can_read(name, levels):
+    """Whether someone who may see resources at ``levels`` (None: all) may download ``name``.
+
+    Identical uploads share one file, so any row using it that they may see will do.
+    """
+    resources = Resource.objects.filter(file=name)
+    if levels is not None:
+        resources = resources.filter(access_level__in=levels)
+    return resources.exists() or GuidelineDocument.objects.filter(file=name).exists()
+
+
+def etag_for(name, stat):
+    if is_blob(name):
+        # Named by the SHA-256 of the content: a strong validator for free
+        return f'"{os.path.splitext(os.path.basename(name))[0]}"'
+    return f'"{stat.st_size:x}-{stat.st_mtime_ns:x}"'
+
+
+def byte_range(header, size):
+    """``(first, last)`` byte offsets for a single-range Range header, or None for the whole file.
+
+    Multiple ranges and malformed headers are ignored, as RFC 9110 allows. Raises
+    RangeNotSatisfiable when the range starts beyond the end of the file.
+    """
+    match = _RANGE.match(header.strip()) if header else None
+    if not match or match.groups() == ('', ''):
+        return None
+    first, last = match.groups()
+    if not first:
+        # Suffix range: the final ``last`` bytes
+        if not int(last) or not size:
+            raise RangeNotSatisfiable()
+        return max(size - int(last), 0), size - 1
+    first = int(first)
+    last = size - 1 if not last else min(int(last), size - 1)
+    if first >= size:
+        raise RangeNotSatisfiable()
+    if last < first:
+        return None
+    return first, last
+
+
+class RangeReader:
+    """Reads at most ``length`` bytes of ``file`` from its current position.
+
+    Exposes ``fileno()`` so a WSGI ``file_wrapper`` can use ``sendfile()``, which sends
+    Content-Length bytes from the current offset.
+    """
+
+    def __init__(self, file, length):
+        self.file = file
+        self.remaining = length
+
+    def read(self, size=-1):
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size) if size else b''
+        self.remaining -= len(data)
+        return data
+
+    def fileno(self):
+        return self.file.fileno()
+
+    def close(self):
+        self.file.close()
+
+
+def _if_range_matches(request, etag, mtime):
+    value = request.headers.get('If-Range')
+    if not value:
+        return True
+    if value.startswith(('"', 'W/')):
+        return value == etag
+    return parse_http_date_safe(value) == int(mtime)
+
+
+def file_response(request, name, path):
+    """Response streaming the file ``name`` (at ``path``) according to MEDIA_SENDFILE_BACKEND."""
+    stat = os.stat(path)
+    etag = etag_for(name, stat)
+    content_type = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+    cache_control = 'private, max-age=3600' if is_blob(name) else 'private, no-cache'
+
+    backend = settings.MEDIA_SENDFILE_BACKEND
+    if backend != 'django':
+        response = HttpResponse(content_type=content_type)
+        if backend == 'nginx':
+            response['X-Accel-Redirect'] = quote(settings.MEDIA_SENDFILE_URL.rstrip('/') + '/' + name)
+        else:
+            response['X-Sendfile'] = path
+        response['Cache-Control'] = cache_control
+        return response
+
+    not_modified = get_conditional_response(request, etag=etag, last_modified=int(stat.st_mtime))
+    if not_modified is not None:
+        not_modified['ETag'] = etag
+        not_modified['Cache-Control'] = cache_control
+        return not_modified
+
+    size = stat.st_size
+    try:
+        requested = byte_range(request.headers.get('Range'), size)
+    except RangeNotSatisfiable:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+        return response
+    if requested is not None and not _if_range_matches(request, etag, stat.st_mtime):
+        requested = None
+
+    first, last = requested or (0, size - 1)
+    length = last - first + 1 if size else 0
+    file = open(path, 'rb')
+    file.seek(first)
+    response = FileResponse(
+        RangeReader(file, length), status=206 if requested else 200, content_type=content_type
+    )
+    if requested:
+        response['Content-Range'] = f'bytes {first}-{last}/{size}'
+    response['Content-Length'] = str(length)
+    response['Accept-Ranges'] = 'bytes'
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(stat.st_mtime)
+    response['Cache-Control'] = cache_control
+    return response
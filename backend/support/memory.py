@@ -0,0 +1,275 @@
+"""
+Token-budgeted conversation context for the support chat.
+
+A prompt is built from the system prompt, the user's rolling ConversationSummary, the
+ChatMessage turns not yet folded into it and the new message, trimmed to
+``CHAT_PROMPT_TOKEN_BUDGET`` tokens. Once ``CHAT_SUMMARY_BATCH`` turns have fallen out of
+the last ``CHAT_CONTEXT_TURNS`` they are folded into the summary, oldest first from
+the summary's (timestamp, id) cursor, so prompt size and query cost stay bounded however
+long a history grows. The fold runs in the background (see schedule_summary_update), so
+no reply waits for the summarization call.
+"""
+import asyncio
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+from django.utils import timezone
+
+from .llm import CHAT_SYSTEM_PROMPT, acreate_chat_completion, create_chat_completion
+from .chatlog import pending_turns
+from .pagination import seek
+from .models import ChatMessage, ConversationSummary
+from .tokens import count_tokens, truncate_to_tokens
+
+logger = logging.getLogger(__name__)
+
+# Per-message framing overhead of the chat format (role, separators).
+MESSAGE_OVERHEAD_TOKENS = 4
+
+_summary_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='chat-summary')
+# Users with a fold scheduled or running, and the event loop tasks running them
+_folding = set()
+_folding_lock = threading.Lock()
+_summary_tasks = set()
+
+SUMMARY_PROMPT = """Update the running summary of a conversation between an employee and a workplace mental health support assistant.
+Keep the facts that matter for future support: the employee's situation, stressors, goals, and advice already given.
+Write at most {max_words} words.
+
+Current summary:
+{summary}
+
+New exchanges:
+{exchanges}
+
+Updated summary:"""
+
+
+def _message(role, content):
+    return {"role": role, "content": content}
+
+
+def _message_tokens(message):
+    return count_tokens(message["content"]) + MESSAGE_OVERHEAD_TOKENS
+
+
+def summary_cursor(conversation):
+    """``(timestamp, id)`` of the last turn folded into ``conversation``, or None."""
+    if conversation is None or conversation.summarized_through is None:
+        return None
+    return conversation.summarized_through, conversation.summarized_through_message_id
+
+
+def _after(turns, cursor):
+    if cursor is None:
+        return turns
+    timestamp, message_id = cursor
+    if message_id is None:
+        # Summaries folded before the cursor recorded an id
+        return turns.filter(timestamp__gt=timestamp)
+    return turns.filter(seek(['timestamp', 'id'], [timestamp, message_id]))
+
+
+def recent_turns(user, limit, after=None):
+    """The user's last ``limit`` chat turns after the ``(timestamp, id)`` cursor ``after``, oldest first.
+
+    Served by a range scan on the (user, timestamp, id) index, plus the turns this
+    process has logged but not yet written (see support.chatlog).
+    """
+    turns = _after(ChatMessage.objects.filter(user=user), after)
+    turns = list(
+        turns.order_by('-timestamp').values('message', 'response', 'timestamp', 'log_id')[:limit]
+    )
+    saved = {turn['log_id'] for turn in turns}
+    turns += [
+        {
+            'message': turn.message,
+            'response': turn.response,
+            'timestamp': turn.timestamp,
+            'log_id': turn.log_id,
+        }
+        for turn in pending_turns(user)
+        if turn.log_id not in saved and (after is None or turn.timestamp > after[0])
+    ]
+    turns.sort(key=lambda turn: turn['timestamp'], reverse=True)
+    return list(reversed(turns[:limit]))
+
+
+def build_chat_messages(user, user_message, system_prompt=CHAT_SYSTEM_PROMPT):
+    """Build the completion messages for ``user_message`` within the token budget.
+
+    The system prompt and the new message always go in (the message is truncated if it
+    alone would exceed the budget); then the summary and as many turns not yet folded
+    into it as fit, newest first.
+    """
+    budget = settings.CHAT_PROMPT_TOKEN_BUDGET
+    system = _message("system", system_prompt)
+    remaining = budget - _message_tokens(system)
+
+    current = _message("user", truncate_to_tokens(
+        user_message, remaining - MESSAGE_OVERHEAD_TOKENS
+    ))
+    remaining -= _message_tokens(current)
+
+    summary_messages = []
+    conversation = ConversationSummary.objects.filter(user=user).first()
+    if conversation is not None and conversation.summary:
+        summary_message = _message(
+            "system", f"Summary of the earlier conversation:\n{conversation.summary}"
+        )
+        if _message_tokens(summary_message) <= remaining:
+            summary_messages.append(summary_message)
+            remaining -= _message_tokens(summary_message)
+
+    history = []
+    turns = recent_turns(
+        user,
+        settings.CHAT_CONTEXT_TURNS + settings.CHAT_SUMMARY_BATCH,
+        after=summary_cursor(conversation),
+    )
+    for turn in reversed(turns):
+        pair = [_message("user", turn['message'])]
+        if turn['response']:
+            pair.append(_message("assistant", turn['response']))
+        cost = sum(_message_tokens(message) for message in pair)
+        if cost > remaining:
+            break
+        history[:0] = pair
+        remaining -= cost
+
+    return [system] + summary_messages + history + [current]
+
+
+abuild_chat_messages = sync_to_async(build_chat_messages)
+
+
+def _turns_to_fold(user):
+    """Return ``(conversation, turns)``: the oldest ``CHAT_SUMMARY_BATCH`` unfolded turns.
+
+    Turns are read in ascending order from the summary's cursor, and only returned once
+    all of them have left the recent window. A backlog (history from before summaries
+    existed, turns behind a failed fold) therefore drains one batch per chat turn
+    instead of being skipped.
+    """
+    window = settings.CHAT_CONTEXT_TURNS
+    batch = settings.CHAT_SUMMARY_BATCH
+
+    conversation, _ = ConversationSummary.objects.get_or_create(user=user)
+    turns = list(
+        _after(ChatMessage.objects.filter(user=user), summary_cursor(conversation))
+        .order_by('timestamp', 'id')
+        .values('id', 'message', 'response', 'timestamp')[:batch + window]
+    )
+    if len(turns) < batch + window:
+        return conversation, []
+    return conversation, turns[:batch]
+
+
+def _summary_messages(conversation, turns):
+    exchanges = "\n".join(
+        f"Employee: {turn['message']}\nAssistant: {turn['response'] or ''}" for turn in turns
+    )
+    prompt = SUMMARY_PROMPT.format(
+        max_words=settings.CHAT_SUMMARY_MAX_TOKENS * 3 // 4,
+        summary=conversation.summary or "(none yet)",
+        exchanges=truncate_to_tokens(exchanges, settings.CHAT_PROMPT_TOKEN_BUDGET),
+    )
+    return [_message("user", prompt)]
+
+
+def _save_summary(conversation, turns, summary):
+    # Only advance if no concurrent request folded these turns first.
+    ConversationSummary.objects.filter(
+        pk=conversation.pk,
+        summarized_through=conversation.summarized_through,
+        summarized_through_message_id=conversation.summarized_through_message_id,
+    ).update(
+        summary=truncate_to_tokens(summary.strip(), settings.CHAT_SUMMARY_MAX_TOKENS),
+        summarized_through=turns[-1]['timestamp'],
+        summarized_through_message_id=turns[-1]['id'],
+        updated_at=timezone.now(),
+    )
+
+
+def update_summary(user):
+    """Fold turns that left the recent window into the user's summary.
+
+    Does nothing until at least ``CHAT_SUMMARY_BATCH`` such turns have accumulated, so
+    the summarization call is amortized over several chat turns.
+    """
+    conversation, turns = _turns_to_fold(user)
+    if not turns:
+        return
+    summary = create_chat_completion(
+        _summary_messages(conversation, turns),
+        model=settings.CHAT_SUMMARY_MODEL,
+        temperature=0,
+        max_tokens=settings.CHAT_SUMMARY_MAX_TOKENS,
+    )
+    _save_summary(conversation, turns, summary)
+
+
+async def aupdate_summary(user):
+    conversation, turns = await sync_to_async(_turns_to_fold)(user)
+    if not turns:
+        return
+    summary = await acreate_chat_completion(
+        _summary_messages(conversation, turns),
+        model=settings.CHAT_SUMMARY_MODEL,
+        temperature=0,
+        max_tokens=settings.CHAT_SUMMARY_MAX_TOKENS,
+    )
+    await sync_to_async(_save_summary)(conversation, turns, summary)
+
+
+def _claim_fold(user_id):
+    with _folding_lock:
+        if user_id in _folding:
+            return False
+        _folding.add(user_id)
+        return True
+
+
+def _fold_in_thread(user):
+    try:
+        update_summary(user)
+    except Exception:
+        # A stale summary only costs context; the next turn retries the fold
+        logger.exception("Failed to update the conversation summary for user %s", user.pk)
+    finally:
+        with _folding_lock:
+            _folding.discard(user.pk)
+        close_old_connections()
+
+
+async def _fold_in_task(user):
+    try:
+        await aupdate_summary(user)
+    except Exception:
+        logger.exception("Failed to update the conversation summary for user %s", user.pk)
+    finally:
+        with _folding_lock:
+            _folding.discard(user.pk)
+
+
+def schedule_summary_update(user):
+    """Run update_summary for ``user`` off the request path.
+
+    On an event loop it runs as a task, elsewhere on a small thread pool. Does nothing
+    while a fold for ``user`` is already scheduled or running.
+    """
+    if not _claim_fold(user.pk):
+        return
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        _summary_executor.submit(_fold_in_thread, user)
+        return
+    task = asyncio.create_task(_fold_in_task(user))
+    # The loop only keeps weak references to its tasks
+    _summary_tasks.add(task)
+    task.add_done_callback(_summary_tasks.discard)
@@ -0,0 +1,57 @@
+# Generated by Django 4.2.17 on 2026-10-19 18:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("support", "0006_conversationsummary_and_more"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="LLMCallRecord",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("endpoint", models.CharField(max_length=100)),
+                (
+                    "kind",
+                    models.CharField(
+                        choices=[
+                            ("chat", "Chat completion"),
+                            ("embedding", "Embedding"),
+                        ],
+                        max_length=20,
+                    ),
+                ),
+                ("model", models.CharField(max_length=100)),
+                ("outcome", models.CharField(max_length=20)),
+                ("started_at", models.DateTimeField()),
+                ("duration_ms", models.FloatField()),
+                ("first_token_ms", models.FloatField(blank=True, null=True)),
+                ("prompt_tokens", models.IntegerField(default=0)),
+                ("completion_tokens", models.IntegerField(default=0)),
+            ],
+            options={
+                "ordering": ["-started_at"],
+                "indexes": [
+                    models.Index(
+                        fields=["started_at"], name="support_llmcall_started_idx"
+                    ),
+                    models.Index(
+                        fields=["endpoint", "started_at"],
+                        name="support_llmcall_endpoint_idx",
+                    ),
+                ],
+            },
+        ),
+    ]
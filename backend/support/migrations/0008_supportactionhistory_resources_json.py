@@ -0,0 +1,38 @@
+# Generated by Django 4.2.17 on 2026-10-19 19:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("support", "0007_llmcallrecord"),
+    ]
+
+    operations = [
+        # Keep the JSON strings where they are (a rename is metadata only) and add
+        # the JSON column alongside; backfill_support_action_resources moves the
+        # data over in chunks instead of rewriting the table inside this migration.
+        migrations.RenameField(
+            model_name="supportactionhistory",
+            old_name="resources",
+            new_name="resources_legacy",
+        ),
+        migrations.AlterField(
+            model_name="supportactionhistory",
+            name="resources_legacy",
+            field=models.TextField(blank=True, default=""),
+        ),
+        migrations.AddField(
+            model_name="supportactionhistory",
+            name="resources",
+            field=models.JSONField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name="supportactionhistory",
+            index=models.Index(
+                fields=["employee_id", "created_at", "id"],
+                name="support_action_emp_ts_idx",
+            ),
+        ),
+    ]
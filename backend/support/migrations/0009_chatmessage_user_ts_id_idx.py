@@ -0,0 +1,23 @@
+# Generated by Django 4.2.17 on 2026-10-19 19:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("support", "0008_supportactionhistory_resources_json"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="chatmessage",
+            index=models.Index(
+                fields=["user", "timestamp", "id"], name="support_chat_user_ts_id_idx"
+            ),
+        ),
+        migrations.RemoveIndex(
+            model_name="chatmessage",
+            name="support_chat_user_ts_idx",
+        ),
+    ]
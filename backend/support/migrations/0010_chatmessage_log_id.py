@@ -0,0 +1,44 @@
+# Generated by Django 4.2.17 on 2026-10-19 19:20
+
+import uuid
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def populate_log_ids(apps, schema_editor):
+    ChatMessage = apps.get_model("support", "ChatMessage")
+    messages = list(ChatMessage.objects.filter(log_id__isnull=True).only("id"))
+    for message in messages:
+        message.log_id = uuid.uuid4()
+    ChatMessage.objects.bulk_update(messages, ["log_id"], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("support", "0009_chatmessage_user_ts_id_idx"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="chatmessage",
+            name="timestamp",
+            field=models.DateTimeField(
+                default=django.utils.timezone.now, editable=False
+            ),
+        ),
+        # Existing rows each need their own UUID, so add the column nullable, fill
+        # it, then make it unique.
+        migrations.AddField(
+            model_name="chatmessage",
+            name="log_id",
+            field=models.UUIDField(editable=False, null=True),
+        ),
+        migrations.RunPython(populate_log_ids, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name="chatmessage",
+            name="log_id",
+            field=models.UUIDField(default=uuid.uuid4, editable=False, unique=True),
+        ),
+    ]
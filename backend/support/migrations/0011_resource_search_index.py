@@ -0,0 +1,34 @@
+# Generated by Django 4.2.17 on 2026-10-19 19:40
+
+from django.db import migrations
+
+from support import search
+
+
+def install(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor == "sqlite":
+        search.install_sqlite_index(connection)
+    elif connection.vendor == "postgresql":
+        search.install_postgres_index(connection)
+
+
+def uninstall(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor == "sqlite":
+        search.uninstall_sqlite_index(connection)
+    elif connection.vendor == "postgresql":
+        search.uninstall_postgres_index(connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("support", "0010_chatmessage_log_id"),
+    ]
+
+    operations = [
+        # Full-text index over resources (see support/search.py): an FTS5 table kept
+        # in sync by triggers on SQLite, a generated tsvector column on PostgreSQL.
+        migrations.RunPython(install, uninstall),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 4.2.17 on 2026-10-19 19:13
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("support", "0011_resource_search_index"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ResourceViewBucket",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("day", models.DateField()),
+                ("views", models.IntegerField(default=0)),
+                (
+                    "resource",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="view_buckets",
+                        to="support.resource",
+                    ),
+                ),
+            ],
+            options={
+                "unique_together": {("day", "resource")},
+            },
+        ),
+    ]
@@ -0,0 +1,92 @@
+# Generated by Django 4.2.17 on 2026-10-19 19:15
+
+from django.db import migrations, models
+from django.db.models import Count, Q, Sum
+
+
+def compute_rating_aggregates(apps, schema_editor):
+    Resource = apps.get_model("support", "Resource")
+    ResourceRating = apps.get_model("support", "ResourceRating")
+    totals = (
+        ResourceRating.objects.values("resource_id")
+        .order_by()
+        .annotate(
+            rating_sum=Sum("rating"),
+            rating_count=Count("id"),
+            **{
+                f"rating_count_{value}": Count("id", filter=Q(rating=value))
+                for value in range(1, 6)
+            },
+        )
+    )
+    fields = ["rating_sum", "rating_count"] + [
+        f"rating_count_{value}" for value in range(1, 6)
+    ]
+    resources = []
+    for row in totals:
+        resource = Resource(id=row["resource_id"])
+        for field in fields:
+            setattr(resource, field, row[field])
+        resource.rating_average = row["rating_sum"] / row["rating_count"]
+        resources.append(resource)
+    Resource.objects.bulk_update(
+        resources, fields + ["rating_average"], batch_size=500
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("support", "0012_resourceviewbucket"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="resource",
+            name="rating_average",
+            field=models.FloatField(default=0),
+        ),
+        migrations.AddField(
+            model_name="resource",
+            name="rating_count",
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="resource",
+            name="rating_count_1",
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="resource",
+            name="rating_count_2",
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="resource",
+            name="rating_count_3",
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="resource",
+            name="rating_count_4",
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="resource",
+            name="rating_count_5",
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="resource",
+            name="rating_sum",
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(compute_rating_aggregates, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name="resource",
+            index=models.Index(
+                fields=["-rating_average", "-rating_count", "-id"],
+                name="support_resource_top_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 4.2.17 on 2026-10-19 19:17
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("support", "0013_resource_rating_aggregates"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ResourcePopularity",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("workload_level", models.IntegerField(unique=True)),
+                ("resources", models.JSONField(default=list)),
+                ("computed_at", models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                "verbose_name_plural": "Resource popularity",
+            },
+        ),
+        migrations.CreateModel(
+            name="ResourceSimilarity",
+            fields=[
+                (
+                    "resource",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="similarity",
+                        serialize=False,
+                        to="support.resource",
+                    ),
+                ),
+                ("neighbors", models.JSONField(default=list)),
+                ("computed_at", models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,71 @@
+# Generated by Django 4.2.17 on 2026-10-19 19:19
+
+from django.db import migrations, models
+
+
+def backfill_tags(apps, schema_editor):
+    Resource = apps.get_model("support", "Resource")
+    Tag = apps.get_model("support", "Tag")
+    Link = Resource.tag_set.through
+
+    names_by_resource = {}
+    for resource_id, text in Resource.objects.exclude(tags="").values_list(
+        "id", "tags"
+    ):
+        names = []
+        for name in text.split(","):
+            name = " ".join(name.split()).lower()[:50]
+            if name and name not in names:
+                names.append(name)
+        names_by_resource[resource_id] = names
+
+    all_names = {name for names in names_by_resource.values() for name in names}
+    Tag.objects.bulk_create(
+        [Tag(name=name) for name in sorted(all_names)], ignore_conflicts=True
+    )
+    tag_ids = dict(Tag.objects.values_list("name", "id"))
+    Link.objects.bulk_create(
+        [
+            Link(resource_id=resource_id, tag_id=tag_ids[name])
+            for resource_id, names in names_by_resource.items()
+            for name in names
+        ],
+        batch_size=1000,
+        ignore_conflicts=True,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("support", "0014_resource_recommendations"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Tag",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("name", models.CharField(max_length=50, unique=True)),
+            ],
+            options={
+                "ordering": ["name"],
+            },
+        ),
+        migrations.AddField(
+            model_name="resource",
+            name="tag_set",
+            field=models.ManyToManyField(
+                blank=True, related_name="resources", to="support.tag"
+            ),
+        ),
+        migrations.RunPython(backfill_tags, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.17 on 2026-10-19 19:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("support", "0016_blob_store"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="conversationsummary",
+            name="summarized_through_message_id",
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+    ]
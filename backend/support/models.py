@@ -2,7 +2,11 @@ from django.db import models
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.contrib.postgres.fields import ArrayField
+from django.utils import timezone
 import json
+import uuid
+
+from .storage import blob_storage
 
 User = get_user_model()
 
@@ -20,6 +24,34 @@ class ResourceCategory(models.Model):
     def __str__(self):
         return self.name
 
+class Tag(models.Model):
+    name = models.CharField(max_length=50, unique=True)  # Normalized: lowercase, trimmed
+
+    class Meta:
+        ordering = ['name']
+
+    def __str__(self):
+        return self.name
+
+def resource_access_levels(user):
+    """Resource access levels ``user`` may see, or None for all of them (superusers)."""
+    if user.is_superuser:
+        return None
+    levels = ['ALL']
+    if user.is_staff:
+        levels.append('MANAGER')
+    if getattr(user, 'is_hr', False):
+        levels.append('HR')
+    return tuple(levels)
+
+class ResourceQuerySet(models.QuerySet):
+    def visible_to(self, user):
+        """Resources whose access level lets ``user`` see them."""
+        levels = resource_access_levels(user)
+        if levels is None:
+            return self
+        return self.filter(access_level__in=levels)
+
 class Resource(models.Model):
     RESOURCE_TYPES = [
         ('DOCUMENT', 'Document'),
@@ -40,19 +72,35 @@ class Resource(models.Model):
     category = models.ForeignKey(ResourceCategory, on_delete=models.SET_NULL, null=True, related_name='resources')
     resource_type = models.CharField(max_length=20, choices=RESOURCE_TYPES, default='DOCUMENT')
     access_level = models.CharField(max_length=20, choices=ACCESS_LEVELS, default='ALL')
-    file = models.FileField(upload_to='resources/', blank=True, null=True)
+    file = models.FileField(upload_to='resources/', storage=blob_storage, blank=True, null=True)
     external_link = models.URLField(blank=True, null=True)
     content = models.TextField(blank=True)  # For articles or text content
-    tags = models.CharField(max_length=200, blank=True)  # Comma-separated tags
+    tags = models.CharField(max_length=200, blank=True)  # Comma-separated tags, as edited
+    tag_set = models.ManyToManyField(Tag, blank=True, related_name='resources')  # Kept in sync with tags
     views_count = models.IntegerField(default=0)
+    # Rating aggregates, kept in step with ResourceRating by support.ratings
+    rating_sum = models.IntegerField(default=0)
+    rating_count = models.IntegerField(default=0)
+    rating_average = models.FloatField(default=0)  # 0 while unrated
+    rating_count_1 = models.IntegerField(default=0)
+    rating_count_2 = models.IntegerField(default=0)
+    rating_count_3 = models.IntegerField(default=0)
+    rating_count_4 = models.IntegerField(default=0)
+    rating_count_5 = models.IntegerField(default=0)
     created_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     is_featured = models.BooleanField(default=False)
     is_published = models.BooleanField(default=True)
 
+    objects = ResourceQuerySet.as_manager()
+
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # "Top rated" listing
+            models.Index(fields=['-rating_average', '-rating_count', '-id'], name='support_resource_top_idx'),
+        ]
         permissions = [
             ("can_feature_resource", "Can feature resource"),
             ("can_publish_resource", "Can publish resource"),
@@ -61,9 +109,52 @@ class Resource(models.Model):
     def __str__(self):
         return self.title
 
-    def increment_views(self):
-        self.views_count += 1
-        self.save()
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # What tag_set currently reflects; see support.tags
+        instance._synced_tags = instance.__dict__.get('tags')
+        # The blob this row holds a reference to; see support.blobs
+        instance._stored_file = instance.__dict__.get('file')
+        return instance
+
+    def increment_views(self, count=1):
+        # Atomic and touches only views_count; page views go through support.counters
+        Resource.objects.filter(pk=self.pk).update(views_count=models.F('views_count') + count)
+
+class ResourceViewBucket(models.Model):
+    """Views of a resource on one day, for trending; written by support.counters."""
+    resource = models.ForeignKey(Resource, on_delete=models.CASCADE, related_name='view_buckets')
+    day = models.DateField()
+    views = models.IntegerField(default=0)
+
+    class Meta:
+        # Day first: trending reads a range of days across all resources
+        unique_together = ['day', 'resource']
+
+    def __str__(self):
+        return f"{self.resource_id} on {self.day}: {self.views} views"
+
+class ResourceSimilarity(models.Model):
+    """A resource's nearest neighbours by rating similarity, built by build_recommendations."""
+    resource = models.OneToOneField(Resource, on_delete=models.CASCADE, primary_key=True, related_name='similarity')
+    neighbors = models.JSONField(default=list)  # [[resource_id, similarity], ...], most similar first
+    computed_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Neighbours of {self.resource_id}"
+
+class ResourcePopularity(models.Model):
+    """Most popular resources for employees at one workload level (0 = any level)."""
+    workload_level = models.IntegerField(unique=True)
+    resources = models.JSONField(default=list)  # [[resource_id, score], ...], best first
+    computed_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name_plural = "Resource popularity"
+
+    def __str__(self):
+        return f"Popular resources for workload level {self.workload_level}"
 
 class ResourceRating(models.Model):
     resource = models.ForeignKey(Resource, on_delete=models.CASCADE, related_name='ratings')
@@ -77,6 +168,13 @@ class ResourceRating(models.Model):
         unique_together = ['resource', 'user']
         ordering = ['-created_at']
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # What the aggregates on Resource currently count for this rating
+        instance._counted = (instance.__dict__.get('resource_id'), instance.__dict__.get('rating'))
+        return instance
+
     def __str__(self):
         return f"{self.resource.title} - {self.user.username} - {self.rating}★"
 
@@ -85,14 +183,32 @@ class ChatMessage(models.Model):
     message = models.TextField()
     response = models.TextField(null=True, blank=True)
     workload_level = models.IntegerField(null=True)
-    timestamp = models.DateTimeField(auto_now_add=True)
+    # Set when the turn happens, not when support.chatlog gets round to saving it
+    timestamp = models.DateTimeField(default=timezone.now, editable=False)
+    # Lets a replayed chat log spool skip turns that were already saved
+    log_id = models.UUIDField(default=uuid.uuid4, unique=True, editable=False)
 
     class Meta:
         ordering = ['timestamp']
+        indexes = [
+            # Per-user history pages on (timestamp, id); also serves memory.recent_turns
+            models.Index(fields=['user', 'timestamp', 'id'], name='support_chat_user_ts_id_idx'),
+        ]
 
     def __str__(self):
         return f"{self.user.username} - {self.timestamp}"
 
+class ConversationSummary(models.Model):
+    """Rolling summary of a user's chat turns that fell out of the recent-turn window."""
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='conversation_summary')
+    summary = models.TextField(blank=True)
+    summarized_through = models.DateTimeField(null=True, blank=True)  # Timestamp of the last folded ChatMessage
+    summarized_through_message_id = models.BigIntegerField(null=True, blank=True)  # Its id, for ties on timestamp
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Conversation summary for {self.user.username}"
+
 class AIAssistance(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
     query = models.TextField()
@@ -107,7 +223,7 @@ class AIAssistance(models.Model):
 
 class GuidelineDocument(models.Model):
     name = models.CharField(max_length=255)
-    file = models.FileField(upload_to='guidelines/')
+    file = models.FileField(upload_to='guidelines/', storage=blob_storage)
     workload_levels = models.CharField(max_length=50, default='[]')  # Store as JSON string
     uploaded_at = models.DateTimeField(auto_now_add=True)
     status = models.CharField(
@@ -133,13 +249,67 @@ class GuidelineDocument(models.Model):
     def __str__(self):
         return f"{self.name} (Levels: {self.get_workload_levels()})"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # The blob this row holds a reference to; see support.blobs
+        instance._stored_file = instance.__dict__.get('file')
+        return instance
+
+class Blob(models.Model):
+    """An uploaded file stored once under the SHA-256 of its content; see support.blobs."""
+    sha256 = models.CharField(max_length=64, unique=True)
+    file = models.CharField(max_length=255, unique=True)  # Name in blob_storage
+    size = models.BigIntegerField()
+    ref_count = models.PositiveIntegerField(default=0)  # Resources and guideline documents using it
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.file} ({self.ref_count} references)"
+
+class UploadSession(models.Model):
+    """A resumable chunked upload; the file becomes a Blob once every byte has arrived."""
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='upload_sessions')
+    filename = models.CharField(max_length=255)
+    size = models.BigIntegerField()
+    received = models.BigIntegerField(default=0)
+    file = models.CharField(max_length=255, blank=True)  # Blob name, set when complete
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    @property
+    def complete(self):
+        return bool(self.file)
+
+def load_legacy_resources(value):
+    """Decode a resources_legacy JSON string (blank reads as no resources).
+
+    Raises ValueError unless it holds a JSON list.
+    """
+    if not value:
+        return []
+    resources = json.loads(value)
+    if not isinstance(resources, list):
+        raise ValueError('resources_legacy is not a JSON list')
+    return resources
+
+def parse_legacy_resources(value):
+    """Decode a resources_legacy JSON string; anything malformed reads as no resources."""
+    try:
+        return load_legacy_resources(value)
+    except (TypeError, ValueError):
+        return []
+
 class SupportActionHistory(models.Model):
     employee_id = models.CharField(max_length=100)
     current_workload_level = models.IntegerField()
     previous_workload_level = models.IntegerField()
     immediate_action = models.TextField()
     long_term_strategy = models.TextField()
-    resources = models.TextField()  # Stored as JSON string
+    resources = models.JSONField(null=True, blank=True)  # Null until backfilled from resources_legacy
+    resources_legacy = models.TextField(blank=True, default='')  # JSON string, rows saved before resources was a JSONField
     priority_level = models.CharField(max_length=20)
     created_at = models.DateTimeField(auto_now_add=True)
     created_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True)
@@ -147,15 +317,46 @@ class SupportActionHistory(models.Model):
     class Meta:
         ordering = ['-created_at']
         verbose_name_plural = "Support Action Histories"
+        indexes = [
+            # Per-employee history, newest first, paged on (created_at, id)
+            models.Index(fields=['employee_id', 'created_at', 'id'], name='support_action_emp_ts_idx'),
+        ]
 
     def set_resources(self, resources_list):
-        self.resources = json.dumps(resources_list)
+        self.resources = list(resources_list)
 
     def get_resources(self):
-        try:
-            return json.loads(self.resources)
-        except:
-            return []
+        if self.resources is not None:
+            return self.resources
+        return parse_legacy_resources(self.resources_legacy)
 
     def __str__(self):
         return f"Support Action for Employee {self.employee_id} - {self.created_at}"
+
+class LLMCallRecord(models.Model):
+    """One LLM or embedding API call, written in batches by support.instrumentation."""
+    endpoint = models.CharField(max_length=100)
+    kind = models.CharField(
+        max_length=20,
+        choices=[
+            ('chat', 'Chat completion'),
+            ('embedding', 'Embedding'),
+        ]
+    )
+    model = models.CharField(max_length=100)
+    outcome = models.CharField(max_length=20)  # ok, error, timeout or coalesced
+    started_at = models.DateTimeField()
+    duration_ms = models.FloatField()
+    first_token_ms = models.FloatField(null=True, blank=True)
+    prompt_tokens = models.IntegerField(default=0)
+    completion_tokens = models.IntegerField(default=0)
+
+    class Meta:
+        ordering = ['-started_at']
+        indexes = [
+            models.Index(fields=['started_at'], name='support_llmcall_started_idx'),
+            models.Index(fields=['endpoint', 'started_at'], name='support_llmcall_endpoint_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.endpoint} {self.kind} {self.model} ({self.outcome}, {self.duration_ms:.0f} ms)"
@@ -0,0 +1,120 @@
+"""
+Keyset (seek) pagination for append-mostly history tables.
+
+Offset pagination makes the database walk and discard every earlier row, so deep pages
+get slower as the history grows. A keyset page instead continues strictly after the
+last row of the previous page on the ordering columns, which a matching composite index
+serves directly. The position is handed to the client as an opaque cursor.
+"""
+import base64
+import datetime
+import json
+
+from django.db.models import Q
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+
+def _cursor_value(value):
+    # Full isoformat: DjangoJSONEncoder rounds to milliseconds, which would skip rows
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    raise TypeError(f'Cannot encode {type(value).__name__} in a cursor')
+
+
+def encode_cursor(values):
+    raw = json.dumps(values, default=_cursor_value, separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor, fields):
+    """Return the cursor's values as Python values of ``fields``; raise ValueError if invalid."""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (TypeError, ValueError):
+        raise ValueError('Invalid cursor')
+    if not isinstance(values, list) or len(values) != len(fields):
+        raise ValueError('Invalid cursor')
+    try:
+        return [field.to_python(value) for field, value in zip(fields, values)]
+    except Exception:
+        raise ValueError('Invalid cursor')
+
+
+def page_size(value, default=DEFAULT_PAGE_SIZE, maximum=MAX_PAGE_SIZE):
+    """Parse a ``limit`` query parameter; raise ValueError if it is not a positive integer."""
+    if value in (None, ''):
+        return default
+    size = int(value)
+    if size < 1:
+        raise ValueError('limit must be a positive integer')
+    return min(size, maximum)
+
+
+def seek(ordering, values):
+    """Filter for rows strictly after ``values`` (one per ``ordering`` column) in ``ordering``."""
+    # (a, b) after (x, y) on "-a, -b" is: a < x OR (a = x AND b < y). The redundant
+    # leading "a <= x" gives the planner a range on the index rather than just the
+    # equality prefix.
+    condition = Q()
+    equal = {}
+    for name, value in zip(ordering, values):
+        field = name.lstrip('-')
+        lookup = 'lt' if name.startswith('-') else 'gt'
+        condition |= Q(**equal, **{f'{field}__{lookup}': value})
+        equal[field] = value
+    first = ordering[0].lstrip('-')
+    bound = 'lte' if ordering[0].startswith('-') else 'gte'
+    return Q(**{f'{first}__{bound}': values[0]}) & condition
+
+
+def keyset_page(queryset, ordering, cursor=None, limit=DEFAULT_PAGE_SIZE):
+    """One page of ``queryset`` in ``ordering`` after ``cursor``.
+
+    ``ordering`` must end in a unique column (normally ``id``) so every row has a
+    distinct position. Returns ``(rows, next_cursor)``; ``next_cursor`` is None on the
+    last page. Rows of a ``values()`` queryset must include the ordering columns.
+    """
+    fields = [queryset.model._meta.get_field(name.lstrip('-')) for name in ordering]
+    if cursor:
+        queryset = queryset.filter(seek(ordering, decode_cursor(cursor, fields)))
+    rows = list(queryset.order_by(*ordering)[:limit + 1])
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor([
+            last[field.attname] if isinstance(last, dict) else getattr(last, field.attname)
+            for field in fields
+        ])
+    return rows, next_cursor
+
+
+class KeysetPagination(BasePagination):
+    """DRF pagination class over ``keyset_page``: ``?limit=&cursor=`` in, ``{results, next}`` out.
+
+    Unlike PageNumberPagination there is no COUNT and no OFFSET, so each page is one
+    index range scan however much history precedes it.
+    """
+    ordering = ('-created_at', '-id')
+    default_page_size = DEFAULT_PAGE_SIZE
+    max_page_size = MAX_PAGE_SIZE
+
+    def paginate_queryset(self, queryset, request, view=None):
+        try:
+            limit = page_size(
+                request.query_params.get('limit'), self.default_page_size, self.max_page_size
+            )
+            rows, self.next_cursor = keyset_page(
+                queryset, self.ordering, request.query_params.get('cursor'), limit
+            )
+        except ValueError as e:
+            raise ValidationError({'error': str(e)})
+        return rows
+
+    def get_paginated_response(self, data):
+        return Response({'results': data, 'next': self.next_cursor})
@@ -0,0 +1,75 @@
+"""
+Parallel page-level text extraction for large guideline PDFs.
+
+pypdf extracts text page by page on one core, which dominates ingest time for
+thousand-page binders. ``iter_pdf_pages`` hands out fixed page ranges to a process pool
+and yields pages in page order as soon as their range is done, so the chunker and
+embedding can start before the whole file is parsed. At most ``2 * workers`` ranges are
+in flight, which bounds memory however long the document is.
+
+Workers open the file themselves and return plain ``(page_number, text)`` tuples; this
+module must stay importable without Django so the pool can use the ``spawn`` start
+method (forking a threaded server process is not safe).
+"""
+import multiprocessing
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from langchain.docstore.document import Document
+
+
+def pdf_page_count(file_path):
+    import pypdf
+
+    return len(pypdf.PdfReader(file_path).pages)
+
+
+# Each worker process keeps the reader of the file it is working on, so the
+# cross-reference table is parsed once per process rather than once per page range.
+_reader = (None, None)
+
+
+def _open_reader(file_path):
+    global _reader
+    import pypdf
+
+    if _reader[0] != file_path:
+        _reader = (file_path, pypdf.PdfReader(file_path))
+    return _reader[1]
+
+
+def _extract_pages(file_path, start, stop):
+    reader = _open_reader(file_path)
+    return [(number, reader.pages[number].extract_text()) for number in range(start, stop)]
+
+
+def _page_document(file_path, number, text):
+    # Same content and metadata as PyPDFLoader, so chunks (and their hashes) match
+    return Document(page_content=text, metadata={'source': file_path, 'page': number})
+
+
+def iter_pdf_pages(file_path, workers=None, pages_per_task=16, page_count=None):
+    """Yield one LangChain ``Document`` per page of the PDF at ``file_path``, in order."""
+    workers = workers or os.cpu_count() or 1
+    page_count = pdf_page_count(file_path) if page_count is None else page_count
+    ranges = deque(
+        (start, min(start + pages_per_task, page_count))
+        for start in range(0, page_count, pages_per_task)
+    )
+
+    if workers == 1 or len(ranges) <= 1:
+        import pypdf
+
+        for number, page in enumerate(pypdf.PdfReader(file_path).pages):
+            yield _page_document(file_path, number, page.extract_text())
+        return
+
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=min(workers, len(ranges)), mp_context=context) as pool:
+        pending = deque()
+        while ranges or pending:
+            while ranges and len(pending) < 2 * workers:
+                pending.append(pool.submit(_extract_pages, file_path, *ranges.popleft()))
+            for number, text in pending.popleft().result():
+                yield _page_document(file_path, number, text)
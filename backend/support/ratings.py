@@ -0,0 +1,102 @@
+"""
+Rating aggregates stored on Resource.
+
+``rating_sum``, ``rating_count``, the per-star ``rating_count_N`` histogram and
+``rating_average`` let listings show ratings (and sort by them, on an index) without
+touching ResourceRating. ``apply_rating_change`` moves them by a delta in one atomic
+UPDATE; the ResourceRating signals in ``signals.py`` call it inside the transaction
+that saves or deletes the rating. ``recompute_aggregates`` rebuilds them from scratch
+for the ``repair_rating_aggregates`` command.
+"""
+from django.db.models import Count, F, FloatField, Q, Sum, Value
+from django.db.models.functions import Cast, Coalesce, NullIf
+
+from .models import Resource, ResourceRating
+
+RATING_VALUES = range(1, 6)
+AGGREGATE_FIELDS = (
+    ['rating_sum', 'rating_count', 'rating_average']
+    + [f'rating_count_{value}' for value in RATING_VALUES]
+)
+
+
+def apply_rating_change(resource_id, removed=None, added=None):
+    """Replace a counted rating of ``removed`` stars with one of ``added`` stars.
+
+    Either may be None, for a new or a deleted rating. Sum, count, histogram and
+    average change in the same UPDATE, which reads the row's current values, so
+    concurrent ratings never overwrite each other.
+    """
+    if removed == added:
+        return
+    sum_delta = (added or 0) - (removed or 0)
+    count_delta = (added is not None) - (removed is not None)
+    updates = {}
+    if count_delta:
+        updates['rating_count'] = F('rating_count') + count_delta
+    if sum_delta:
+        updates['rating_sum'] = F('rating_sum') + sum_delta
+    if removed is not None:
+        updates[f'rating_count_{removed}'] = F(f'rating_count_{removed}') - 1
+    if added is not None:
+        updates[f'rating_count_{added}'] = F(f'rating_count_{added}') + 1
+    updates['rating_average'] = Coalesce(
+        Cast(F('rating_sum') + sum_delta, FloatField())
+        / NullIf(F('rating_count') + count_delta, Value(0)),
+        Value(0.0),
+    )
+    Resource.objects.filter(pk=resource_id).update(**updates)
+
+
+def aggregate_values(totals):
+    """Aggregate field values for a resource from its ``rating_totals`` row, if any."""
+    values = {field: 0 for field in AGGREGATE_FIELDS}
+    values['rating_average'] = 0.0
+    if totals:
+        for field in AGGREGATE_FIELDS:
+            if field != 'rating_average':
+                values[field] = totals[field]
+        values['rating_average'] = totals['rating_sum'] / totals['rating_count']
+    return values
+
+
+def rating_totals(resource_ids=None):
+    """``{resource_id: totals}`` from ResourceRating in one grouped query."""
+    ratings = ResourceRating.objects.all()
+    if resource_ids is not None:
+        ratings = ratings.filter(resource_id__in=resource_ids)
+    totals = ratings.values('resource_id').order_by().annotate(
+        rating_sum=Sum('rating'),
+        rating_count=Count('id'),
+        **{
+            f'rating_count_{value}': Count('id', filter=Q(rating=value))
+            for value in RATING_VALUES
+        }
+    )
+    return {row['resource_id']: row for row in totals}
+
+
+def recompute_aggregates(resource_ids):
+    """Rebuild the aggregates of ``resource_ids``; returns the resources that were wrong.
+
+    Call inside a transaction. The resource rows are locked before the ratings are
+    read, so a concurrent rating's delta either is already counted or waits and
+    applies on top.
+    """
+    resources = list(
+        Resource.objects.select_for_update().filter(id__in=resource_ids).only('id', *AGGREGATE_FIELDS)
+    )
+    totals = rating_totals(resource_ids)
+    stale = []
+    for resource in resources:
+        expected = aggregate_values(totals.get(resource.id))
+        if any(
+            abs(getattr(resource, field) - value) > 1e-9
+            for field, value in expected.items()
+        ):
+            for field, value in expected.items():
+                setattr(resource, field, value)
+            stale.append(resource)
+    if stale:
+        Resource.objects.bulk_update(stale, AGGREGATE_FIELDS)
+    return stale
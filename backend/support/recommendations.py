@@ -0,0 +1,216 @@
+"""
+Resource recommendations from ratings and popularity.
+
+The expensive part runs offline in ``build_recommendations``:
+
+* Item-item similarity over the sparse user x resource rating matrix (ratings centred
+  on each user's mean, cosine with shrinkage towards zero for items few users rated
+  together). Only each resource's ``RECOMMENDER_NEIGHBORS`` best neighbours are kept,
+  as one ResourceSimilarity row per resource.
+* A popularity list per workload level blending views (``views_count``, log-scaled)
+  with a damped average of the ratings given by employees at that level. An
+  employee's level is the one attached to their latest guideline chat (the only chat
+  that records one), else the current level of the Employee linked to their account;
+  level 0 covers everyone.
+
+Serving (``recommend``) reads the user's latest ``RECOMMENDER_SEED_RATINGS`` ratings,
+their neighbour lists and one popularity row, scores at most a few hundred candidate
+ids in Python and loads only the top ones: a fixed number of small queries whatever
+the number of users and resources.
+"""
+import heapq
+import math
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
+
+from employees.models import Employee
+
+from .models import ChatMessage, Resource, ResourcePopularity, ResourceRating, ResourceSimilarity
+
+ANY_LEVEL = 0
+# Ratings above this count as liking a resource when scoring its neighbours
+NEUTRAL_RATING = 3
+
+
+def _user_levels():
+    """``{user_id: workload level}``: of their latest chat that had one, else their Employee's."""
+    levels = dict(
+        Employee.objects.filter(user__isnull=False).values_list('user_id', 'current_workload_level')
+    )
+    rows = ChatMessage.objects.filter(workload_level__isnull=False).order_by(
+        'user_id', 'timestamp'
+    ).values_list('user_id', 'workload_level')
+    for user_id, level in rows.iterator():
+        levels[user_id] = level
+    return levels
+
+
+def item_neighbors(ratings, neighbors, shrinkage, max_items_per_user=200):
+    """Top ``neighbors`` similar items per item from ``(user, item, rating)`` triples.
+
+    Each user contributes to the dot product of every pair of items they rated, so
+    the cost is the sum of squared per-user rating counts; ``max_items_per_user``
+    bounds it for the rare user who rated everything.
+    """
+    by_user = defaultdict(list)
+    for user_id, item_id, rating in ratings:
+        by_user[user_id].append((item_id, rating))
+
+    dots = defaultdict(float)
+    common = defaultdict(int)
+    norms = defaultdict(float)
+    for items in by_user.values():
+        items = items[-max_items_per_user:]
+        mean = sum(rating for _, rating in items) / len(items)
+        centred = [(item_id, rating - mean) for item_id, rating in items]
+        for item_id, value in centred:
+            norms[item_id] += value * value
+        for index, (first, first_value) in enumerate(centred):
+            for second, second_value in centred[index + 1:]:
+                pair = (first, second) if first < second else (second, first)
+                dots[pair] += first_value * second_value
+                common[pair] += 1
+
+    candidates = defaultdict(list)
+    for (first, second), dot in dots.items():
+        denominator = math.sqrt(norms[first] * norms[second])
+        if not denominator or dot <= 0:
+            continue
+        similarity = dot / denominator * common[(first, second)] / (common[(first, second)] + shrinkage)
+        candidates[first].append((similarity, second))
+        candidates[second].append((similarity, first))
+
+    return {
+        item_id: [[other, round(similarity, 6)] for similarity, other in heapq.nlargest(neighbors, scored)]
+        for item_id, scored in candidates.items()
+    }
+
+
+def popularity(resources, ratings, levels, limit, prior_weight=5):
+    """Ranked ``[[resource_id, score], ...]`` per workload level.
+
+    ``resources`` maps id to views; ratings are ``(user, item, rating)``. The rating
+    term is a Bayesian average pulled towards the overall mean by ``prior_weight``
+    virtual ratings, scaled to 0-1, as is log(1 + views).
+    """
+    sums = defaultdict(lambda: defaultdict(float))
+    counts = defaultdict(lambda: defaultdict(int))
+    for user_id, item_id, rating in ratings:
+        for level in {ANY_LEVEL, levels.get(user_id, ANY_LEVEL)}:
+            sums[level][item_id] += rating
+            counts[level][item_id] += 1
+
+    max_views = math.log1p(max(resources.values(), default=0)) or 1.0
+    overall = sum(sums[ANY_LEVEL].values()) / max(sum(counts[ANY_LEVEL].values()), 1) or NEUTRAL_RATING
+    ranked = {}
+    for level in set(sums) | {ANY_LEVEL}:
+        scores = []
+        for item_id, views in resources.items():
+            count = counts[level].get(item_id, 0)
+            average = (sums[level].get(item_id, 0) + prior_weight * overall) / (count + prior_weight)
+            score = 0.5 * math.log1p(views) / max_views + 0.5 * (average - 1) / 4
+            scores.append((score, item_id))
+        ranked[level] = [[item_id, round(score, 6)] for score, item_id in heapq.nlargest(limit, scores)]
+    return ranked
+
+
+def build(neighbors=None, popular=None, shrinkage=None):
+    """Recompute and store neighbour lists and popularity; returns a stats dict."""
+    neighbors = neighbors or settings.RECOMMENDER_NEIGHBORS
+    popular = popular or settings.RECOMMENDER_POPULAR_LIMIT
+    shrinkage = settings.RECOMMENDER_SHRINKAGE if shrinkage is None else shrinkage
+
+    resources = dict(Resource.objects.filter(is_published=True).values_list('id', 'views_count'))
+    ratings = [
+        row for row in ResourceRating.objects.order_by('user_id', 'updated_at').values_list(
+            'user_id', 'resource_id', 'rating'
+        ).iterator()
+        if row[1] in resources
+    ]
+    similar = item_neighbors(ratings, neighbors, shrinkage)
+    ranked = popularity(resources, ratings, _user_levels(), popular)
+
+    with transaction.atomic():
+        ResourceSimilarity.objects.all().delete()
+        ResourceSimilarity.objects.bulk_create(
+            [ResourceSimilarity(resource_id=item_id, neighbors=items) for item_id, items in similar.items()],
+            batch_size=500,
+        )
+        ResourcePopularity.objects.all().delete()
+        ResourcePopularity.objects.bulk_create([
+            ResourcePopularity(workload_level=level, resources=items) for level, items in ranked.items()
+        ])
+    return {
+        'resources': len(resources),
+        'ratings': len(ratings),
+        'with_neighbors': len(similar),
+        'levels': sorted(ranked),
+    }
+
+
+def _latest_level(user):
+    level = ChatMessage.objects.filter(user=user, workload_level__isnull=False).order_by(
+        '-timestamp'
+    ).values_list('workload_level', flat=True).first()
+    if level is None:
+        # Only guideline chat records a level; most users have an Employee record instead
+        level = Employee.objects.filter(user=user).values_list('current_workload_level', flat=True).first()
+    return level
+
+
+def recommend(user, workload_level=None, k=10):
+    """Up to ``k`` resources visible to ``user``, best first, each with ``recommendation_score``.
+
+    ``workload_level`` defaults to the level of the user's latest guideline chat, or
+    failing that the current level of their linked Employee.
+    """
+    if workload_level is None:
+        workload_level = _latest_level(user)
+
+    seeds = list(
+        ResourceRating.objects.filter(user=user).order_by('-updated_at')
+        .values_list('resource_id', 'rating')[:settings.RECOMMENDER_SEED_RATINGS]
+    )
+    rated = {resource_id for resource_id, _ in seeds}
+
+    collaborative = defaultdict(float)
+    if seeds:
+        weights = {resource_id: (rating - NEUTRAL_RATING) / 2 for resource_id, rating in seeds}
+        for entry in ResourceSimilarity.objects.filter(resource_id__in=weights).values('resource_id', 'neighbors'):
+            weight = weights[entry['resource_id']]
+            for neighbor, similarity in entry['neighbors']:
+                collaborative[neighbor] += weight * similarity
+
+    rows = {
+        row.workload_level: row.resources
+        for row in ResourcePopularity.objects.filter(workload_level__in={workload_level or ANY_LEVEL, ANY_LEVEL})
+    }
+    popular = rows.get(workload_level) or rows.get(ANY_LEVEL) or []
+
+    top_collaborative = max((score for score in collaborative.values() if score > 0), default=0)
+    cf_weight = settings.RECOMMENDER_CF_WEIGHT if top_collaborative else 0.0
+    scores = defaultdict(float)
+    for resource_id, score in collaborative.items():
+        if score > 0:
+            scores[resource_id] += cf_weight * score / top_collaborative
+    for resource_id, score in popular:
+        scores[resource_id] += (1 - cf_weight) * score
+
+    candidates = heapq.nlargest(
+        3 * k, ((score, resource_id) for resource_id, score in scores.items() if resource_id not in rated)
+    )
+    # Older ratings than the seeds are excluded here, on the (resource, user) index
+    resources = Resource.objects.visible_to(user).filter(
+        is_published=True, id__in=[resource_id for _, resource_id in candidates]
+    ).exclude(ratings__user=user).select_related('category').in_bulk()
+    recommended = []
+    for score, resource_id in candidates:
+        resource = resources.get(resource_id)
+        if resource is not None:
+            resource.recommendation_score = round(score, 4)
+            recommended.append(resource)
+            if len(recommended) == k:
+                break
+    return recommended
@@ -0,0 +1,246 @@
+"""
+Full-text search over resources.
+
+SQLite (development) uses an external-content FTS5 table, ``support_resource_fts``,
+that triggers on ``support_resource`` keep in sync, so every save, delete and queryset
+update is reflected without application code. PostgreSQL (production) uses a generated
+``search_vector`` tsvector column with a GIN index, which the database maintains the
+same way. Both are created by migration 0011; other backends fall back to an unranked
+``icontains`` filter.
+
+Matches are ranked (BM25 / ``ts_rank_cd``) with title weighted above tags, description
+and content, and come with a highlighted snippet. Only the requested page is ranked
+into Resource objects, so the cost tracks the matches rather than the library size.
+"""
+import html
+import re
+
+from django.db import connection
+from django.db.models import Q
+
+FTS_TABLE = 'support_resource_fts'
+# Column order of the FTS5 table and the matching bm25() weights
+FTS_COLUMNS = ('title', 'tags', 'description', 'content')
+FTS_WEIGHTS = (10.0, 5.0, 2.0, 1.0)
+SEARCH_CONFIG = 'english'
+
+# Private-use markers, replaced by <mark> after the snippet text has been escaped
+_HIGHLIGHT_START = '\ue000'
+_HIGHLIGHT_END = '\ue001'
+SNIPPET_TOKENS = 16
+
+_TRIGGERS = {
+    f'{FTS_TABLE}_ai': f"""
+        CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON support_resource BEGIN
+            INSERT INTO {FTS_TABLE}(rowid, title, tags, description, content)
+            VALUES (new.id, new.title, new.tags, new.description, new.content);
+        END
+    """,
+    f'{FTS_TABLE}_ad': f"""
+        CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON support_resource BEGIN
+            INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, tags, description, content)
+            VALUES ('delete', old.id, old.title, old.tags, old.description, old.content);
+        END
+    """,
+    # Only text edits touch the index; view counts and ratings do not
+    f'{FTS_TABLE}_au': f"""
+        CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au
+        AFTER UPDATE OF title, tags, description, content ON support_resource BEGIN
+            INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, tags, description, content)
+            VALUES ('delete', old.id, old.title, old.tags, old.description, old.content);
+            INSERT INTO {FTS_TABLE}(rowid, title, tags, description, content)
+            VALUES (new.id, new.title, new.tags, new.description, new.content);
+        END
+    """,
+}
+
+
+def install_sqlite_index(conn):
+    """Create the FTS5 table and its triggers if missing; rebuild the index if any were.
+
+    Safe to run repeatedly. Run after migrations too: SQLite migrations that remake
+    ``support_resource`` drop its triggers along with the old table.
+    """
+    with conn.cursor() as cursor:
+        cursor.execute(
+            "SELECT name FROM sqlite_master WHERE type IN ('table', 'trigger') AND name LIKE %s",
+            [f'{FTS_TABLE}%'],
+        )
+        existing = {row[0] for row in cursor.fetchall()}
+        missing = ({FTS_TABLE} | set(_TRIGGERS)) - existing
+        if not missing:
+            return False
+        cursor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+            f"{', '.join(FTS_COLUMNS)}, content='support_resource', content_rowid='id', "
+            "tokenize='porter unicode61')"
+        )
+        for sql in _TRIGGERS.values():
+            cursor.execute(sql)
+        cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+    return True
+
+
+def uninstall_sqlite_index(conn):
+    with conn.cursor() as cursor:
+        for name in _TRIGGERS:
+            cursor.execute(f'DROP TRIGGER IF EXISTS {name}')
+        cursor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+
+
+def install_postgres_index(conn):
+    with conn.cursor() as cursor:
+        cursor.execute(f"""
+            ALTER TABLE support_resource ADD COLUMN IF NOT EXISTS search_vector tsvector
+            GENERATED ALWAYS AS (
+                setweight(to_tsvector('{SEARCH_CONFIG}'::regconfig, coalesce(title, '')), 'A') ||
+                setweight(to_tsvector('{SEARCH_CONFIG}'::regconfig, coalesce(tags, '')), 'B') ||
+                setweight(to_tsvector('{SEARCH_CONFIG}'::regconfig, coalesce(description, '')), 'C') ||
+                setweight(to_tsvector('{SEARCH_CONFIG}'::regconfig, coalesce(content, '')), 'D')
+            ) STORED
+        """)
+        cursor.execute(
+            'CREATE INDEX IF NOT EXISTS support_resource_search_idx '
+            'ON support_resource USING GIN (search_vector)'
+        )
+
+
+def uninstall_postgres_index(conn):
+    with conn.cursor() as cursor:
+        cursor.execute('DROP INDEX IF EXISTS support_resource_search_idx')
+        cursor.execute('ALTER TABLE support_resource DROP COLUMN IF EXISTS search_vector')
+
+
+def fts5_query(text):
+    """Turn free text into an FTS5 query: every word must match, as a prefix.
+
+    Words are quoted, so user input can never be FTS5 syntax. Returns '' if the text
+    has no words.
+    """
+    words = re.findall(r'\w+', text)
+    return ' '.join(f'"{word}"*' for word in words)
+
+
+def _highlight(snippet):
+    escaped = html.escape(snippet or '')
+    return escaped.replace(_HIGHLIGHT_START, '<mark>').replace(_HIGHLIGHT_END, '</mark>')
+
+
+class RankedResources:
+    """Lazy, sliceable search result that Django's Paginator (and so DRF) can page.
+
+    Each slice runs one ranked query for just that page; the Resource objects come back
+    with ``search_rank`` and ``search_snippet`` set.
+    """
+
+    def __init__(self, queryset, text):
+        self.queryset = queryset
+        self.text = text
+        self._count = None
+
+    def _restriction(self):
+        # The caller's filters (access level, category, type) as an id subquery
+        if not self.queryset.query.where:
+            return '', []
+        sql, params = self.queryset.order_by().values('id').query.sql_with_params()
+        return f' AND r.id IN ({sql})', list(params)
+
+    def _sqlite(self, count, limit=None, offset=0):
+        query = fts5_query(self.text)
+        if not query:
+            return None
+        restriction, params = self._restriction()
+        source = (
+            f'FROM {FTS_TABLE} JOIN support_resource r ON r.id = {FTS_TABLE}.rowid '
+            f'WHERE {FTS_TABLE} MATCH %s{restriction}'
+        )
+        if count:
+            return f'SELECT COUNT(*) {source}', [query] + params
+        weights = ', '.join(str(weight) for weight in FTS_WEIGHTS)
+        return (
+            f"SELECT r.id, bm25({FTS_TABLE}, {weights}) AS rank, "
+            f"snippet({FTS_TABLE}, -1, %s, %s, '…', {SNIPPET_TOKENS}) "
+            f"{source} ORDER BY rank, r.id LIMIT %s OFFSET %s",
+            [_HIGHLIGHT_START, _HIGHLIGHT_END, query] + params + [limit, offset],
+        )
+
+    def _postgres(self, count, limit=None, offset=0):
+        restriction, params = self._restriction()
+        source = (
+            f"FROM support_resource r, websearch_to_tsquery('{SEARCH_CONFIG}', %s) q "
+            f"WHERE r.search_vector @@ q{restriction}"
+        )
+        if count:
+            return f'SELECT COUNT(*) {source}', [self.text] + params
+        # Headlines are expensive, so only build them for the rows of this page
+        return (
+            f"SELECT page.id, page.rank, ts_headline('{SEARCH_CONFIG}', "
+            f"concat_ws(' ', page.description, page.content), page.q, %s) "
+            f"FROM (SELECT r.id, r.description, r.content, q, "
+            f"ts_rank_cd(r.search_vector, q) AS rank {source} "
+            f"ORDER BY rank DESC, r.id LIMIT %s OFFSET %s) page ORDER BY page.rank DESC, page.id",
+            [
+                f'StartSel={_HIGHLIGHT_START}, StopSel={_HIGHLIGHT_END}, '
+                f'MaxWords={SNIPPET_TOKENS}, MinWords=6, MaxFragments=2',
+                self.text,
+            ] + params + [limit, offset],
+        )
+
+    def _statement(self, count, limit=None, offset=0):
+        if connection.vendor == 'sqlite':
+            return self._sqlite(count, limit, offset)
+        return self._postgres(count, limit, offset)
+
+    def count(self):
+        if self._count is None:
+            statement = self._statement(count=True)
+            if statement is None:
+                self._count = 0
+            else:
+                with connection.cursor() as cursor:
+                    cursor.execute(*statement)
+                    self._count = cursor.fetchone()[0]
+        return self._count
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, page):
+        if not isinstance(page, slice):
+            raise TypeError('RankedResources only supports slicing')
+        offset = page.start or 0
+        if page.stop is not None and page.stop <= offset:
+            return []
+        limit = -1 if page.stop is None else page.stop - offset
+        if limit == -1 and connection.vendor != 'sqlite':
+            limit = None  # LIMIT NULL means no limit in PostgreSQL
+        statement = self._statement(count=False, limit=limit, offset=offset)
+        if statement is None:
+            return []
+        with connection.cursor() as cursor:
+            cursor.execute(*statement)
+            rows = cursor.fetchall()
+        resources = self.queryset.model.objects.select_related('category').in_bulk(
+            [row[0] for row in rows]
+        )
+        results = []
+        for resource_id, rank, snippet in rows:
+            resource = resources.get(resource_id)
+            if resource is None:
+                continue
+            resource.search_rank = rank
+            resource.search_snippet = _highlight(snippet)
+            results.append(resource)
+        return results
+
+
+def search_resources(queryset, text):
+    """Resources of ``queryset`` matching ``text``, best match first."""
+    if connection.vendor in ('sqlite', 'postgresql'):
+        return RankedResources(queryset, text)
+    return queryset.filter(
+        Q(title__icontains=text) |
+        Q(description__icontains=text) |
+        Q(content__icontains=text) |
+        Q(tags__icontains=text)
+    )
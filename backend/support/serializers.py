@@ -2,21 +2,55 @@ from rest_framework import serializers
 from .models import (
     Resource, ResourceCategory, ResourceRating,
     ChatMessage, AIAssistance, GuidelineDocument,
-    SupportActionHistory
+    SupportActionHistory, UploadSession
 )
 import json
 
+from .media import signed_url
+
+class MediaFileField(serializers.FileField):
+    """File URL signed for the requesting user's access profile; see support.media."""
+
+    def to_representation(self, value):
+        if not value:
+            return None
+        request = self.context.get('request')
+        if request is None:
+            return value.url
+        return request.build_absolute_uri(signed_url(value.url, value.name, request.user))
+
 class ResourceCategorySerializer(serializers.ModelSerializer):
     class Meta:
         model = ResourceCategory
         fields = '__all__'
 
 class ResourceSerializer(serializers.ModelSerializer):
+    file = MediaFileField(required=False, allow_null=True)
     category_name = serializers.CharField(source='category.name', read_only=True)
-    
+    # Only set on full-text search results: relevance and an HTML-escaped snippet
+    # with the matched terms wrapped in <mark>
+    search_rank = serializers.FloatField(read_only=True)
+    search_snippet = serializers.CharField(read_only=True)
+    # Only set on the trending listing
+    recent_views = serializers.IntegerField(read_only=True)
+    # Only set on recommendations
+    recommendation_score = serializers.FloatField(read_only=True)
+    average_rating = serializers.SerializerMethodField()
+    ratings_count = serializers.IntegerField(source='rating_count', read_only=True)
+    rating_histogram = serializers.SerializerMethodField()
+
     class Meta:
         model = Resource
-        fields = '__all__'
+        exclude = [
+            'tag_set', 'rating_sum', 'rating_count', 'rating_average',
+            'rating_count_1', 'rating_count_2', 'rating_count_3', 'rating_count_4', 'rating_count_5',
+        ]
+
+    def get_average_rating(self, obj):
+        return round(obj.rating_average, 2) if obj.rating_count else None
+
+    def get_rating_histogram(self, obj):
+        return {value: getattr(obj, f'rating_count_{value}') for value in range(1, 6)}
 
 class ResourceRatingSerializer(serializers.ModelSerializer):
     class Meta:
@@ -27,6 +61,7 @@ class ChatMessageSerializer(serializers.ModelSerializer):
     class Meta:
         model = ChatMessage
         fields = '__all__'
+        read_only_fields = ['user']
 
 class AIAssistanceSerializer(serializers.ModelSerializer):
     class Meta:
@@ -34,13 +69,25 @@ class AIAssistanceSerializer(serializers.ModelSerializer):
         fields = '__all__'
 
 class GuidelineDocumentSerializer(serializers.ModelSerializer):
+    file = MediaFileField(read_only=True)
     class Meta:
         model = GuidelineDocument
         fields = '__all__'
 
+class UploadSessionSerializer(serializers.ModelSerializer):
+    offset = serializers.IntegerField(source='received', read_only=True)
+    complete = serializers.BooleanField(read_only=True)
+
+    class Meta:
+        model = UploadSession
+        fields = ['id', 'filename', 'size', 'offset', 'complete', 'created_at', 'updated_at']
+
 class SupportActionHistorySerializer(serializers.ModelSerializer):
-    resources = serializers.JSONField()
-    
+    resources = serializers.SerializerMethodField()
+
     class Meta:
         model = SupportActionHistory
-        fields = '__all__'
\ No newline at end of file
+        exclude = ['resources_legacy']
+
+    def get_resources(self, obj):
+        return obj.get_resources()
\ No newline at end of file
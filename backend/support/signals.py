@@ -0,0 +1,86 @@
+from django.db import connections, transaction
+from django.db.models.signals import m2m_changed, post_delete, post_migrate, post_save
+from django.dispatch import receiver
+
+from . import blobs, search
+from .cache import bump_version
+from .indexing import delete_document_files
+from .models import GuidelineDocument, Resource, ResourceCategory, ResourceRating
+from .ratings import apply_rating_change
+from .tags import sync_tags
+
+
+@receiver(post_delete, sender=GuidelineDocument)
+def remove_guideline_files(sender, instance, **kwargs):
+    # Wait for the commit so a rolled back delete keeps its store
+    transaction.on_commit(lambda: delete_document_files(instance))
+
+
+@receiver(post_save, sender=Resource)
+@receiver(post_save, sender=GuidelineDocument)
+def count_file_reference(sender, instance, created, update_fields=None, **kwargs):
+    if update_fields is not None and 'file' not in update_fields:
+        return
+    stored = None if created else getattr(instance, '_stored_file', None)
+    name = instance.file.name or None
+    if name != stored:
+        blobs.acquire(name)
+        blobs.release(stored)
+        instance._stored_file = name
+
+
+@receiver(post_delete, sender=Resource)
+@receiver(post_delete, sender=GuidelineDocument)
+def release_file_reference(sender, instance, **kwargs):
+    blobs.release(getattr(instance, '_stored_file', instance.file.name))
+
+
+@receiver(post_migrate)
+def repair_resource_search_index(sender, using, **kwargs):
+    # SQLite migrations that remake support_resource drop the FTS triggers with it
+    connection = connections[using]
+    if sender.name == 'support' and connection.vendor == 'sqlite':
+        if 'support_resource' in connection.introspection.table_names():
+            search.install_sqlite_index(connection)
+
+
+@receiver(post_save, sender=ResourceRating)
+def count_rating(sender, instance, **kwargs):
+    # Callers save ratings inside a transaction (update_or_create opens one itself), so
+    # the aggregates commit or roll back with the rating.
+    resource_id, rating = getattr(instance, '_counted', (None, None))
+    new_rating = int(instance.rating)
+    if resource_id is not None and resource_id != instance.resource_id:
+        apply_rating_change(resource_id, removed=rating)
+        rating = None
+    apply_rating_change(instance.resource_id, removed=rating, added=new_rating)
+    instance._counted = (instance.resource_id, new_rating)
+
+
+@receiver(post_delete, sender=ResourceRating)
+def uncount_rating(sender, instance, **kwargs):
+    resource_id, rating = getattr(instance, '_counted', (None, None))
+    if resource_id is not None:
+        apply_rating_change(resource_id, removed=rating)
+
+
+@receiver(post_save, sender=Resource)
+def link_resource_tags(sender, instance, created, update_fields=None, **kwargs):
+    if update_fields is not None and 'tags' not in update_fields:
+        return
+    synced = '' if created else getattr(instance, '_synced_tags', None)
+    if instance.tags != synced:
+        sync_tags(instance)
+
+
+def invalidate_listings(**kwargs):
+    # After the commit, so a page rebuilt under the new version sees the change
+    transaction.on_commit(bump_version)
+
+
+# Registered after the receivers above, so the rating aggregates and tags are written
+# before cached listings are invalidated
+for model in (Resource, ResourceCategory, ResourceRating):
+    post_save.connect(invalidate_listings, sender=model, dispatch_uid=f'invalidate_listings_save_{model.__name__}')
+    post_delete.connect(invalidate_listings, sender=model, dispatch_uid=f'invalidate_listings_delete_{model.__name__}')
+m2m_changed.connect(invalidate_listings, sender=Resource.tag_set.through, dispatch_uid='invalidate_listings_tags')
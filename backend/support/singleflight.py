@@ -0,0 +1,81 @@
+"""
+Request coalescing ("single flight") for duplicate concurrent calls.
+
+While a call for a key is in flight, further callers with the same key wait for it and
+share its result, or its exception, instead of issuing their own. Coalescing is per
+process and only covers calls that overlap in time; nothing is cached afterwards.
+"""
+import asyncio
+import threading
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Thread-safe single flight for synchronous callables."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, fn):
+        """Run ``fn()`` unless a call for ``key`` is in flight; either way return its result.
+
+        Returns ``(result, shared)`` where ``shared`` is True for callers that reused
+        another caller's upstream call.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = fn()
+        except BaseException as exc:
+            call.error = exc
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result, False
+
+
+class AsyncSingleFlight:
+    """Single flight for coroutines running on one event loop."""
+
+    def __init__(self):
+        self._tasks = {}
+
+    async def do(self, key, coro_fn):
+        """Await ``coro_fn()`` once per in-flight ``key``; returns ``(result, shared)``.
+
+        The upstream call runs as its own task and every caller awaits it through
+        ``asyncio.shield``, so a caller that is cancelled (e.g. the client disconnected)
+        does not cancel the call the other callers are waiting on.
+        """
+        task = self._tasks.get(key)
+        shared = task is not None
+        if task is None:
+            task = asyncio.ensure_future(coro_fn())
+            self._tasks[key] = task
+            task.add_done_callback(lambda done: self._forget(key, done))
+        return await asyncio.shield(task), shared
+
+    def _forget(self, key, task):
+        self._tasks.pop(key, None)
+        # Mark the exception as retrieved in case every caller was cancelled.
+        if not task.cancelled():
+            task.exception()
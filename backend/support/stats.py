@@ -0,0 +1,13 @@
+"""
+Statistics helpers shared by the LLM call metrics and the benchmark commands.
+"""
+import math
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of ``values`` (``pct`` in 0-100)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
@@ -0,0 +1,26 @@
+"""
+Content-addressed file storage for uploaded resources and guideline documents.
+
+Files are named by the SHA-256 of their content, so the same upload stored twice takes
+the disk space of one; see support.blobs for hashing, reference counting and chunked
+uploads. Names stored before this storage existed (``resources/...``,
+``guidelines/...``) still resolve, as the location is MEDIA_ROOT either way.
+"""
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+
+@deconstructible
+class BlobStorage(FileSystemStorage):
+    def _save(self, name, content):
+        from .blobs import store_chunks
+
+        # ``name`` only contributes its extension; the content picks the file
+        return store_chunks(content.chunks(), name)
+
+    def get_available_name(self, name, max_length=None):
+        # Never renamed: an existing file with the same name has the same content
+        return name
+
+
+blob_storage = BlobStorage()
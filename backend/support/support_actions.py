@@ -0,0 +1,150 @@
+"""
+Support action generation for a whole department (or any set of employees) at once.
+
+The prompt depends only on an employee's current and previous workload level, so
+employees are grouped by that pair and each distinct prompt is generated once: a
+department never needs more than 25 completions (levels 1-5 x 1-5), however large it
+is. Those run concurrently, at most ``SUPPORT_ACTION_BATCH_CONCURRENCY`` at a time, and
+the resulting history rows are inserted with one bulk_create.
+"""
+import asyncio
+from collections import defaultdict
+
+from asgiref.sync import async_to_sync
+from django.conf import settings
+
+from employees.models import Employee
+
+from .llm import acreate_chat_completion, parse_support_action, support_action_messages
+from .models import SupportActionHistory, parse_legacy_resources
+from .pagination import DEFAULT_PAGE_SIZE, keyset_page
+
+# Levels at or above this are reported to the model as positive, as in the frontend.
+POSITIVE_LEVEL = 3
+
+SUPPORT_ACTION_FIELDS = ('immediate_action', 'long_term_strategy', 'resources', 'priority_level')
+
+HISTORY_ORDERING = ('-created_at', '-id')
+
+
+def employee_levels(department=None, employee_ids=None):
+    """Queryset of the selected employees' ids, names and workload levels."""
+    employees = Employee.objects.all()
+    if department:
+        employees = employees.filter(department=department)
+    if employee_ids:
+        employees = employees.filter(id__in=employee_ids)
+    return employees.order_by('id').values(
+        'id', 'name', 'current_workload_level', 'previous_workload_level'
+    )
+
+
+async def _generate(levels, semaphore):
+    current_level, previous_level = levels
+    async with semaphore:
+        response_text = await acreate_chat_completion(
+            support_action_messages(
+                current_level, previous_level,
+                current_level >= POSITIVE_LEVEL, previous_level >= POSITIVE_LEVEL,
+            ),
+            max_tokens=300
+        )
+    response_data, is_structured = parse_support_action(response_text)
+    if is_structured and not all(field in response_data for field in SUPPORT_ACTION_FIELDS):
+        is_structured = False
+    return response_data, is_structured
+
+
+async def agenerate_support_actions(employees, user):
+    """Generate and record support actions for ``employees`` (dicts from employee_levels).
+
+    Returns ``(results, distinct_prompts)`` with one result per employee, in input order.
+    A failed completion only affects the employees sharing its levels.
+    """
+    groups = defaultdict(list)
+    for employee in employees:
+        groups[(employee['current_workload_level'], employee['previous_workload_level'])].append(employee)
+
+    semaphore = asyncio.Semaphore(settings.SUPPORT_ACTION_BATCH_CONCURRENCY)
+    outcomes = await asyncio.gather(
+        *(_generate(levels, semaphore) for levels in groups),
+        return_exceptions=True
+    )
+
+    results = {}
+    history = []
+    for (current_level, previous_level), outcome in zip(groups, outcomes):
+        for employee in groups[(current_level, previous_level)]:
+            result = {
+                'employeeId': employee['id'],
+                'name': employee['name'],
+                'currentWorkloadLevel': current_level,
+                'previousWorkloadLevel': previous_level,
+            }
+            if isinstance(outcome, Exception):
+                result['error'] = str(outcome)
+            else:
+                response_data, is_structured = outcome
+                result['action'] = response_data
+                if is_structured:
+                    history.append(SupportActionHistory(
+                        employee_id=str(employee['id']),
+                        current_workload_level=current_level,
+                        previous_workload_level=previous_level,
+                        immediate_action=response_data['immediate_action'],
+                        long_term_strategy=response_data['long_term_strategy'],
+                        resources=response_data['resources'],
+                        priority_level=response_data['priority_level'],
+                        created_by=user,
+                    ))
+            results[employee['id']] = result
+
+    if history:
+        await SupportActionHistory.objects.abulk_create(history)
+    return [results[employee['id']] for employee in employees], len(groups)
+
+
+generate_support_actions = async_to_sync(agenerate_support_actions)
+
+
+def support_action_history(employee_id, cursor=None, limit=DEFAULT_PAGE_SIZE):
+    """One keyset page of an employee's support actions, newest first.
+
+    Served by the (employee_id, created_at, id) index. Returns
+    ``{'results': [...], 'next': cursor}``; raises ValueError for a bad cursor.
+    """
+    rows, next_cursor = keyset_page(
+        SupportActionHistory.objects.filter(employee_id=employee_id).values(
+            'id',
+            'immediate_action',
+            'long_term_strategy',
+            'resources',
+            'resources_legacy',
+            'priority_level',
+            'created_at',
+            'current_workload_level',
+            'previous_workload_level'
+        ),
+        HISTORY_ORDERING, cursor, limit
+    )
+    for row in rows:
+        legacy = row.pop('resources_legacy')
+        if row['resources'] is None:
+            row['resources'] = parse_legacy_resources(legacy)
+    return {'results': rows, 'next': next_cursor}
+
+
+def batch_selection(data):
+    """Read ``department`` / ``employeeIds`` from a batch request body.
+
+    Raises ValueError when neither is given or the ids are not integers.
+    """
+    department = data.get('department')
+    employee_ids = data.get('employeeIds')
+    if not department and not employee_ids:
+        raise ValueError('Provide a department or a list of employeeIds')
+    if employee_ids is not None:
+        if not isinstance(employee_ids, list):
+            raise ValueError('employeeIds must be a list')
+        employee_ids = [int(employee_id) for employee_id in employee_ids]
+    return department, employee_ids
@@ -1,3 +1,976 @@
-from django.test import TestCase
+import asyncio
+import json
+import os
+import tempfile
+import threading
+from datetime import timedelta
+from io import BytesIO, StringIO
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core import serializers
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.management import CommandError, call_command
+from django.test import AsyncRequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from langchain.docstore.document import Document
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from employees.models import Employee
+
+from . import async_views, batching, blobs, indexing, media
+from .counters import ViewCounter
+from .batching import FAILED_SUFFIX, SpooledBatchWriter
+from .benchmarking import HashingEmbeddings
+from .guidelines import build_keyword_index, keyword_search
+from .instrumentation import call_report
+from .llm import coalescing_key, support_action_messages
+from .memory import schedule_summary_update, update_summary
+from .models import (
+    Blob, ChatMessage, ConversationSummary, GuidelineDocument, LLMCallRecord, Resource, ResourceCategory,
+    ResourceRating, ResourceViewBucket, SupportActionHistory,
+)
+from .recommendations import _latest_level
+from .support_actions import employee_levels, generate_support_actions
+
+
+class AsyncApiViewTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(username='alice', password='pw12345678')
+
+    def post(self, body):
+        return AsyncRequestFactory().post(
+            '/api/support/chat/', body, content_type='application/json',
+            headers={'Authorization': f'Bearer {AccessToken.for_user(self.user)}'},
+        )
+
+    async def test_rejects_bodies_that_are_not_json_objects(self):
+        for body in ('[]', '"x"', '3', 'null'):
+            with self.subTest(body=body):
+                response = await async_views.chat(self.post(body))
+                self.assertEqual(response.status_code, 400)
+
+    async def test_rejects_invalid_json(self):
+        response = await async_views.chat(self.post('{'))
+        self.assertEqual(response.status_code, 400)
+
+    @override_settings(OPENAI_API_KEY='test', LLM_METRICS_ENABLED=False)
+    async def test_llm_errors_are_logged(self):
+        with mock.patch.object(async_views, 'acreate_chat_completion', side_effect=RuntimeError('timed out')):
+            with self.assertLogs('support.async_views', 'ERROR') as logs:
+                response = await async_views.chat(self.post('{"message": "hello"}'))
+        self.assertEqual(response.status_code, 500)
+        self.assertIn('timed out', logs.output[0])
+
+
+class CoalescingKeyTests(SimpleTestCase):
+    def key(self, content):
+        return coalescing_key([{'role': 'user', 'content': content}], 'gpt-4', 0.7, 500)
+
+    def test_whitespace_does_not_change_the_key(self):
+        self.assertEqual(self.key('Meeting with  Ana\ntomorrow '), self.key('Meeting with Ana tomorrow'))
+
+    def test_case_changes_the_key(self):
+        self.assertNotEqual(self.key('Is HR aware?'), self.key('is hr aware?'))
+
+
+@override_settings(CHAT_CONTEXT_TURNS=2, CHAT_SUMMARY_BATCH=3)
+class ConversationSummaryTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username='alice', password='pw12345678')
+        start = timezone.now() - timedelta(days=1)
+        # Pairs of turns share a timestamp, so the cursor has to break ties on id
+        self.turns = ChatMessage.objects.bulk_create(
+            ChatMessage(user=self.user, message=f'turn {i}', response='ok', timestamp=start + timedelta(minutes=i // 2))
+            for i in range(11)
+        )
+        self.folded = []
+
+    def fold(self):
+        def summarize(messages, **kwargs):
+            self.folded.append([
+                turn.message for turn in self.turns if f'Employee: {turn.message}\n' in messages[0]['content']
+            ])
+            return f'summary {len(self.folded)}'
+
+        with mock.patch('support.memory.create_chat_completion', side_effect=summarize):
+            update_summary(self.user)
+
+    def test_a_backlog_is_folded_oldest_first_a_batch_at_a_time(self):
+        for _ in range(4):
+            self.fold()
+        self.assertEqual(self.folded, [
+            ['turn 0', 'turn 1', 'turn 2'],
+            ['turn 3', 'turn 4', 'turn 5'],
+            ['turn 6', 'turn 7', 'turn 8'],
+        ])
+        conversation = ConversationSummary.objects.get(user=self.user)
+        self.assertEqual(conversation.summary, 'summary 3')
+        self.assertEqual(conversation.summarized_through_message_id, self.turns[8].id)
+
+    def test_turns_behind_a_failed_fold_are_folded_later(self):
+        with mock.patch('support.memory.create_chat_completion', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                update_summary(self.user)
+        self.fold()
+        self.assertEqual(self.folded, [['turn 0', 'turn 1', 'turn 2']])
+
+
+@override_settings(LLM_PRICES_PER_1K_TOKENS={'gpt-4': (0.03, 0.06)})
+class ChatHistoryTests(TestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.user = User.objects.create_user(username='alice', password='pw12345678')
+        self.other = User.objects.create_user(username='bob', password='pw12345678')
+        timestamp = timezone.now()
+        # Seven turns logged in the same instant, interleaved with another user's
+        self.turns = ChatMessage.objects.bulk_create(
+            ChatMessage(user=user, message=f'{user.username} {i}', response='ok', timestamp=timestamp)
+            for i in range(7) for user in (self.user, self.other)
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_pages_cover_every_turn_once_across_equal_timestamps(self):
+        seen, cursor = [], None
+        while True:
+            params = {'limit': 3, **({'cursor': cursor} if cursor else {})}
+            response = self.client.get('/api/support/chat-messages/', params)
+            self.assertEqual(response.status_code, 200)
+            seen += [turn['id'] for turn in response.data['results']]
+            cursor = response.data['next']
+            if not cursor:
+                break
+        mine = [turn.id for turn in self.turns if turn.user_id == self.user.id]
+        self.assertEqual(seen, sorted(mine, reverse=True))
+
+    def test_other_users_turns_are_out_of_reach(self):
+        theirs = next(turn for turn in self.turns if turn.user_id == self.other.id)
+        self.assertEqual(self.client.get(f'/api/support/chat-messages/{theirs.id}/').status_code, 404)
+        self.assertEqual(self.client.delete(f'/api/support/chat-messages/{theirs.id}/').status_code, 404)
+
+        response = self.client.post(
+            '/api/support/chat-messages/', {'message': 'hi', 'response': 'hello', 'user': self.other.id}
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(ChatMessage.objects.get(pk=response.data['id']).user, self.user)
+
+
+class ScheduleSummaryUpdateTests(SimpleTestCase):
+    def setUp(self):
+        self.user = get_user_model()(pk=1, username='alice')
+        self.release = threading.Event()
+        self.done = threading.Event()
+        self.calls = []
+
+    def slow_fold(self, user):
+        self.calls.append(user.pk)
+        self.release.wait(5)
+        self.done.set()
+
+    async def aslow_fold(self, user):
+        self.calls.append(user.pk)
+        await asyncio.sleep(0.05)
+        self.done.set()
+
+    def test_the_reply_does_not_wait_for_the_fold(self):
+        with mock.patch('support.memory.update_summary', side_effect=self.slow_fold):
+            schedule_summary_update(self.user)
+            # Still running: a second turn does not start another fold
+            schedule_summary_update(self.user)
+            self.assertFalse(self.done.is_set())
+            self.release.set()
+            self.assertTrue(self.done.wait(5))
+        self.assertEqual(self.calls, [1])
+
+    def test_on_an_event_loop_the_fold_is_a_task(self):
+        user = get_user_model()(pk=2, username='bob')
+
+        async def chat_turn():
+            schedule_summary_update(user)
+            self.assertFalse(self.done.is_set())
+            while not self.done.is_set():
+                await asyncio.sleep(0.01)
+
+        with mock.patch('support.memory.aupdate_summary', side_effect=self.aslow_fold):
+            asyncio.run(asyncio.wait_for(chat_turn(), 5))
+        self.assertEqual(self.calls, [2])
+
+
+class CallReportTests(TestCase):
+    def setUp(self):
+        hour = timezone.now().replace(minute=0, second=0, microsecond=0) - timedelta(hours=2)
+        records = []
+        for i in range(100):
+            records.append(LLMCallRecord(
+                endpoint='chat', kind='chat', model='gpt-4', outcome='ok' if i % 10 else 'error',
+                started_at=hour + timedelta(minutes=i), duration_ms=i + 1, first_token_ms=i + 1,
+                prompt_tokens=100, completion_tokens=10,
+            ))
+        records.append(LLMCallRecord(
+            endpoint='chat', kind='chat', model='gpt-4', outcome='coalesced',
+            started_at=hour, duration_ms=5000,
+        ))
+        records.append(LLMCallRecord(
+            endpoint='guideline-chat', kind='embedding', model='unpriced', outcome='ok',
+            started_at=hour, duration_ms=7, prompt_tokens=3,
+        ))
+        LLMCallRecord.objects.bulk_create(records)
+        self.since = hour - timedelta(minutes=1)
+
+    def test_totals_come_from_every_call(self):
+        chat, guideline = call_report(self.since)
+        self.assertEqual(chat['endpoint'], 'chat')
+        self.assertEqual(chat['calls'], 100)
+        self.assertEqual(chat['outcomes'], {'ok': 90, 'error': 10, 'coalesced': 1})
+        self.assertEqual(chat['prompt_tokens'], 10000)
+        self.assertAlmostEqual(chat['cost_usd'], 100 * (0.003 + 0.0006))
+        self.assertEqual((chat['p50_ms'], chat['p99_ms']), (50, 99))
+        self.assertEqual([bucket['calls'] for bucket in chat['series']], [60, 40])
+        self.assertEqual((guideline['calls'], guideline['cost_usd']), (1, 0))
+
+    def test_percentiles_read_a_capped_sample(self):
+        chat = call_report(self.since, sample_size=20)[0]
+        self.assertEqual(chat['calls'], 100)
+        self.assertLessEqual(chat['latency_sample'], 21)
+        self.assertAlmostEqual(chat['p50_ms'], 50, delta=10)
+
+
+class BackfillSupportActionResourcesTests(TestCase):
+    def setUp(self):
+        self.rows = {
+            legacy: SupportActionHistory.objects.create(
+                employee_id='7', current_workload_level=2, previous_workload_level=3,
+                immediate_action='Rest', long_term_strategy='Plan', priority_level='high',
+                resources=None, resources_legacy=legacy,
+            )
+            for legacy in ('["Counselling"]', '', '["unterminated', '{"not": "a list"}')
+        }
+
+    def backfill(self, *args):
+        out, err = StringIO(), StringIO()
+        call_command('backfill_support_action_resources', '--pause=0', *args, stdout=out, stderr=err)
+        return out.getvalue(), err.getvalue()
+
+    def stored(self, legacy):
+        row = self.rows[legacy]
+        row.refresh_from_db()
+        return row.resources, row.resources_legacy
+
+    def test_malformed_rows_are_reported_and_left_untouched(self):
+        _, err = self.backfill()
+        self.assertEqual(self.stored('["Counselling"]'), (['Counselling'], ''))
+        self.assertEqual(self.stored(''), ([], ''))
+        self.assertEqual(self.stored('["unterminated'), (None, '["unterminated'))
+        self.assertEqual(self.stored('{"not": "a list"}'), (None, '{"not": "a list"}'))
+        self.assertIn('2 rows have malformed resources_legacy', err)
+        self.assertIn(str(self.rows['["unterminated'].id), err)
+
+    def test_dry_run_changes_nothing(self):
+        out, _ = self.backfill('--dry-run')
+        self.assertIn('2 rows would be converted, 2 malformed', out)
+        self.assertEqual(SupportActionHistory.objects.filter(resources__isnull=True).count(), 4)
+
+    def test_strict_fails_on_malformed_rows(self):
+        with self.assertRaises(CommandError):
+            self.backfill('--strict')
+        # Rows that could be converted still were
+        self.assertEqual(self.stored('["Counselling"]'), (['Counselling'], ''))
+
+
+class SpooledBatchWriterRecoveryTests(TransactionTestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username='alice', password='pw12345678')
+        spool_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(spool_dir.cleanup)
+        self.spool_dir = spool_dir.name
+        self.writer = SpooledBatchWriter(ChatMessage, self.spool_dir)
+
+    def spool(self, name, user_id):
+        # A segment left behind by a process that died before flushing it
+        turn = ChatMessage(user_id=user_id, message=name, response='ok')
+        path = os.path.join(self.spool_dir, f'support.chatmessage-{name}.jsonl')
+        with open(path, 'w', encoding='utf-8') as segment:
+            segment.write(serializers.serialize('json', [turn]) + '\n')
+        return path
+
+    def test_a_segment_that_cannot_be_inserted_is_quarantined(self):
+        # The user was deleted after the turn was spooled
+        orphan = self.spool('a-orphan', self.user.pk + 1000)
+        valid = self.spool('b-valid', self.user.pk)
+
+        with self.assertLogs('support.batching', 'ERROR'):
+            self.assertEqual(self.writer.recover(), 1)
+        self.assertEqual(list(ChatMessage.objects.values_list('message', flat=True)), ['b-valid'])
+        self.assertFalse(os.path.exists(valid))
+        self.assertFalse(os.path.exists(orphan))
+        self.assertTrue(os.path.exists(orphan + FAILED_SUFFIX))
+
+        # Quarantined segments are not retried
+        self.assertEqual(self.writer.recover(), 0)
+
+
+    def test_recovery_cannot_take_a_segment_being_created(self):
+        real_flock = batching.fcntl.flock
+        recovered = []
+
+        def flock(spool, operation):
+            # Another process's recovery pass runs between creating and locking the segment
+            if spool.mode == 'a' and not recovered:
+                recovered.append(SpooledBatchWriter(ChatMessage, self.spool_dir).recover())
+            return real_flock(spool, operation)
+
+        # No background thread: this test flushes by hand
+        with mock.patch.object(batching.fcntl, 'flock', flock), mock.patch.object(self.writer, '_start'):
+            self.writer.add(ChatMessage(user=self.user, message='hello', response='hi'))
+
+        self.assertEqual(recovered, [0])
+        segments = os.listdir(self.spool_dir)
+        self.assertEqual(len(segments), 1)
+        self.assertTrue(segments[0].endswith('.jsonl'))
+        with open(os.path.join(self.spool_dir, segments[0]), encoding='utf-8') as segment:
+            self.assertIn('hello', segment.read())
+
+        self.assertEqual(self.writer.flush(), 1)
+        self.assertEqual(os.listdir(self.spool_dir), [])
+
+
+class LatestWorkloadLevelTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username='alice', password='pw12345678')
+        employee = Employee.objects.create(name='Alice', email='alice@example.com', department='Ops', user=self.user)
+        Employee.objects.filter(pk=employee.pk).update(current_workload_level=2)
+
+    def test_falls_back_to_the_linked_employee(self):
+        ChatMessage.objects.create(user=self.user, message='hi', response='hello')
+        self.assertEqual(_latest_level(self.user), 2)
+
+    def test_prefers_the_latest_guideline_chat(self):
+        ChatMessage.objects.create(user=self.user, message='hi', response='hello', workload_level=4)
+        self.assertEqual(_latest_level(self.user), 4)
+
+
+class BlobStoreTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        settings_override = override_settings(MEDIA_ROOT=media_root.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.user = get_user_model().objects.create_user(username='alice', password='pw12345678')
+
+    def resource(self, content, name='guide.pdf'):
+        return Resource.objects.create(
+            title='Guide', description='A guide', file=ContentFile(content, name=name), created_by=self.user
+        )
+
+    def blob(self, name):
+        return Blob.objects.get(file=name)
+
+    def test_identical_uploads_share_one_counted_blob(self):
+        first = self.resource(b'same bytes')
+        second = self.resource(b'same bytes', name='copy.PDF')
+        self.assertEqual(first.file.name, second.file.name)
+        self.assertTrue(first.file.name.endswith('.pdf'))
+        self.assertEqual(self.blob(first.file.name).ref_count, 2)
+
+        second.delete()
+        self.assertEqual(self.blob(first.file.name).ref_count, 1)
+        first.file = ContentFile(b'new bytes', name='guide.pdf')
+        first.save()
+        self.assertEqual(Blob.objects.filter(ref_count=0).count(), 1)
+
+    def test_gc_removes_only_unreferenced_blobs_past_the_grace_period(self):
+        kept = self.resource(b'kept').file.name
+        dropped = self.resource(b'dropped')
+        dropped_name = dropped.file.name
+        dropped.delete()
+
+        self.assertEqual(blobs.collect_garbage(1)[0], 0)
+        Blob.objects.update(updated_at=timezone.now() - timedelta(hours=2))
+        removed, freed, _ = blobs.collect_garbage(1)
+        self.assertEqual((removed, freed), (1, len(b'dropped')))
+        self.assertFalse(Blob.objects.filter(file=dropped_name).exists())
+        self.assertFalse(os.path.exists(blobs.blob_storage.path(dropped_name)))
+        self.assertTrue(os.path.exists(blobs.blob_storage.path(kept)))
+
+    def test_commit_file_does_not_undo_a_concurrent_acquire(self):
+        name = self.resource(b'shared bytes').file.name
+        Blob.objects.update(updated_at=timezone.now() - timedelta(hours=2))
+        path = blobs.blob_storage.path
+
+        def acquire_midway(stored_name):
+            # Another request saves a row using the blob while this one stores it again
+            if stored_name == name:
+                blobs.acquire(name)
+            return path(stored_name)
+
+        with mock.patch.object(blobs.blob_storage, 'path', side_effect=acquire_midway):
+            self.assertEqual(blobs.store_chunks([b'shared ', b'bytes'], 'again.pdf'), name)
+        self.assertEqual(self.blob(name).ref_count, 2)
+        self.assertEqual(blobs.collect_garbage(0)[0], 0)
+        self.assertTrue(os.path.exists(path(name)))
+
+    def test_chunked_upload_resumes_at_the_received_offset(self):
+        data = b'0123456789' * 10
+        session = blobs.start_upload(self.user, 'notes.txt', len(data))
+        blobs.append_chunk(session, 0, BytesIO(data[:40]), 40)
+        # The client retries from the wrong place
+        with self.assertRaises(blobs.UploadOffsetMismatch) as mismatch:
+            blobs.append_chunk(session, 10, BytesIO(data[10:50]), 40)
+        self.assertEqual(mismatch.exception.offset, 40)
+
+        # A connection that drops midway keeps the bytes that arrived
+        blobs.append_chunk(session, 40, BytesIO(data[40:70]), 60)
+        self.assertEqual(session.received, 70)
+        self.assertFalse(session.complete)
+
+        blobs._hashers.clear()  # The rest arrives at another process
+        blobs.append_chunk(session, 70, BytesIO(data[70:]), 30)
+        self.assertTrue(session.complete)
+        self.assertEqual(session.file, self.resource(data, name='notes.txt').file.name)
+        with blobs.blob_storage.open(session.file) as stored:
+            self.assertEqual(stored.read(), data)
+
+
+class UploadViewSetTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        settings_override = override_settings(MEDIA_ROOT=media_root.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.client = APIClient()
+        self.client.force_authenticate(get_user_model().objects.create_user(username='alice', password='pw12345678'))
+
+    def patch(self, upload, offset, chunk):
+        return self.client.generic(
+            'PATCH', f'/api/support/uploads/{upload}/', chunk,
+            content_type='application/offset+octet-stream', headers={'Upload-Offset': str(offset)},
+        )
+
+    def test_the_browser_may_send_the_offset_header(self):
+        response = self.client.options(
+            '/api/support/uploads/1/',
+            headers={
+                'Origin': 'http://localhost:3000',
+                'Access-Control-Request-Method': 'PATCH',
+                'Access-Control-Request-Headers': 'authorization, upload-offset',
+            },
+        )
+        self.assertIn('upload-offset', response.headers['Access-Control-Allow-Headers'])
+
+    def test_an_upload_is_sent_and_resumed_in_chunks(self):
+        data = b'0123456789' * 3
+        response = self.client.post('/api/support/uploads/', {'filename': 'notes.txt', 'size': len(data)})
+        self.assertEqual(response.status_code, 201)
+        upload = response.data['id']
+
+        self.assertEqual(self.patch(upload, 0, data[:10]).data['offset'], 10)
+        conflict = self.patch(upload, 0, data[:10])
+        self.assertEqual((conflict.status_code, conflict.data['offset']), (409, 10))
+        self.assertEqual(self.patch(upload, 10, data[10:]).data['complete'], True)
+        self.assertEqual(self.client.get(f'/api/support/uploads/{upload}/').data['offset'], len(data))
+
+        self.assertEqual(self.patch(upload, 'start', b'').status_code, 400)
+        other = APIClient()
+        other.force_authenticate(get_user_model().objects.create_user(username='bob', password='pw12345678'))
+        self.assertEqual(other.get(f'/api/support/uploads/{upload}/').status_code, 404)
+        self.assertEqual(self.client.delete(f'/api/support/uploads/{upload}/').status_code, 204)
+        self.assertEqual(self.client.get(f'/api/support/uploads/{upload}/').status_code, 404)
+
+
+class SharedStoreTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        settings_override = override_settings(MEDIA_ROOT=media_root.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def store(self, name):
+        path = os.path.join(indexing.store_root(), name)
+        os.makedirs(path)
+        return path
+
+    def document(self, path=None, status='ready'):
+        return GuidelineDocument.objects.create(
+            name='Handbook', file='guidelines/handbook.txt', status=status, vector_store_path=path
+        )
+
+    def test_a_shared_store_is_kept_until_its_last_user_moves_off(self):
+        shared = self.store('doc_1_shared')
+        first = self.document(shared)
+        second = self.document()
+        self.assertTrue(indexing.share_store(second, shared))
+
+        indexing.publish_store(first, self.store('doc_1_new'))
+        indexing.remove_store(shared)
+        self.assertTrue(os.path.isdir(shared))
+
+        second.refresh_from_db()
+        indexing.publish_store(second, self.store('doc_2_new'))
+        indexing.remove_store(shared)
+        self.assertFalse(os.path.isdir(shared))
+
+    def test_a_store_removed_since_it_was_found_is_not_shared(self):
+        shared = self.store('doc_1_shared')
+        lender = self.document(shared)
+        document = self.document(status='processing')
+        copy = indexing.indexed_copy
+        own_store = self.store('doc_2_own')
+
+        def moved_off(file_name, exclude=None):
+            # The lender is re-indexed and its old store removed right after being found
+            found = copy(file_name, exclude)
+            indexing.publish_store(lender, self.store('doc_1_new'))
+            indexing.remove_store(shared)
+            return found
+
+        with mock.patch.object(indexing, 'indexed_copy', side_effect=moved_off), \
+                mock.patch.object(indexing, 'build_store', return_value=(own_store, {})) as build_store:
+            self.assertEqual(indexing.index_document(document), {})
+
+        build_store.assert_called_once()
+        document.refresh_from_db()
+        self.assertEqual((document.vector_store_path, document.status), (own_store, 'ready'))
+
+
+class RatingAggregateTests(TestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.alice = User.objects.create_user(username='alice', password='pw12345678')
+        self.bob = User.objects.create_user(username='bob', password='pw12345678')
+        self.guide = Resource.objects.create(title='Guide', description='A guide', created_by=self.alice)
+        self.video = Resource.objects.create(title='Video', description='A video', created_by=self.alice)
+
+    def aggregates(self, resource):
+        resource.refresh_from_db()
+        return (
+            resource.rating_count, resource.rating_sum, resource.rating_average,
+            [getattr(resource, f'rating_count_{value}') for value in range(1, 6)],
+        )
+
+    def test_ratings_are_counted_on_create_change_and_delete(self):
+        ResourceRating.objects.create(resource=self.guide, user=self.alice, rating=5)
+        bobs = ResourceRating.objects.create(resource=self.guide, user=self.bob, rating=2)
+        self.assertEqual(self.aggregates(self.guide), (2, 7, 3.5, [0, 1, 0, 0, 1]))
+
+        bobs = ResourceRating.objects.get(pk=bobs.pk)
+        bobs.rating = 4
+        bobs.save()
+        self.assertEqual(self.aggregates(self.guide), (2, 9, 4.5, [0, 0, 0, 1, 1]))
+
+        # Moving a rating to another resource takes it off the first
+        bobs.resource = self.video
+        bobs.save()
+        self.assertEqual(self.aggregates(self.guide), (1, 5, 5.0, [0, 0, 0, 0, 1]))
+        self.assertEqual(self.aggregates(self.video), (1, 4, 4.0, [0, 0, 0, 1, 0]))
+
+        bobs.delete()
+        self.assertEqual(self.aggregates(self.video), (0, 0, 0.0, [0, 0, 0, 0, 0]))
+
+    def test_repair_reconciles_drifted_aggregates(self):
+        ResourceRating.objects.create(resource=self.guide, user=self.alice, rating=3)
+        ResourceRating.objects.create(resource=self.guide, user=self.bob, rating=4)
+        # Bulk edits bypass the signals
+        ResourceRating.objects.filter(user=self.bob).update(rating=1)
+        Resource.objects.filter(pk=self.video.pk).update(rating_count=3, rating_sum=12, rating_average=4.0)
+
+        out = StringIO()
+        call_command('repair_rating_aggregates', chunk_size=1, stdout=out)
+        self.assertIn('Checked 2 resources, repaired 2', out.getvalue())
+        self.assertEqual(self.aggregates(self.guide), (2, 4, 2.0, [1, 0, 1, 0, 0]))
+        self.assertEqual(self.aggregates(self.video), (0, 0, 0.0, [0, 0, 0, 0, 0]))
+
+        out = StringIO()
+        call_command('repair_rating_aggregates', stdout=out)
+        self.assertIn('repaired 0', out.getvalue())
+
+
+class MediaFileViewTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        settings_override = override_settings(MEDIA_ROOT=media_root.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        User = get_user_model()
+        self.user = User.objects.create_user(username='alice', password='pw12345678')
+        self.manager = User.objects.create_user(username='mia', password='pw12345678', is_staff=True)
+        self.public = self.resource(b'0123456789', 'ALL')
+        self.restricted = self.resource(b'managers only', 'MANAGER')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def resource(self, content, access_level):
+        resource = Resource.objects.create(
+            title='Guide', description='A guide', access_level=access_level,
+            file=ContentFile(content, name='guide.txt'), created_by=self.user,
+        )
+        return resource.file.name
+
+    def get(self, name, client=None, **headers):
+        return (client or self.client).get(f'/media/{name}', headers=headers)
+
+    def body(self, response):
+        return b''.join(response.streaming_content)
+
+    def test_whole_file_with_validators(self):
+        response = self.get(self.public)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.body(response), b'0123456789')
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertEqual(response['ETag'], media.etag_for(self.public, os.stat(blobs.blob_storage.path(self.public))))
+
+        cached = self.get(self.public, **{'If-None-Match': response['ETag']})
+        self.assertEqual(cached.status_code, 304)
+
+    def test_byte_ranges(self):
+        response = self.get(self.public, Range='bytes=2-5')
+        self.assertEqual((response.status_code, response['Content-Range']), (206, 'bytes 2-5/10'))
+        self.assertEqual(self.body(response), b'2345')
+
+        self.assertEqual(self.body(self.get(self.public, Range='bytes=-3')), b'789')
+        self.assertEqual(self.body(self.get(self.public, Range='bytes=7-')), b'789')
+
+        unsatisfiable = self.get(self.public, Range='bytes=20-')
+        self.assertEqual((unsatisfiable.status_code, unsatisfiable['Content-Range']), (416, 'bytes */10'))
+
+        # Malformed ranges, and ranges of a file that changed since, get the whole file
+        self.assertEqual(self.get(self.public, Range='bytes=5-2').status_code, 200)
+        stale = self.get(self.public, Range='bytes=2-5', **{'If-Range': '"stale"'})
+        self.assertEqual((stale.status_code, self.body(stale)), (200, b'0123456789'))
+
+    def test_access_levels(self):
+        self.assertEqual(self.get(self.restricted).status_code, 404)
+        manager = APIClient()
+        manager.force_authenticate(self.manager)
+        self.assertEqual(self.body(self.get(self.restricted, manager)), b'managers only')
+
+        self.assertEqual(APIClient().get(f'/media/{self.public}').status_code, 401)
+        # Only files a resource or guideline uses are reachable
+        os.makedirs(os.path.join(settings.MEDIA_ROOT, 'vectorstores'))
+        with open(os.path.join(settings.MEDIA_ROOT, 'vectorstores', 'index.faiss'), 'wb') as index:
+            index.write(b'index')
+        self.assertEqual(self.get('vectorstores/index.faiss').status_code, 404)
+        self.assertEqual(self.get('../outside.txt').status_code, 404)
+
+    def test_signed_links(self):
+        anonymous = APIClient()
+        url = media.signed_url(f'/media/{self.public}', self.public, self.user)
+        self.assertEqual(self.body(anonymous.get(url)), b'0123456789')
+
+        # Tokens are bound to the file and to the access profile they were issued for
+        token = url.split('?')[1]
+        self.assertEqual(anonymous.get(f'/media/{self.restricted}?{token}').status_code, 403)
+        restricted = media.signed_url(f'/media/{self.restricted}', self.restricted, self.user)
+        self.assertEqual(anonymous.get(restricted).status_code, 404)
+
+        with override_settings(MEDIA_URL_MAX_AGE=-1):
+            self.assertEqual(anonymous.get(url).status_code, 403)
+
+    @override_settings(MEDIA_SENDFILE_BACKEND='nginx', MEDIA_SENDFILE_URL='/protected-media/')
+    def test_nginx_serves_the_bytes(self):
+        response = self.get(self.public)
+        self.assertEqual(response['X-Accel-Redirect'], f'/protected-media/{self.public}')
+        self.assertEqual(response.content, b'')
+
+
+@override_settings(RESOURCE_CACHE_SECONDS=60)
+class CachedListingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.user = get_user_model().objects.create_user(username='alice', password='pw12345678')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.guide = Resource.objects.create(title='Guide', description='A guide', created_by=self.user)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def titles(self):
+        response = self.client.get('/api/support/resources/')
+        self.assertEqual(response.status_code, 200)
+        return [resource['title'] for resource in response.data['results']]
+
+    def test_saves_and_deletes_make_cached_pages_stale(self):
+        self.assertEqual(self.titles(), ['Guide'])
+        # Bulk updates send no signals: the cached page is still served
+        Resource.objects.filter(pk=self.guide.pk).update(title='Renamed quietly')
+        self.assertEqual(self.titles(), ['Guide'])
+
+        version = cache.get('support:resources:version')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.guide.title = 'Handbook'
+            self.guide.save()
+        self.assertNotEqual(cache.get('support:resources:version'), version)
+        self.assertEqual(self.titles(), ['Handbook'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.guide.delete()
+        self.assertEqual(self.titles(), [])
+
+    def test_the_version_changes_only_on_commit(self):
+        self.assertEqual(self.titles(), ['Guide'])
+        version = cache.get('support:resources:version')
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            self.guide.save()
+        self.assertEqual(cache.get('support:resources:version'), version)
+        callbacks[-1]()
+        self.assertNotEqual(cache.get('support:resources:version'), version)
+
+
+@override_settings(RESOURCE_CACHE_SECONDS=0)
+class ResourceTagTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username='alice', password='pw12345678')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.sleep = ResourceCategory.objects.create(name='Sleep')
+
+    def resource(self, title, tags, **fields):
+        return Resource.objects.create(
+            title=title, description=title, tags=tags, created_by=self.user, **fields
+        )
+
+    def tag_names(self, resource):
+        return sorted(resource.tag_set.values_list('name', flat=True))
+
+    def test_tag_set_follows_the_tags_string(self):
+        guide = self.resource('Guide', 'Stress, Sleep ,stress,')
+        self.assertEqual(self.tag_names(guide), ['sleep', 'stress'])
+
+        guide = Resource.objects.get(pk=guide.pk)
+        guide.tags = 'focus'
+        guide.save()
+        self.assertEqual(self.tag_names(guide), ['focus'])
+
+        # Saves that leave the tags alone do not touch the links
+        guide = Resource.objects.get(pk=guide.pk)
+        with mock.patch('support.signals.sync_tags') as sync_tags:
+            guide.title = 'Handbook'
+            guide.save()
+            guide.save(update_fields=['title'])
+        sync_tags.assert_not_called()
+
+    def test_tag_filter_matches_whole_tags(self):
+        self.resource('Breathing', 'stress, sleep')
+        self.resource('Burnout', 'stressful')
+        self.resource('Naps', 'sleep')
+
+        def titles(**params):
+            response = self.client.get('/api/support/resources/', params)
+            return sorted(resource['title'] for resource in response.data['results'])
+
+        self.assertEqual(titles(tag='Stress'), ['Breathing'])
+        self.assertEqual(titles(tag=['sleep', 'stress']), ['Breathing'])
+        self.assertEqual(titles(tag='sleep'), ['Breathing', 'Naps'])
+
+    def test_facets_count_what_the_filters_leave(self):
+        self.resource('Breathing', 'stress, sleep', category=self.sleep, resource_type='VIDEO')
+        self.resource('Naps', 'sleep', category=self.sleep)
+        self.resource('Focus', '')
+        self.resource('Managing teams', 'stress', access_level='MANAGER')
+
+        facets = self.client.get('/api/support/resources/facets/').data
+        self.assertEqual(facets['tags'], [{'name': 'sleep', 'count': 2}, {'name': 'stress', 'count': 1}])
+        self.assertEqual(facets['categories'], [{'id': self.sleep.id, 'name': 'Sleep', 'count': 2}])
+        self.assertEqual(facets['resource_types'], [
+            {'value': 'DOCUMENT', 'label': 'Document', 'count': 2},
+            {'value': 'VIDEO', 'label': 'Video', 'count': 1},
+        ])
+
+        facets = self.client.get('/api/support/resources/facets/', {'tag': 'stress'}).data
+        self.assertEqual(facets['tags'], [{'name': 'sleep', 'count': 1}, {'name': 'stress', 'count': 1}])
+        self.assertEqual(facets['resource_types'], [{'value': 'VIDEO', 'label': 'Video', 'count': 1}])
+
+
+class ViewCounterTests(TestCase):
+    def setUp(self):
+        user = get_user_model().objects.create_user(username='alice', password='pw12345678')
+        self.guide = Resource.objects.create(title='Guide', description='A guide', created_by=user)
+        self.video = Resource.objects.create(title='Video', description='A video', created_by=user)
+        # Flushed by hand; the background thread would only wake after an hour
+        self.counter = ViewCounter(flush_interval=3600)
+
+    def counts(self):
+        return dict(Resource.objects.values_list('title', 'views_count'))
+
+    def test_concurrent_views_add_up_without_touching_updated_at(self):
+        updated_at = Resource.objects.get(pk=self.guide.pk).updated_at
+
+        def view(resource_id, times):
+            for _ in range(times):
+                self.counter.add(resource_id)
+
+        threads = [
+            threading.Thread(target=view, args=(resource.pk, 250))
+            for resource in (self.guide, self.guide, self.guide, self.video)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(self.counter.flush(), 1000)
+        self.assertEqual(self.counts(), {'Guide': 750, 'Video': 250})
+        self.assertEqual(Resource.objects.get(pk=self.guide.pk).updated_at, updated_at)
+        self.assertEqual(
+            dict(ResourceViewBucket.objects.values_list('resource__title', 'views')), {'Guide': 750, 'Video': 250}
+        )
+
+    def test_a_failed_flush_keeps_its_views(self):
+        self.counter.add(self.guide.pk, 3)
+        with mock.patch.object(ResourceViewBucket.objects, 'bulk_create', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                self.counter.flush()
+        # The whole flush rolled back
+        self.assertEqual(self.counts(), {'Guide': 0, 'Video': 0})
+
+        self.counter.add(self.guide.pk)
+        self.assertEqual(self.counter.flush(), 4)
+        self.assertEqual(self.counts(), {'Guide': 4, 'Video': 0})
+        self.assertEqual(self.counter.flush(), 0)
+
+
+class BatchSupportActionTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username='alice', password='pw12345678')
+        levels = [(4, 2), (2, 3), (4, 2), (1, 1), (4, 2)]
+        for index, (current, previous) in enumerate(levels):
+            employee = Employee.objects.create(name=f'Employee {index}', email=f'e{index}@example.com', department='Ops')
+            Employee.objects.filter(pk=employee.pk).update(
+                current_workload_level=current, previous_workload_level=previous
+            )
+        Employee.objects.create(name='Elsewhere', email='elsewhere@example.com', department='Sales')
+
+    def test_one_completion_per_level_pair(self):
+        prompts = {
+            str(support_action_messages(current, previous, current >= 3, previous >= 3)): (current, previous)
+            for current, previous in [(4, 2), (2, 3), (1, 1)]
+        }
+        calls = []
+
+        async def complete(messages, **kwargs):
+            current, previous = prompts[str(messages)]
+            calls.append((current, previous))
+            if (current, previous) == (1, 1):
+                raise RuntimeError('upstream timeout')
+            return json.dumps({
+                'immediate_action': f'Act on {current}/{previous}', 'long_term_strategy': 'Plan',
+                'resources': ['EAP'], 'priority_level': 'high',
+            })
+
+        employees = list(employee_levels(department='Ops'))
+        with mock.patch('support.support_actions.acreate_chat_completion', side_effect=complete):
+            results, distinct_prompts = generate_support_actions(employees, self.user)
+
+        self.assertEqual(distinct_prompts, 3)
+        self.assertEqual(sorted(calls), [(1, 1), (2, 3), (4, 2)])
+        self.assertEqual([result['employeeId'] for result in results], [employee['id'] for employee in employees])
+        self.assertEqual(
+            [result.get('action', {}).get('immediate_action') or result['error'] for result in results],
+            ['Act on 4/2', 'Act on 2/3', 'Act on 4/2', 'upstream timeout', 'Act on 4/2'],
+        )
+        # One history row per employee whose prompt succeeded
+        self.assertEqual(
+            sorted(SupportActionHistory.objects.values_list('employee_id', 'immediate_action')),
+            sorted(
+                (str(employee['id']), f"Act on {employee['current_workload_level']}/{employee['previous_workload_level']}")
+                for employee in employees if employee['current_workload_level'] != 1
+            ),
+        )
+        self.assertEqual(set(SupportActionHistory.objects.values_list('created_by', flat=True)), {self.user.id})
+
+
+class KeywordSearchTests(SimpleTestCase):
+    def setUp(self):
+        root = tempfile.TemporaryDirectory()
+        self.addCleanup(root.cleanup)
+        self.root = root.name
+
+    def document(self, name, texts):
+        path = os.path.join(self.root, name)
+        build_keyword_index(path, [Document(page_content=text, metadata={'source': name}) for text in texts])
+        return SimpleNamespace(vector_store_path=path)
+
+    def test_each_documents_best_chunks_are_fused_by_rank(self):
+        # "deadline" is rare in the handbook and common in the policy, so the handbook's
+        # raw BM25 scores are on a much larger scale
+        handbook = self.document('handbook', [
+            'Deadline pressure and deadline stress', 'A deadline plan',
+        ] + [f'Filler paragraph {i} about lunch' for i in range(10)])
+        policy = self.document('policy', [
+            'Deadline extensions need a manager deadline sign off',
+        ] + [f'Deadline clause {i} for contractors' for i in range(10)])
+
+        results = keyword_search([handbook, policy], 'deadline', 2)
+        self.assertEqual([result.metadata['source'] for result in results], ['handbook', 'policy'])
+        self.assertEqual(results[0].page_content, 'Deadline pressure and deadline stress')
+
+    def test_stores_without_a_keyword_index_are_skipped(self):
+        handbook = self.document('handbook', ['Take regular breaks'])
+        legacy = SimpleNamespace(vector_store_path=os.path.join(self.root, 'legacy'))
+        os.makedirs(legacy.vector_store_path)
+        with self.assertLogs('support.guidelines', 'WARNING'):
+            results = keyword_search([legacy, handbook], 'breaks', 4)
+        self.assertEqual([result.page_content for result in results], ['Take regular breaks'])
+        # Not built on the request path
+        self.assertEqual(os.listdir(legacy.vector_store_path), [])
+
+
+@override_settings(
+    GUIDELINE_EMBEDDINGS_CLASS='support.benchmarking.HashingEmbeddings',
+    GUIDELINE_EMBED_BATCH_SIZE=4,
+    GUIDELINE_INDEX_TYPE='flat',
+    LLM_METRICS_ENABLED=False,
+)
+class BuildStoreTests(SimpleTestCase):
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        settings_override = override_settings(MEDIA_ROOT=media_root.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.pages_read = 0
+        self.embedded = []
+
+    def build(self, pages, store=None):
+        def page_chunks(file_path):
+            for page in pages:
+                self.pages_read += 1
+                yield [Document(page_content=text, metadata={'page': self.pages_read}) for text in page]
+
+        embed_documents = HashingEmbeddings.embed_documents
+
+        def record(embeddings, texts):
+            self.embedded.append((self.pages_read, len(texts)))
+            return embed_documents(embeddings, texts)
+
+        self.pages_read = 0
+        self.embedded = []
+        document = SimpleNamespace(id=1, vector_store_path=store)
+        with mock.patch.object(indexing, 'iter_page_chunks', page_chunks), \
+                mock.patch.object(HashingEmbeddings, 'embed_documents', autospec=True, side_effect=record):
+            return indexing.build_store(document, 'handbook.pdf')
+
+    def test_chunks_are_embedded_in_batches_while_parsing(self):
+        pages = [[f'Page {page} chunk {chunk}' for chunk in range(3)] for page in range(5)]
+        path, stats = self.build(pages)
+
+        # One call per four or more chunks, the first after the second page
+        self.assertEqual(self.embedded, [(2, 6), (4, 6), (5, 3)])
+        self.assertEqual((stats['pages'], stats['chunks'], stats['added']), (5, 15, 15))
+        self.assertEqual(len(indexing.stored_documents(path)), 15)
+        self.assertEqual(len(indexing.cached_embeddings(path)), 15)
+
+        # Re-indexing an edited copy only embeds what changed
+        pages[1][0] = 'An edited chunk'
+        _, stats = self.build(pages, store=path)
+        self.assertEqual(self.embedded, [(2, 1)])
+        self.assertEqual((stats['added'], stats['reused'], stats['removed']), (1, 14, 1))
@@ -0,0 +1,40 @@
+"""
+Token counting for prompt budgets and usage estimates.
+
+Uses tiktoken when installed; otherwise a conservative character-based estimate.
+"""
+try:
+    import tiktoken
+except ImportError:  # Fall back to a conservative character-based estimate
+    tiktoken = None
+
+# Characters per token used when tiktoken is unavailable; deliberately low for English
+# text so the estimate errs on the side of over-counting.
+CHARS_PER_TOKEN = 3
+
+_encoding = None
+
+
+def _get_encoding():
+    global _encoding
+    if _encoding is None:
+        _encoding = tiktoken.get_encoding('cl100k_base')
+    return _encoding
+
+
+def count_tokens(text):
+    if not text:
+        return 0
+    if tiktoken is not None:
+        return len(_get_encoding().encode(text))
+    return -(-len(text) // CHARS_PER_TOKEN)
+
+
+def truncate_to_tokens(text, max_tokens):
+    """Cut ``text`` to at most ``max_tokens`` tokens."""
+    if max_tokens <= 0:
+        return ''
+    if tiktoken is not None:
+        tokens = _get_encoding().encode(text)
+        return text if len(tokens) <= max_tokens else _get_encoding().decode(tokens[:max_tokens])
+    return text[:max_tokens * CHARS_PER_TOKEN]
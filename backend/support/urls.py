@@ -1,9 +1,11 @@
+from django.conf import settings
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
+from . import async_views
 from .views import (
     ResourceViewSet, ResourceCategoryViewSet, ResourceRatingViewSet,
     ChatMessageViewSet, GuidelineDocumentViewSet, GenerateSupportActionView,
-    ChatView
+    ChatView, LLMMetricsView, BatchSupportActionView, UploadViewSet
 )
 
 router = DefaultRouter()
@@ -12,9 +14,28 @@ router.register(r'categories', ResourceCategoryViewSet, basename='category')
 router.register(r'ratings', ResourceRatingViewSet, basename='rating')
 router.register(r'chat-messages', ChatMessageViewSet, basename='chat-message')
 router.register(r'guidelines', GuidelineDocumentViewSet, basename='guideline')
+router.register(r'uploads', UploadViewSet, basename='upload')
 
-urlpatterns = [
-    path('', include(router.urls)),
+# The LLM-bound endpoints as async views, served under ASGI (core/asgi.py)
+async_llm_urlpatterns = [
+    path('chat-messages/chat/', async_views.guideline_chat, name='chat-message-chat'),
+    path('chat/', async_views.chat, name='chat'),
+    path('generate-support-action/', async_views.generate_support_action, name='generate-support-action'),
+    path(
+        'generate-support-action/batch/', async_views.batch_generate_support_actions,
+        name='generate-support-action-batch'
+    ),
+]
+
+sync_llm_urlpatterns = [
     path('chat/', ChatView.as_view(), name='chat'),
     path('generate-support-action/', GenerateSupportActionView.as_view(), name='generate-support-action'),
-] 
\ No newline at end of file
+    path('generate-support-action/batch/', BatchSupportActionView.as_view(), name='generate-support-action-batch'),
+]
+
+llm_urlpatterns = async_llm_urlpatterns if settings.SUPPORT_ASYNC_VIEWS else sync_llm_urlpatterns
+
+urlpatterns = llm_urlpatterns + [
+    path('llm-metrics/', LLMMetricsView.as_view(), name='llm-metrics'),
+    path('', include(router.urls)),
+]
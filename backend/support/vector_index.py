@@ -0,0 +1,123 @@
+"""
+FAISS index construction for guideline vector stores.
+
+``GUIDELINE_INDEX_TYPE`` picks the index when a store is built:
+
+- ``flat``: exact L2 search, O(N) per query, full float32 vectors.
+- ``hnsw``: HNSW graph over full vectors; sub-linear queries, more memory than flat.
+- ``ivfpq``: inverted lists with product-quantized codes; sub-linear queries and roughly
+  ``d * 4 / m`` times smaller than flat, at some recall cost. Needs a training set, so
+  stores smaller than ``GUIDELINE_IVFPQ_MIN_VECTORS`` fall back to flat.
+
+All types use L2 distance, like ``FAISS.from_documents``, so stores of different types
+return comparable scores. The result is a regular LangChain ``FAISS`` store that
+``save_local``/``load_local`` round-trip unchanged.
+"""
+import logging
+import math
+import os
+import pickle
+import uuid
+
+import faiss
+import numpy as np
+from django.conf import settings
+from django.utils.module_loading import import_string
+from langchain.docstore.in_memory import InMemoryDocstore
+from langchain_community.vectorstores import FAISS
+
+from .instrumentation import InstrumentedEmbeddings
+
+logger = logging.getLogger(__name__)
+
+INDEX_TYPES = ('flat', 'hnsw', 'ivfpq')
+
+# Bits per product-quantizer code; 8 keeps codes byte aligned.
+PQ_BITS = 8
+
+
+def get_embeddings():
+    """Embedding model for guideline chunks and queries (``GUIDELINE_EMBEDDINGS_CLASS``)."""
+    return InstrumentedEmbeddings(import_string(settings.GUIDELINE_EMBEDDINGS_CLASS)())
+
+
+def _pq_subquantizers(dim):
+    """Largest divisor of ``dim`` no greater than ``dim / 8`` (8 dims per code)."""
+    target = max(1, dim // 8)
+    for m in range(target, 0, -1):
+        if dim % m == 0:
+            return m
+    return 1
+
+
+def create_index(vectors, index_type=None):
+    """Build a FAISS index of ``index_type`` holding the float32 matrix ``vectors``."""
+    index_type = index_type or settings.GUIDELINE_INDEX_TYPE
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Unknown index type '{index_type}', expected one of {', '.join(INDEX_TYPES)}")
+
+    vectors = np.ascontiguousarray(vectors, dtype='float32')
+    count, dim = vectors.shape
+
+    if index_type == 'ivfpq' and count < settings.GUIDELINE_IVFPQ_MIN_VECTORS:
+        logger.info(
+            "Only %s vectors to index, too few to train IVF-PQ; using a flat index", count
+        )
+        index_type = 'flat'
+
+    if index_type == 'flat':
+        index = faiss.IndexFlatL2(dim)
+    elif index_type == 'hnsw':
+        index = faiss.IndexHNSWFlat(dim, settings.GUIDELINE_HNSW_M)
+        index.hnsw.efConstruction = settings.GUIDELINE_HNSW_EF_CONSTRUCTION
+        index.hnsw.efSearch = settings.GUIDELINE_HNSW_EF_SEARCH
+    else:
+        # ~4 * sqrt(N) lists, with enough points per list to train the coarse quantizer
+        nlist = max(1, min(int(4 * math.sqrt(count)), count // 39))
+        quantizer = faiss.IndexFlatL2(dim)
+        index = faiss.IndexIVFPQ(quantizer, dim, nlist, _pq_subquantizers(dim), PQ_BITS)
+        index.train(vectors)
+        index.nprobe = min(nlist, settings.GUIDELINE_IVF_NPROBE)
+
+    index.add(vectors)
+    return index
+
+
+def build_vectorstore(documents, embeddings, index_type=None):
+    """Embed ``documents`` and return a LangChain FAISS store backed by ``index_type``."""
+    vectors = embeddings.embed_documents([document.page_content for document in documents])
+    return vectorstore_from_vectors(documents, vectors, embeddings, index_type)
+
+
+def vectorstore_from_vectors(documents, vectors, embeddings, index_type=None):
+    """Wrap already computed ``vectors`` of ``documents`` in a LangChain FAISS store."""
+    index = create_index(np.array(vectors, dtype='float32'), index_type)
+    ids = [str(uuid.uuid4()) for _ in documents]
+    return FAISS(
+        embeddings,
+        index,
+        InMemoryDocstore(dict(zip(ids, documents))),
+        dict(enumerate(ids)),
+    )
+
+
+def index_memory_bytes(index):
+    """Serialized size of ``index``, a close proxy for its resident memory."""
+    return faiss.serialize_index(index).nbytes
+
+
+def stored_documents(path):
+    """The chunks of the saved store at ``path``, in index order (no embedding calls)."""
+    with open(os.path.join(path, 'index.pkl'), 'rb') as f:
+        docstore, index_to_docstore_id = pickle.load(f)
+    return [docstore.search(index_to_docstore_id[i]) for i in sorted(index_to_docstore_id)]
+
+
+def stored_vectors(path):
+    """The vectors of the saved store at ``path`` in index order, or None if its index
+    type cannot reconstruct them exactly (IVF-PQ keeps only compressed codes)."""
+    index = faiss.read_index(os.path.join(path, 'index.faiss'))
+    try:
+        return index.reconstruct_n(0, index.ntotal)
+    except RuntimeError:
+        return None
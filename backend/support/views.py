@@ -1,29 +1,50 @@
 from django.shortcuts import render
 from rest_framework import generics, permissions, status
 from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound, ValidationError
 from rest_framework.response import Response
-from django.db.models import Q
-from .models import Resource, ResourceCategory, ResourceRating, ChatMessage, AIAssistance, GuidelineDocument, SupportActionHistory
+from django.core import signing
+from django.core.exceptions import SuspiciousFileOperation, ValidationError as DjangoValidationError
+from django.db import transaction
+from django.db.models import CharField, Count, F, Value
+from django.db.models.functions import Cast
+from .models import Resource, ResourceCategory, ResourceRating, ChatMessage, AIAssistance, GuidelineDocument, SupportActionHistory, UploadSession, resource_access_levels
 from .serializers import (
     ResourceSerializer, ResourceCategorySerializer, ResourceRatingSerializer,
-    ChatMessageSerializer, AIAssistanceSerializer, GuidelineDocumentSerializer
+    ChatMessageSerializer, AIAssistanceSerializer, GuidelineDocumentSerializer, UploadSessionSerializer
 )
 from rest_framework import viewsets
-from openai import OpenAI
 from django.conf import settings
+from django.utils import timezone
 from rest_framework.views import APIView
 import json
+import logging
 from rest_framework.parsers import MultiPartParser, FormParser
 import os
+from datetime import timedelta
 
-# LangChain imports
-from langchain_community.document_loaders import TextLoader, PyPDFLoader, Docx2txtLoader
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_community.embeddings import OpenAIEmbeddings
-from langchain_community.vectorstores import FAISS
-from langchain_community.chat_models import ChatOpenAI
-from langchain.chains.question_answering import load_qa_chain
-from langchain.prompts import PromptTemplate
+from .guidelines import (
+    NO_GUIDELINES_RESPONSE, PROCESSING_RESPONSE, RETRIEVAL_MODES,
+    relevant_guidelines, is_indexed, answer_question
+)
+from .blobs import UploadOffsetMismatch, append_chunk, completed_upload, discard_upload, start_upload
+from .cache import cached_listing
+from .chatlog import log_turn
+from .counters import record_view, trending
+from .indexing import index_document, replace_document
+from .instrumentation import call_report, exporter, flush as flush_llm_metrics, instrument_endpoint
+from .llm import support_action_messages, create_chat_completion, parse_support_action
+from .media import can_read, file_response, token_levels
+from .memory import build_chat_messages, schedule_summary_update
+from .pagination import KeysetPagination, page_size
+from .ratings import RATING_VALUES
+from .recommendations import recommend
+from .search import search_resources
+from .storage import blob_storage
+from .tags import parse_tags
+from .support_actions import batch_selection, employee_levels, generate_support_actions, support_action_history
+
+logger = logging.getLogger(__name__)
 
 class ResourceCategoryViewSet(viewsets.ModelViewSet):
     queryset = ResourceCategory.objects.all()
@@ -31,35 +52,18 @@ class ResourceCategoryViewSet(viewsets.ModelViewSet):
     permission_classes = [permissions.IsAuthenticated]
 
     def list(self, request, *args, **kwargs):
-        queryset = self.get_queryset()
-        serializer = self.get_serializer(queryset, many=True)
-        return Response(serializer.data)
+        def build():
+            return self.get_serializer(self.get_queryset(), many=True).data
+
+        return Response(cached_listing('categories', request, build, per_profile=False))
 
 class ResourceViewSet(viewsets.ModelViewSet):
     queryset = Resource.objects.all()
     serializer_class = ResourceSerializer
 
     def get_queryset(self):
-        user = self.request.user
-        base_query = Resource.objects.all()
-
         # Filter based on access level
-        if not user.is_superuser:
-            access_query = Q(access_level='ALL')
-            if user.is_staff:
-                access_query |= Q(access_level='MANAGER')
-            if hasattr(user, 'is_hr') and user.is_hr:
-                access_query |= Q(access_level='HR')
-            base_query = base_query.filter(access_query)
-
-        # Apply search if provided
-        search = self.request.query_params.get('search', '')
-        if search:
-            base_query = base_query.filter(
-                Q(title__icontains=search) |
-                Q(description__icontains=search) |
-                Q(tags__icontains=search)
-            )
+        base_query = Resource.objects.visible_to(self.request.user)
 
         # Filter by category if provided
         category = self.request.query_params.get('category')
@@ -71,8 +75,31 @@ class ResourceViewSet(viewsets.ModelViewSet):
         if resource_type:
             base_query = base_query.filter(resource_type=resource_type)
 
+        # Exact tag match; repeat ?tag= to require several tags
+        for tag in parse_tags(','.join(self.request.query_params.getlist('tag'))):
+            base_query = base_query.filter(tag_set__name=tag)
+
+        # "top_rated" walks support_resource_top_idx
+        if self.request.query_params.get('ordering') == 'top_rated':
+            base_query = base_query.order_by('-rating_average', '-rating_count', '-id')
+
         return base_query
 
+    def list(self, request, *args, **kwargs):
+        # Pages are cached per access profile and query string; see support.cache
+        return Response(cached_listing('resources', request, lambda: self._list_page(request)))
+
+    def _list_page(self, request):
+        search = request.query_params.get('search', '')
+        if not search:
+            return super().list(request).data
+
+        # Relevance-ranked full-text search; each page is ranked in the database
+        results = search_resources(self.get_queryset(), search)
+        page = self.paginate_queryset(results)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data).data
+
     @action(detail=True, methods=['post'])
     def rate(self, request, pk=None):
         resource = self.get_object()
@@ -86,7 +113,17 @@ class ResourceViewSet(viewsets.ModelViewSet):
                 {'error': 'Rating is required'},
                 status=status.HTTP_400_BAD_REQUEST
             )
+        try:
+            rating_value = int(rating_value)
+        except (TypeError, ValueError):
+            rating_value = None
+        if rating_value not in RATING_VALUES:
+            return Response(
+                {'error': 'Rating must be an integer from 1 to 5'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
 
+        # The rating and the aggregates on the resource (see signals.py) change together
         rating, created = ResourceRating.objects.update_or_create(
             resource=resource,
             user=user,
@@ -99,11 +136,96 @@ class ResourceViewSet(viewsets.ModelViewSet):
     @action(detail=True, methods=['post'])
     def increment_views(self, request, pk=None):
         resource = self.get_object()
-        resource.increment_views()
+        # Buffered; reaches views_count with the next counter flush
+        record_view(resource.pk)
         return Response({'status': 'success'})
 
+    @action(detail=False, methods=['get'])
+    def facets(self, request):
+        # Counts per tag, category and type over the current filters, as one
+        # UNION ALL of three grouped queries
+        scope = Resource.objects.filter(id__in=self.get_queryset().order_by().values('id'))
+
+        def facet(name, key, label):
+            return scope.order_by().annotate(
+                facet=Value(name), key=Cast(key, CharField()), label=label
+            ).values('facet', 'key', 'label').annotate(count=Count('id'))
+
+        # Filter on the annotation, not the relation: a second filter() on a
+        # multi-valued relation would join it again and inflate the counts
+        rows = facet('tag', 'tag_set__name', F('tag_set__name')).filter(label__isnull=False).union(
+            facet('category', 'category_id', F('category__name')).filter(label__isnull=False),
+            facet('resource_type', 'resource_type', F('resource_type')),
+            all=True
+        )
+
+        types = dict(Resource.RESOURCE_TYPES)
+        facets = {'tags': [], 'categories': [], 'resource_types': []}
+        for row in rows:
+            if row['facet'] == 'tag':
+                facets['tags'].append({'name': row['key'], 'count': row['count']})
+            elif row['facet'] == 'category':
+                facets['categories'].append({'id': int(row['key']), 'name': row['label'], 'count': row['count']})
+            else:
+                facets['resource_types'].append({
+                    'value': row['key'], 'label': types.get(row['key'], row['key']), 'count': row['count']
+                })
+        for values in facets.values():
+            values.sort(key=lambda item: (-item['count'], str(item.get('name') or item.get('value'))))
+        return Response(facets)
+
+    @action(detail=False, methods=['get'])
+    def recommended(self, request):
+        try:
+            k = page_size(request.query_params.get('k'), default=10)
+            workload_level = request.query_params.get('workload_level')
+            workload_level = int(workload_level) if workload_level else None
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        resources = recommend(request.user, workload_level, k)
+        serializer = self.get_serializer(resources, many=True)
+        return Response(serializer.data)
+
+    @action(detail=False, methods=['get'])
+    def trending(self, request):
+        try:
+            days = int(request.query_params.get('days', settings.TRENDING_DAYS))
+            limit = page_size(request.query_params.get('limit'), default=10)
+            if days < 1:
+                raise ValueError('days must be a positive integer')
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        resources = trending(self.get_queryset().select_related('category'), days)[:limit]
+        serializer = self.get_serializer(resources, many=True)
+        return Response(serializer.data)
+
+    def _completed_upload(self):
+        # A chunked upload (see UploadViewSet) given as ?upload=<id> instead of a file
+        upload_id = self.request.data.get('upload')
+        if not upload_id:
+            return None
+        try:
+            return completed_upload(upload_id, self.request.user)
+        except ValueError as e:
+            raise ValidationError({'upload': str(e)})
+
     def perform_create(self, serializer):
-        serializer.save(created_by=self.request.user)
+        upload = self._completed_upload()
+        if upload is None:
+            serializer.save(created_by=self.request.user)
+            return
+        serializer.save(created_by=self.request.user, file=upload.file)
+        upload.delete()
+
+    def perform_update(self, serializer):
+        upload = self._completed_upload()
+        if upload is None:
+            serializer.save()
+            return
+        serializer.save(file=upload.file)
+        upload.delete()
 
 class ResourceRatingViewSet(viewsets.ModelViewSet):
     queryset = ResourceRating.objects.all()
@@ -112,104 +234,70 @@ class ResourceRatingViewSet(viewsets.ModelViewSet):
     def get_queryset(self):
         return ResourceRating.objects.filter(user=self.request.user)
 
+    # Atomic so the rating aggregates on Resource move with the rating (see signals.py)
+    @transaction.atomic
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
 
+    @transaction.atomic
+    def perform_update(self, serializer):
+        serializer.save()
+
+class ChatHistoryPagination(KeysetPagination):
+    ordering = ('-timestamp', '-id')
+
 class ChatMessageViewSet(viewsets.ModelViewSet):
     queryset = ChatMessage.objects.all()
     serializer_class = ChatMessageSerializer
+    pagination_class = ChatHistoryPagination
+
+    def get_queryset(self):
+        return ChatMessage.objects.filter(user=self.request.user)
+
+    def perform_create(self, serializer):
+        serializer.save(user=self.request.user)
+
+    def list(self, request):
+        # Newest first; plain rows straight from the (user, timestamp, id) index scan
+        page = self.paginate_queryset(
+            self.get_queryset().values('id', 'message', 'response', 'workload_level', 'timestamp')
+        )
+        return self.get_paginated_response(page)
 
     @action(detail=False, methods=['post'])
+    @instrument_endpoint('guideline-chat')
     def chat(self, request):
         try:
             message = request.data.get('message')
             workload_level = request.data.get('workload_level')
+            retrieval_mode = request.data.get('retrieval_mode') or settings.GUIDELINE_RETRIEVAL_MODE
+
+            if retrieval_mode not in RETRIEVAL_MODES:
+                return Response(
+                    {'error': f"retrieval_mode must be one of {', '.join(RETRIEVAL_MODES)}"},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
 
             # Get relevant documents for the current workload level
-            documents = GuidelineDocument.objects.filter(
-                status='ready'
-            )
-            
-            # Filter documents by workload level
-            relevant_docs = [
-                doc for doc in documents
-                if workload_level in doc.get_workload_levels()
-            ]
+            relevant_docs = relevant_guidelines(workload_level)
 
             if not relevant_docs:
-                response = "I don't have any guidelines for this workload level yet."
-                chat_message = ChatMessage.objects.create(
-                    user=request.user,
-                    message=message,
-                    response=response,
-                    workload_level=workload_level
-                )
+                response = NO_GUIDELINES_RESPONSE
+                log_turn(request.user, message, response, workload_level)
                 return Response({'response': response}, status=status.HTTP_200_OK)
 
-            # Load the vector store for each document
-            vectorstores = []
-            for doc in relevant_docs:
-                if doc.vector_store_path:
-                    embeddings = OpenAIEmbeddings()
-                    vectorstore = FAISS.load_local(doc.vector_store_path, embeddings)
-                    vectorstores.append(vectorstore)
-
-            if not vectorstores:
-                response = "I'm still processing the guidelines. Please try again later."
-                chat_message = ChatMessage.objects.create(
-                    user=request.user,
-                    message=message,
-                    response=response,
-                    workload_level=workload_level
-                )
+            if not is_indexed(relevant_docs):
+                response = PROCESSING_RESPONSE
+                log_turn(request.user, message, response, workload_level)
                 return Response({'response': response}, status=status.HTTP_200_OK)
 
-            # Merge vector stores if multiple exist
-            if len(vectorstores) > 1:
-                main_vectorstore = vectorstores[0]
-                for vs in vectorstores[1:]:
-                    main_vectorstore.merge_from(vs)
-            else:
-                main_vectorstore = vectorstores[0]
-
-            # Create prompt template
-            prompt_template = """You are an AI assistant helping with employee mental workload management. 
-            Use the following pieces of context to answer the question at the end. 
-            If you don't know the answer, just say that you don't know, don't try to make up an answer.
-
-            Context: {context}
-
-            Question: {question}
-
-            Answer:"""
-
-            PROMPT = PromptTemplate(
-                template=prompt_template,
-                input_variables=["context", "question"]
-            )
-
-            # Create QA chain
-            chain = load_qa_chain(
-                llm=ChatOpenAI(temperature=0),
-                chain_type="stuff",
-                prompt=PROMPT
-            )
-
-            # Get relevant documents
-            docs = main_vectorstore.similarity_search(message)
-
             # Get response
-            result = chain({"input_documents": docs, "question": message})
+            output_text = answer_question(relevant_docs, message, retrieval_mode)
 
             # Save the message and response
-            chat_message = ChatMessage.objects.create(
-                user=request.user,
-                message=message,
-                response=result["output_text"],
-                workload_level=workload_level
-            )
+            log_turn(request.user, message, output_text, workload_level)
 
-            return Response({'response': result["output_text"]}, status=status.HTTP_200_OK)
+            return Response({'response': output_text}, status=status.HTTP_200_OK)
 
         except Exception as e:
             return Response(
@@ -230,6 +318,7 @@ class AIAssistanceViewSet(viewsets.ModelViewSet):
 class ChatView(APIView):
     permission_classes = [permissions.IsAuthenticated]
 
+    @instrument_endpoint('chat')
     def post(self, request):
         try:
             user_message = request.data.get('message', '')
@@ -239,10 +328,10 @@ class ChatView(APIView):
                     status=status.HTTP_400_BAD_REQUEST
                 )
 
-            print(f"Processing chat message from user {request.user.id}: {user_message}")
+            logger.debug("Processing chat message from user %s", request.user.id)
 
             if not settings.OPENAI_API_KEY:
-                print("Error: OPENAI_API_KEY is not set")
+                logger.error("OPENAI_API_KEY is not set")
                 return Response(
                     {'error': 'OpenAI API key is not configured'},
                     status=status.HTTP_500_INTERNAL_SERVER_ERROR
@@ -250,80 +339,36 @@ class ChatView(APIView):
 
             # Get OpenAI response
             try:
-                client = OpenAI(api_key=settings.OPENAI_API_KEY)
-                print("Making request to OpenAI API...")
-                
-                response = client.chat.completions.create(
-                    model="gpt-4",
-                    messages=[
-                        {"role": "system", "content": """You are a specialized mental health support assistant focused on helping employees manage their mental workload and stress levels. Your expertise includes:
-
-1. Analyzing and providing solutions for:
-   - High workload situations
-   - Work-related stress
-   - Time management
-   - Work-life balance
-   - Mental fatigue
-
-2. Offering practical strategies for:
-   - Reducing mental workload
-   - Setting boundaries
-   - Prioritizing tasks
-   - Taking effective breaks
-   - Improving focus and productivity
-
-3. Suggesting immediate actions for:
-   - Stress reduction
-   - Workload management
-   - Mental health maintenance
-   - Energy level optimization
-
-Keep responses practical, actionable, and focused on workplace mental health. If asked about specific medical conditions, remind users to consult healthcare professionals."""},
-                        {"role": "user", "content": user_message}
-                    ],
-                    temperature=0.7,
-                    max_tokens=500
-                )
-
-                ai_response = response.choices[0].message.content
-                print("Received response from OpenAI")
+                ai_response = create_chat_completion(build_chat_messages(request.user, user_message))
 
             except Exception as openai_error:
-                print(f"OpenAI API error: {str(openai_error)}")
+                logger.exception("OpenAI API error in chat for user %s", request.user.id)
                 return Response(
                     {'error': f'Error communicating with OpenAI: {str(openai_error)}'},
                     status=status.HTTP_500_INTERNAL_SERVER_ERROR
                 )
 
             try:
-                # Save the conversation
-                ChatMessage.objects.create(
-                    user=request.user,
-                    message=user_message,
-                    is_ai_response=False
-                )
+                # Queue the conversation; it is written in the background
+                log_turn(request.user, user_message, ai_response)
 
-                ChatMessage.objects.create(
-                    user=request.user,
-                    message=ai_response,
-                    is_ai_response=True
-                )
-                print("Chat messages saved to database")
-
-            except Exception as db_error:
-                print(f"Database error: {str(db_error)}")
+            except Exception:
+                logger.exception("Failed to save chat history for user %s", request.user.id)
                 # Even if saving fails, still return the AI response
                 return Response({
                     'response': ai_response,
                     'warning': 'Failed to save chat history'
                 })
 
+            # Fold turns that left the recent window into the rolling summary
+            schedule_summary_update(request.user)
+
             return Response({
                 'response': ai_response
             })
 
         except Exception as e:
-            print(f"Unexpected error in ChatView: {str(e)}")
+            logger.exception("Unexpected error in ChatView")
             return Response(
                 {'error': str(e)},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
@@ -332,6 +377,7 @@ Keep responses practical, actionable, and focused on workplace mental health. If
 class GenerateSupportActionView(APIView):
     permission_classes = [permissions.IsAuthenticated]
     
+    @instrument_endpoint('support-action')
     def post(self, request):
         try:
             employee_id = request.data.get('employeeId')
@@ -347,61 +393,15 @@ class GenerateSupportActionView(APIView):
                     status=status.HTTP_400_BAD_REQUEST
                 )
 
-            # Create OpenAI client
-            client = OpenAI(api_key=settings.OPENAI_API_KEY)
-            
-            # Construct the prompt
-            prompt = f"""As an AI mental health support assistant, generate a specific support action recommendation for an employee based on their mental workload level (1-5):
-
-Current Workload Level: {current_level} ({'Positive' if is_current_positive else 'Negative'})
-Previous Workload Level: {previous_level} ({'Positive' if is_previous_positive else 'Negative'})
-
-Workload Level Guide:
-- Level 1-2: High stress, immediate intervention needed
-- Level 3: Moderate stress, preventive measures recommended
-- Level 4-5: Low stress, maintenance and optimization focus
-
-Consider the following when making recommendations:
-1. For Levels 1-2:
-   - Immediate workload reduction strategies
-   - Mental health support resources
-   - Consider temporary work adjustments
-2. For Level 3:
-   - Stress management techniques
-   - Work-life balance improvements
-   - Preventive mental health practices
-3. For Levels 4-5:
-   - Performance optimization
-   - Career development opportunities
-   - Maintaining positive mental health
-
-Provide a specific, actionable recommendation that includes:
-1. Immediate action steps
-2. Long-term support strategy
-3. Resources or tools needed
-
-Format the response as a JSON object with:
-- 'immediate_action': Short-term step (1-2 sentences)
-- 'long_term_strategy': Ongoing support plan (1-2 sentences)
-- 'resources': List of specific resources or tools
-- 'priority_level': 'high' | 'medium' | 'low'"""
-
             # Get completion from OpenAI
-            completion = client.chat.completions.create(
-                model="gpt-4",
-                messages=[
-                    {"role": "system", "content": "You are a mental health support specialist focused on workplace mental health and employee wellbeing."},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.7,
+            response_text = create_chat_completion(
+                support_action_messages(current_level, previous_level, is_current_positive, is_previous_positive),
                 max_tokens=300
             )
-            
+
             # Parse the response
-            try:
-                response_text = completion.choices[0].message.content.strip()
-                response_data = json.loads(response_text)
-                
+            response_data, is_structured = parse_support_action(response_text)
+            if is_structured:
                 # Save the support action history
                 SupportActionHistory.objects.create(
                     employee_id=employee_id,
@@ -409,18 +409,11 @@ Format the response as a JSON object with:
                     previous_workload_level=previous_level,
                     immediate_action=response_data['immediate_action'],
                     long_term_strategy=response_data['long_term_strategy'],
-                    resources=json.dumps(response_data['resources']),
+                    resources=response_data['resources'],
                     priority_level=response_data['priority_level'],
                     created_by=request.user
                 )
-                
-            except json.JSONDecodeError:
-                # Fallback if response is not valid JSON
-                response_data = {
-                    "action": completion.choices[0].message.content.strip(),
-                    "confidence": 0.8
-                }
-            
+
             return Response(response_data)
             
         except Exception as e:
@@ -438,29 +431,46 @@ Format the response as a JSON object with:
                     status=status.HTTP_400_BAD_REQUEST
                 )
 
-            # Get support action history for the employee
-            history = SupportActionHistory.objects.filter(
-                employee_id=employee_id
-            ).values(
-                'immediate_action',
-                'long_term_strategy',
-                'resources',
-                'priority_level',
-                'created_at',
-                'current_workload_level',
-                'previous_workload_level'
-            ).order_by('-created_at')
-
-            # Process the history to parse JSON resources
-            processed_history = []
-            for item in history:
-                try:
-                    item['resources'] = json.loads(item['resources'])
-                except:
-                    item['resources'] = []
-                processed_history.append(item)
-
-            return Response(processed_history)
+            try:
+                limit = page_size(request.query_params.get('limit'))
+                history = support_action_history(
+                    employee_id, request.query_params.get('cursor'), limit
+                )
+            except ValueError as e:
+                return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+            return Response(history)
+        except Exception as e:
+            return Response(
+                {'error': str(e)},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+class BatchSupportActionView(APIView):
+    """Generate support actions for a department or a list of employees in one request."""
+    permission_classes = [permissions.IsAuthenticated]
+
+    @instrument_endpoint('support-action-batch')
+    def post(self, request):
+        try:
+            department, employee_ids = batch_selection(request.data)
+        except (TypeError, ValueError) as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            employees = list(employee_levels(department, employee_ids))
+            if not employees:
+                return Response(
+                    {'error': 'No matching employees'},
+                    status=status.HTTP_404_NOT_FOUND
+                )
+
+            results, distinct_prompts = generate_support_actions(employees, request.user)
+            return Response({
+                'count': len(results),
+                'distinctPrompts': distinct_prompts,
+                'results': results,
+            })
         except Exception as e:
             return Response(
                 {'error': str(e)},
@@ -472,19 +482,29 @@ class GuidelineDocumentViewSet(viewsets.ModelViewSet):
     serializer_class = GuidelineDocumentSerializer
     parser_classes = (MultiPartParser, FormParser)
 
+    @instrument_endpoint('guideline-upload')
     def create(self, request, *args, **kwargs):
         try:
-            file_obj = request.FILES['file']
+            upload = None
+            if request.data.get('upload'):
+                # Sent in chunks through UploadViewSet; the file is already stored
+                upload = completed_upload(request.data['upload'], request.user)
+                name, file_obj = upload.filename, upload.file
+            else:
+                file_obj = request.FILES['file']
+                name = file_obj.name
             workload_levels = json.loads(request.data.get('workloadLevels', '[]'))
             
             # Save the document
             document = GuidelineDocument.objects.create(
-                name=file_obj.name,
+                name=name,
                 file=file_obj,
                 status='processing'
             )
             document.set_workload_levels(workload_levels)
             document.save()
+            if upload is not None:
+                upload.delete()
 
             # Process the document with LangChain
             self.process_document(document.id)
@@ -497,42 +517,151 @@ class GuidelineDocumentViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
+    @instrument_endpoint('guideline-upload')
+    def update(self, request, *args, **kwargs):
+        # Without a new file this is a plain field update
+        if 'file' not in request.FILES and not request.data.get('upload'):
+            return super().update(request, *args, **kwargs)
+        try:
+            document = self.get_object()
+            workload_levels = request.data.get('workloadLevels')
+            if workload_levels is not None:
+                workload_levels = json.loads(workload_levels)
+            upload = None
+            if 'file' not in request.FILES:
+                upload = completed_upload(request.data['upload'], request.user)
+
+            # Re-index only the chunks that changed; chat keeps using the current store
+            # until the new one is swapped in
+            stats = replace_document(document, upload or request.FILES['file'], workload_levels)
+            if upload is not None:
+                upload.delete()
+
+            document.refresh_from_db()
+            data = self.get_serializer(document).data
+            data['reindex'] = stats
+            return Response(data)
+        except Exception as e:
+            return Response(
+                {'error': str(e)},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
     def process_document(self, document_id):
         try:
             document = GuidelineDocument.objects.get(id=document_id)
-            file_path = document.file.path
-            
-            # Load document based on file type
-            if file_path.endswith('.pdf'):
-                loader = PyPDFLoader(file_path)
-            elif file_path.endswith('.docx'):
-                loader = Docx2txtLoader(file_path)
-            else:
-                loader = TextLoader(file_path)
+            index_document(document)
+        except Exception as e:
+            document.status = 'error'
+            document.save()
+            raise e
+
+class UploadViewSet(viewsets.ViewSet):
+    """Resumable chunked uploads.
+
+    POST {filename, size} starts one; each PATCH sends the raw bytes of the next chunk
+    with an Upload-Offset header; GET reports the offset to resume from after a
+    dropped connection. The id of a complete upload can then be sent as ``upload``
+    instead of a file when creating or updating a resource or guideline document.
+    """
+
+    def get_session(self, pk):
+        try:
+            return UploadSession.objects.get(pk=pk, user=self.request.user)
+        except (UploadSession.DoesNotExist, DjangoValidationError):
+            raise NotFound('Upload not found')
 
-            # Split text into chunks
-            text_splitter = RecursiveCharacterTextSplitter(
-                chunk_size=1000,
-                chunk_overlap=200,
-                length_function=len,
+    def create(self, request):
+        try:
+            session = start_upload(request.user, str(request.data['filename']), int(request.data['size']))
+        except (KeyError, TypeError, ValueError) as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(UploadSessionSerializer(session).data, status=status.HTTP_201_CREATED)
+
+    def retrieve(self, request, pk=None):
+        return Response(UploadSessionSerializer(self.get_session(pk)).data)
+
+    def partial_update(self, request, pk=None):
+        session = self.get_session(pk)
+        try:
+            offset = int(request.headers.get('Upload-Offset', ''))
+            length = int(request.headers.get('Content-Length') or 0)
+            # The raw body, read in pieces straight to disk
+            session = append_chunk(session, offset, request.stream, length)
+        except UploadOffsetMismatch as e:
+            return Response(
+                {'error': str(e), 'offset': e.offset},
+                status=status.HTTP_409_CONFLICT
             )
-            texts = loader.load_and_split(text_splitter)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(UploadSessionSerializer(session).data)
 
-            # Create embeddings and store in vector database
-            embeddings = OpenAIEmbeddings()
-            vectorstore = FAISS.from_documents(texts, embeddings)
+    def destroy(self, request, pk=None):
+        discard_upload(self.get_session(pk))
+        return Response(status=status.HTTP_204_NO_CONTENT)
 
-            # Save the vector store
-            vector_store_path = os.path.join(settings.MEDIA_ROOT, 'vectorstores', f'doc_{document.id}')
-            os.makedirs(os.path.dirname(vector_store_path), exist_ok=True)
-            vectorstore.save_local(vector_store_path)
+class MediaFileView(APIView):
+    """Uploaded files, for users allowed to see a resource or guideline using them.
 
-            # Update document status
-            document.status = 'ready'
-            document.vector_store_path = vector_store_path
-            document.save()
+    Authorized by the ``access`` token of a signed file URL or by the API's own
+    authentication; see support.media.
+    """
+    permission_classes = [permissions.AllowAny]
 
-        except Exception as e:
-            document.status = 'error'
-            document.save()
-            raise e
+    def get(self, request, path):
+        token = request.query_params.get('access')
+        if token:
+            try:
+                levels = token_levels(path, token)
+            except signing.BadSignature:
+                return Response(
+                    {'error': 'Invalid or expired file link'},
+                    status=status.HTTP_403_FORBIDDEN
+                )
+        elif request.user.is_authenticated:
+            levels = resource_access_levels(request.user)
+        else:
+            return Response(
+                {'error': 'Authentication required'},
+                status=status.HTTP_401_UNAUTHORIZED
+            )
+
+        try:
+            file_path = blob_storage.path(path)
+        except SuspiciousFileOperation:
+            raise NotFound('File not found')
+        # Files nobody may read look the same as missing ones
+        if not can_read(path, levels) or not os.path.isfile(file_path):
+            raise NotFound('File not found')
+        return file_response(request, path, file_path)
+
+class LLMMetricsView(APIView):
+    """Latency percentiles, token usage and estimated cost of LLM calls per endpoint."""
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        try:
+            hours = int(request.query_params.get('hours', 24))
+            interval = request.query_params.get('interval', 'hour')
+            if interval not in ('hour', 'day'):
+                return Response(
+                    {'error': "interval must be 'hour' or 'day'"},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+
+            # Include this process's calls that are still waiting to be written
+            flush_llm_metrics()
+            since = timezone.now() - timedelta(hours=hours)
+            return Response({
+                'since': since,
+                'interval': interval,
+                'endpoints': call_report(since, interval),
+                # Calls seen by this worker process since it started
+                'live': exporter.snapshot(),
+            })
+        except ValueError:
+            return Response(
+                {'error': 'hours must be an integer'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
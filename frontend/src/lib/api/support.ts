@@ -35,14 +35,16 @@ export const supportApi = {
     },
 
     getChatHistory: async () => {
+        // Latest page of { results, next }, newest first; the panel shows oldest first
         const response = await api.get('/support/chat-messages/');
-        return response.data;
+        return response.data.results.reverse();
     },
 
     generateSupportAction: async (data: GenerateSupportActionRequest): Promise<SupportActionResponse | SupportActionResponse[]> => {
         if (data.method === 'GET') {
+            // History is keyset-paginated: { results, next }; the first page is the latest actions
             const response = await api.get(`/support/generate-support-action/?employeeId=${data.employeeId}`);
-            return response.data;
+            return response.data.results;
         }
         
         const response = await api.post('/support/generate-support-action/', data);